@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Peak memory of rendering growing CSV files included with ``+++ test.csv`` by :mod:`docdown.include`.
+
+Usage: PYTHONPATH=. python benchmarks/csv_table_memory.py
+
+Each include is rendered through a Markdown instance in three configurations:
+
+* ``full``, the defaults.  The whole table is part of the page, so peak memory grows with the CSV file.
+* ``csv_max_rows``, limited to the first 1000 rows.  Peak memory should stay flat once the CSV file is larger.
+* ``sidecar``, with ``csv_sidecar_threshold``.  The table is streamed to a sidecar file and the page only gets a
+  preview, so peak memory should stay flat as the CSV file grows.
+"""
+
+from __future__ import print_function
+
+import io
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import markdown
+
+
+ASSET_DIR = 'assets'
+ROWS = (1000, 10000, 100000, 300000)
+
+
+def make_csv(path, rows):
+    with io.open(path, 'w', encoding='utf-8') as f:
+        f.write('id,name,description,amount\n')
+        for index in range(rows):
+            f.write('%d,name %d,"a <longer> description, with a comma",%d.50\n' % (index, index, index))
+
+
+def make_markdown(directory, **config):
+    include_config = {
+        'asset_directory': ASSET_DIR,
+        'current_directory': directory,
+        'root_directory': directory,
+        'cache_max_bytes': 0,
+    }
+    include_config.update(config)
+    return markdown.Markdown(extensions=['docdown.include'], extension_configs={'docdown.include': include_config})
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    sidecar_directory = os.path.join(directory, 'sidecars')
+    os.makedirs(os.path.join(directory, ASSET_DIR))
+    os.makedirs(sidecar_directory)
+    configs = [
+        ('full', {}),
+        ('csv_max_rows', {'csv_max_rows': 1000}),
+        ('sidecar', {'csv_sidecar_threshold': 1, 'csv_sidecar_directory': sidecar_directory}),
+    ]
+    try:
+        print('%12s %10s %12s %12s %12s %10s' % ('config', 'rows', 'csv bytes', 'html bytes', 'peak bytes',
+                                                 'seconds'))
+        for rows in ROWS:
+            csv_path = os.path.join(directory, ASSET_DIR, 'test.csv')
+            make_csv(csv_path, rows)
+            for name, config in configs:
+                md = make_markdown(directory, **config)
+                tracemalloc.start()
+                start = time.time()
+                html = md.convert('+++ test.csv')
+                elapsed = time.time() - start
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                print('%12s %10d %12d %12d %12d %10.2f' % (name, rows, os.path.getsize(csv_path), len(html), peak,
+                                                           elapsed))
+                del html
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Time per image taken by :class:`docdown.media.MediaTreeprocessor` to resolve image sources against the media url,
+with and without the memo of :class:`docdown.media_urls.MediaURLResolver`.
+
+Usage: PYTHONPATH=. python benchmarks/media_urls.py
+
+Each page has `images` images drawn from `distinct` sources, as in a tree of pages sharing icons and screenshots.
+The memoized resolver joins each source once, so the time per image drops to a dictionary lookup, most of all when
+urls are normalized.  The last column adds content hashes from an asset manifest, which costs one more dictionary
+lookup per image whatever the size of the manifest.
+"""
+
+from __future__ import print_function
+
+import time
+from xml.etree import ElementTree
+
+import markdown
+
+from docdown.media import MediaTreeprocessor
+from docdown.media_urls import MediaURLResolver
+
+
+PAGES = 20
+MEDIA_URL = 'https://example.com/media/guides/'
+
+
+def make_page(images, distinct):
+    root = ElementTree.Element('div')
+    for index in range(images):
+        paragraph = ElementTree.SubElement(root, 'p')
+        ElementTree.SubElement(paragraph, 'img', src='./assets/../images/screenshot-%d.png' % (index % distinct))
+    return root
+
+
+def make_manifest(distinct):
+    manifest = dict(('assets/extra-%d.png' % index, '%012x' % index) for index in range(100000))
+    manifest.update(('images/screenshot-%d.png' % index, '%012x' % index) for index in range(distinct))
+    return manifest
+
+
+def time_pages(images, distinct, resolver, manifest=None):
+    md = markdown.Markdown()
+    treeprocessor = MediaTreeprocessor(media_url=MEDIA_URL, url_resolver=resolver, markdown_instance=md,
+                                       asset_manifest=(lambda: manifest) if manifest else None)
+    pages = [make_page(images, distinct) for _ in range(PAGES)]
+    start = time.time()
+    for page in pages:
+        treeprocessor.run(page)
+    return (time.time() - start) * 1e6 / (PAGES * images)
+
+
+def main():
+    print('%8s %8s %10s %14s %14s %16s' % ('images', 'distinct', 'normalize', 'us unmemoized', 'us memoized',
+                                           'us fingerprinted'))
+    for images in (1000, 5000, 20000):
+        for distinct in (10, 1000):
+            for normalize in (False, True):
+                unmemoized = time_pages(images, distinct, MediaURLResolver(normalize=normalize, max_size=0))
+                memoized = time_pages(images, distinct, MediaURLResolver(normalize=normalize))
+                fingerprinted = time_pages(images, distinct, MediaURLResolver(normalize=normalize),
+                                           make_manifest(distinct))
+                print('%8d %8d %10s %14.2f %14.2f %16.2f' % (images, distinct, normalize, unmemoized, memoized,
+                                                             fingerprinted))
+
+
+if __name__ == '__main__':
+    main()
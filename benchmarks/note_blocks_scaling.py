@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Time taken by :class:`docdown.note_blocks.NoteBlockPreprocessor` for growing documents and numbers of notes.
+
+Usage: PYTHONPATH=. python benchmarks/note_blocks_scaling.py
+
+The time per KB should stay flat as both the document size and the number of notes grow, because notes are found
+in a single pass over the lines.  The second table has n closed notes followed by n notes which are never closed,
+where each unclosed note looks back past the used closing fences.  Its time per note should also stay flat.
+"""
+
+from __future__ import print_function
+
+import logging
+import time
+
+import markdown
+
+from docdown.note_blocks import NoteBlockPreprocessor
+
+
+PARAGRAPH = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt ut labore.'
+
+
+def make_lines(size, notes):
+    lines = []
+    filler = max(1, (size - notes * 30) // (len(PARAGRAPH) + 1))
+    every = filler // notes if notes else None
+    note = 0
+    for index in range(filler):
+        lines.extend([PARAGRAPH, ''])
+        if every and index % every == 0 and note < notes:
+            lines.extend(['!!! MUST', 'The note content.', '!!!', ''])
+            note += 1
+    return lines
+
+
+def make_unclosed_lines(notes):
+    return ['!!! NOTE', 'content', '!!!', ''] * notes + ['!!! NOTE', 'text', ''] * notes
+
+
+def main():
+    # Warm up the template adapter import
+    NoteBlockPreprocessor(markdown_instance=markdown.Markdown()).run(make_lines(1000, 1))
+
+    print('%10s %8s %10s %12s' % ('bytes', 'notes', 'seconds', 'us per KB'))
+    for size in (1000, 10000, 100000, 1000000, 10000000):
+        for notes in (0, 50, 500, 5000):
+            if notes * 40 > size:
+                continue
+            lines = make_lines(size, notes)
+            preprocessor = NoteBlockPreprocessor(markdown_instance=markdown.Markdown())
+            start = time.time()
+            preprocessor.run(lines)
+            elapsed = time.time() - start
+            print('%10d %8d %10.3f %12.1f' % (size, notes, elapsed, elapsed * 1e6 / (size / 1000.0)))
+
+    # Every unclosed note is logged as a warning
+    logging.disable(logging.WARNING)
+    print()
+    print('%10s %10s %14s' % ('unclosed', 'seconds', 'us per note'))
+    for notes in (1000, 2000, 4000, 8000, 32000):
+        lines = make_unclosed_lines(notes)
+        preprocessor = NoteBlockPreprocessor(markdown_instance=markdown.Markdown())
+        start = time.time()
+        preprocessor.run(lines)
+        elapsed = time.time() - start
+        print('%10d %10.3f %14.1f' % (notes, elapsed, elapsed * 1e6 / notes))
+
+
+if __name__ == '__main__':
+    main()
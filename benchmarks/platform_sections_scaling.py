@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Time taken by :class:`docdown.platform_section.PlatformSectionPreprocessor` for growing documents and numbers of
+platform sections.
+
+Usage: PYTHONPATH=. python benchmarks/platform_sections_scaling.py
+
+The time per KB should stay flat as both the document size and the number of sections grow, because sections are
+found in a single pass over the text.  The last rows time documents made only of sections which are never closed
+and of deeply nested sections.
+"""
+
+from __future__ import print_function
+
+import time
+
+import markdown
+
+from docdown.platform_section import PlatformSectionPreprocessor
+
+
+PARAGRAPH = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt ut labore.'
+
+SECTIONS = [
+    '@![iOS]\nSome iOS content.\n!@\n',
+    '@![Android, JavaSE, JavaEE]\nSome Java content.\n!@\n',
+    'Create an @![iOS]`SDLManager`!@ @![Android, JavaSE, JavaEE]`SdlManager`!@ first.\n',
+]
+
+
+def make_text(size, sections):
+    parts = []
+    filler = max(1, (size - sections * 40) // (len(PARAGRAPH) + 2))
+    every = filler // sections if sections else None
+    section = 0
+    for index in range(filler):
+        parts.append(PARAGRAPH + '\n\n')
+        if every and index % every == 0 and section < sections:
+            parts.append(SECTIONS[section % len(SECTIONS)] + '\n')
+            section += 1
+    return ''.join(parts)
+
+
+def time_text(label, text, sections):
+    preprocessor = PlatformSectionPreprocessor(platform_section='Android', markdown_instance=markdown.Markdown())
+    start = time.time()
+    preprocessor.process_platform_sections(text)
+    elapsed = time.time() - start
+    print('%-12s %10d %8d %10.3f %12.1f' % (label, len(text), sections, elapsed, elapsed * 1e6 / (len(text) / 1000.0)))
+
+
+def main():
+    print('%-12s %10s %8s %10s %12s' % ('document', 'bytes', 'sections', 'seconds', 'us per KB'))
+    for size in (1000, 10000, 100000, 1000000, 10000000):
+        for sections in (0, 50, 500, 5000, 50000):
+            if sections * 60 > size:
+                continue
+            time_text('paragraphs', make_text(size, sections), sections)
+
+    for sections in (1000, 10000, 100000):
+        time_text('unclosed', '@![iOS] content ' * sections, sections)
+        time_text('nested', '@![Android] @![iOS]' * sections + ' content ' + '!@ - ' * (2 * sections), sections * 2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Time taken by :class:`docdown.sequence.SequenceDiagramBlockPreprocessor` for growing documents and numbers of
+sequence diagrams, and for pathological inputs.
+
+Usage: PYTHONPATH=. python benchmarks/sequence_scaling.py
+
+The time per KB should stay flat as both the document size and the number of diagrams grow, because diagrams are
+found in a single pass over the lines.  The pathological documents are made of diagrams which are never closed,
+deeply nested diagrams and long lines of image syntax, which all took time growing with the square of their size
+when diagrams were found by searching the whole document with a regular expression.  The script exits with an error
+if any of them takes longer than `BUDGET` seconds.
+"""
+
+from __future__ import print_function
+
+import sys
+import time
+
+import markdown
+
+from docdown.sequence import SequenceDiagramBlockPreprocessor
+
+
+BUDGET = 5.0
+
+PARAGRAPH = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt ut labore.'
+
+DIAGRAM = '|||\nActivate App\n![Activate App Sequence Diagram](./assets/ActivateAppSuccessfulResume.png)\n|||\n'
+
+
+def make_text(size, diagrams):
+    parts = []
+    filler = max(1, (size - diagrams * len(DIAGRAM)) // (len(PARAGRAPH) + 2))
+    every = filler // diagrams if diagrams else None
+    diagram = 0
+    for index in range(filler):
+        parts.append(PARAGRAPH + '\n\n')
+        if every and index % every == 0 and diagram < diagrams:
+            parts.append(DIAGRAM + '\n')
+            diagram += 1
+    return ''.join(parts)
+
+
+def time_text(label, text, diagrams):
+    preprocessor = SequenceDiagramBlockPreprocessor(markdown_instance=markdown.Markdown())
+    lines = text.split('\n')
+    start = time.time()
+    preprocessor.run(lines)
+    elapsed = time.time() - start
+    print('%-12s %10d %8d %10.3f %12.1f' % (label, len(text), diagrams, elapsed, elapsed * 1e6 / (len(text) / 1000.0)))
+    return elapsed
+
+
+def main():
+    print('%-12s %10s %8s %10s %12s' % ('document', 'bytes', 'diagrams', 'seconds', 'us per KB'))
+    for size in (1000, 10000, 100000, 1000000, 10000000):
+        for diagrams in (0, 50, 500, 5000, 50000):
+            if diagrams * 150 > size:
+                continue
+            time_text('paragraphs', make_text(size, diagrams), diagrams)
+
+    over_budget = []
+    for diagrams in (1000, 10000, 100000):
+        pathological = [
+            ('unclosed', '|||\ncontent\n![a](b)\ntext\n' * diagrams),
+            ('nested', '|||\n' * diagrams + 'content\n' + '![a](b)\n|||\n' * diagrams),
+            ('image line', '|||\n' + '![' * diagrams * 10 + '](' * diagrams * 10 + ')\ntext\n|||'),
+        ]
+        for label, text in pathological:
+            if time_text(label, text, diagrams) > BUDGET:
+                over_budget.append('%s (%d)' % (label, diagrams))
+
+    if over_budget:
+        print('Over the %.1f second budget: %s' % (BUDGET, ', '.join(over_budget)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+
+"""
+asset_index
+----------------------------------
+
+Index of the include assets found below a root directory so that
+:class:`docdown.include.IncludePreprocessor` can resolve files without probing the filesystem once per directory
+level for every include.
+"""
+
+from __future__ import absolute_import, unicode_literals, print_function
+
+import os
+import threading
+import time
+
+
+class AssetIndex(object):
+    """
+    Index of every file within an ``asset_directory`` below ``root_directory``.
+
+    The tree is walked once when the index is created.  Lookups then follow the same nearest-ancestor rules as
+    :meth:`docdown.include.IncludePreprocessor.find_file_path`, costing one set lookup per directory level.  Results,
+    including misses, are memoized per ``(current_directory, file_name)``.
+
+    The modification time of every walked directory is recorded.  At most once every ``check_interval`` seconds a
+    lookup will re-stat those directories and rescan any subtree whose directory changed, so files added or removed
+    while a long running process is alive are picked up.  Set ``check_interval`` to ``None`` to only rescan when
+    :meth:`check` is called explicitly.
+
+    Symlinked directories are not followed.
+    """
+
+    def __init__(self, root_directory, asset_directory='', check_interval=1.0):
+        self.root_directory = os.path.abspath(root_directory)
+        self.asset_directory = asset_directory
+        self.check_interval = check_interval
+        self._asset_suffix = os.path.normpath(asset_directory) if asset_directory else ''
+        self._files = set()
+        self._mtimes = {}
+        self._lookups = {}
+        self._lock = threading.RLock()
+        with self._lock:
+            self._scan(self.root_directory)
+            self._checked = time.time()
+
+    def is_asset_directory(self, directory):
+        """
+        Whether `directory` is an `asset_directory` for some level of the tree
+        """
+        if not self._asset_suffix:
+            return True
+        return directory.endswith(os.sep + self._asset_suffix) or directory == self._asset_suffix
+
+    def _in_assets(self, directory):
+        """
+        Whether `directory` is, or is nested within, an asset directory below the root directory
+        """
+        while True:
+            if self.is_asset_directory(directory):
+                return True
+            if directory == self.root_directory:
+                return False
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                return False
+            directory = parent
+
+    def _scan(self, top):
+        in_assets = {top: self._in_assets(top)}
+        for directory, dir_names, file_names in os.walk(top):
+            try:
+                self._mtimes[directory] = os.stat(directory).st_mtime
+            except OSError:
+                continue
+            indexed = in_assets.pop(directory, False)
+            for dir_name in dir_names:
+                sub_directory = os.path.join(directory, dir_name)
+                in_assets[sub_directory] = indexed or self.is_asset_directory(sub_directory)
+            if indexed:
+                self._files.update(os.path.join(directory, file_name) for file_name in file_names)
+
+    def _purge(self, top):
+        prefix = top + os.sep
+        self._files = set(path for path in self._files if not path.startswith(prefix))
+        for directory in [d for d in self._mtimes if d == top or d.startswith(prefix)]:
+            del self._mtimes[directory]
+
+    def check(self):
+        """
+        Rescan every indexed directory whose modification time has changed since it was last scanned.
+
+        Returns True if anything was rescanned.
+        """
+        with self._lock:
+            changed = []
+            for directory, mtime in self._mtimes.items():
+                try:
+                    if os.stat(directory).st_mtime != mtime:
+                        changed.append(directory)
+                except OSError:
+                    changed.append(directory)
+
+            # Rescanning a directory covers everything below it, so only the outermost changed ones matter
+            changed.sort()
+            rescanned = []
+            for directory in changed:
+                if rescanned and directory.startswith(rescanned[-1] + os.sep):
+                    continue
+                rescanned.append(directory)
+                self._purge(directory)
+                if os.path.isdir(directory):
+                    self._scan(directory)
+
+            if rescanned:
+                self._lookups = {}
+            self._checked = time.time()
+            return bool(rescanned)
+
+    def levels(self, current_directory):
+        """
+        Yield the absolute `current_directory` and each of its parents up to and including the root directory
+        """
+        directory = os.path.abspath(current_directory)
+        while True:
+            yield directory
+            if directory == self.root_directory:
+                return
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                return
+            directory = parent
+
+    def find(self, current_directory, file_name):
+        """
+        Find the path to `file_name` in the nearest `asset_directory` at or above `current_directory`.
+
+        Returns None if the file does not exist in any of them.
+        """
+        if self.check_interval is not None and time.time() - self._checked >= self.check_interval:
+            self.check()
+
+        current_directory = os.path.abspath(current_directory)
+        key = (current_directory, file_name)
+        try:
+            return self._lookups[key]
+        except KeyError:
+            pass
+
+        # Paths which may point outside of an asset directory cannot be answered from the index
+        indexed = not os.path.isabs(file_name) and os.pardir not in file_name.replace('\\', '/').split('/')
+
+        file_path = None
+        for level in self.levels(current_directory):
+            candidate = os.path.join(level, self.asset_directory, file_name)
+            if (os.path.normpath(candidate) in self._files) if indexed else os.path.isfile(candidate):
+                file_path = candidate
+                break
+
+        self._lookups[key] = file_path
+        return file_path
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_asset_index(root_directory, asset_directory=''):
+    """
+    Return the process wide :class:`AssetIndex` for `root_directory` and `asset_directory`, creating it if needed
+    """
+    key = (os.path.abspath(root_directory), asset_directory)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = AssetIndex(root_directory, asset_directory=asset_directory)
+        return index
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+"""
+asset_manifest
+----------------------------------
+
+Manifests of media asset paths to the hashes of their contents, used by :mod:`docdown.media` to give assets urls
+which change whenever the asset does, so they can be cached for as long as possible.
+
+A manifest is a JSON object of asset path, relative to the media directory with `/` separators, to hash::
+
+    {"assets/image.png": "3f786850e387", "downloads/sdk.zip": "89e6c98d9288"}
+
+:func:`build_asset_manifest` keeps the `(mtime, size)` and full hash of each file in a second JSON file next to the
+manifest, named by :func:`signatures_path`, so later builds only hash the files which have changed.
+"""
+
+from __future__ import absolute_import, unicode_literals, print_function
+
+from multiprocessing.pool import ThreadPool
+import io
+import json
+import os
+import threading
+
+from .cache import file_digest, file_signature, write_atomically
+
+
+DEFAULT_HASH_LENGTH = 12
+SIGNATURES_SUFFIX = '.signatures'
+
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+
+def load_asset_manifest(path):
+    """
+    Return the manifest dict in the JSON file at `path`.
+
+    Manifests are read once and cached while the file's `(mtime, size)` is unchanged, so a manifest rebuilt while a
+    long running process is alive is picked up.  A missing file is an empty manifest.
+    """
+    signature = file_signature(path)
+    if signature is None:
+        return {}
+    with _manifests_lock:
+        cached = _manifests.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+    with io.open(path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    with _manifests_lock:
+        _manifests[path] = (signature, manifest)
+    return manifest
+
+
+def signatures_path(manifest_path):
+    """
+    Return the path of the file where :func:`build_asset_manifest` keeps the file signatures for `manifest_path`
+    """
+    return manifest_path + SIGNATURES_SUFFIX
+
+
+def load_signatures(path):
+    """
+    Return the dict of asset path to `[mtime, size, hash]` in the JSON file at `path`, or an empty dict if it is
+    missing or cannot be read
+    """
+    try:
+        with io.open(path, encoding='utf-8') as f:
+            signatures = json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+    return signatures if isinstance(signatures, dict) else {}
+
+
+def iter_asset_paths(root_directory, exclude=()):
+    """
+    Yield `(asset path, file path)` for every file below `root_directory`, apart from the absolute paths in `exclude`
+    """
+    for directory, dir_names, file_names in os.walk(root_directory):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            file_path = os.path.join(directory, file_name)
+            if exclude and os.path.abspath(file_path) in exclude:
+                continue
+            asset_path = os.path.relpath(file_path, root_directory).replace(os.sep, '/')
+            yield asset_path, file_path
+
+
+def build_asset_manifest(root_directory, manifest_path=None, workers=4, hash_length=DEFAULT_HASH_LENGTH):
+    """
+    Return the manifest of every file below `root_directory` to the first `hash_length` hex digits of its SHA-1.
+
+    Files are hashed with `workers` threads.  If `manifest_path` is given the new manifest is written to it, and the
+    `(mtime, size)` and hash of each file to :func:`signatures_path`.  The hashes recorded by the previous build are
+    kept for files whose `(mtime, size)` is unchanged, so only new and changed files are read.  A file copied over an
+    asset with its old mtime kept, as `cp -p`, tar and `rsync -t` do, is still hashed again if its size changed.
+    """
+    previous = {}
+    exclude = set()
+    if manifest_path is not None:
+        previous = load_signatures(signatures_path(manifest_path))
+        exclude = set([os.path.abspath(manifest_path), os.path.abspath(signatures_path(manifest_path))])
+
+    signatures, changed = {}, []
+    for asset_path, file_path in iter_asset_paths(root_directory, exclude=exclude):
+        signature = file_signature(file_path)
+        if signature is None:
+            continue
+        recorded = previous.get(asset_path)
+        if recorded and list(signature) == recorded[:2]:
+            signatures[asset_path] = recorded
+        else:
+            changed.append((asset_path, file_path, signature))
+
+    if workers > 1 and len(changed) > 1:
+        pool = ThreadPool(min(workers, len(changed)))
+        try:
+            digests = pool.map(file_digest, [file_path for _, file_path, _ in changed])
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        digests = [file_digest(file_path) for _, file_path, _ in changed]
+    for (asset_path, _, signature), digest in zip(changed, digests):
+        signatures[asset_path] = [signature[0], signature[1], digest]
+
+    manifest = dict((asset_path, recorded[2][:hash_length]) for asset_path, recorded in signatures.items())
+    if manifest_path is not None:
+        write_atomically(signatures_path(manifest_path),
+                         lambda out: out.write('%s' % json.dumps(signatures, indent=1, sort_keys=True)))
+        write_atomically(manifest_path, lambda out: out.write('%s' % json.dumps(manifest, indent=1, sort_keys=True)))
+    return manifest
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+"""
+cache
+----------------------------------
+
+Small thread safe caches shared by the DocDown extensions
+"""
+
+from __future__ import absolute_import, unicode_literals, print_function
+
+from collections import namedtuple, OrderedDict
+import hashlib
+import io
+import os
+import tempfile
+import threading
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'max_size', 'size', 'entries'])
+
+
+def file_signature(path):
+    """
+    Return `(mtime, size)` for `path`, or None if it cannot be stat'd.
+
+    Used as part of a cache key so that entries for a file are not used after the file has changed.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime, stat.st_size
+
+
+def text_size(value):
+    """
+    Approximate size of a string or a sequence of strings, in characters
+    """
+    if isinstance(value, (list, tuple)):
+        return sum(len(item) + 1 for item in value)
+    return len(value)
+
+
+class LRUCache(object):
+    """
+    Least recently used cache with a size budget.
+
+    Each entry costs `sizeof(value)` against `max_size`, which is one per entry by default.  When adding an entry
+    takes the cache over budget the least recently used entries are evicted.  A single value larger than the whole
+    budget is never stored.  `hits` and `misses` count the results of :meth:`get`.
+    """
+
+    def __init__(self, max_size=128, sizeof=None):
+        self.max_size = max_size
+        self.sizeof = sizeof or (lambda value: 1)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, size = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data[key] = (value, size)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        size = self.sizeof(value)
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            if size > self.max_size:
+                return
+            self._data[key] = (value, size)
+            self.size += size
+            while self.size > self.max_size:
+                _, (_, evicted_size) = self._data.popitem(last=False)
+                self.size -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        return CacheInfo(self.hits, self.misses, self.max_size, self.size, len(self._data))
+
+
+_digests = LRUCache(max_size=4096)
+
+
+def file_digest(path):
+    """
+    Return the SHA-1 hex digest of the contents of `path`.
+
+    Digests are memoized while the file's `(mtime, size)` is unchanged.
+    """
+    key = (path, file_signature(path))
+    digest = _digests.get(key)
+    if digest is None:
+        sha1 = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b''):
+                sha1.update(chunk)
+        digest = sha1.hexdigest()
+        _digests.set(key, digest)
+    return digest
+
+
+def write_atomically(path, write, encoding='utf-8'):
+    """
+    Create the text file at `path` by calling `write` with a temporary file which then replaces `path`, so that
+    concurrent builds never read a partly written file.  Missing directories are created.  The file is opened in
+    binary mode if `encoding` is None.
+    """
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            if not os.path.isdir(directory):
+                raise
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with io.open(fd, 'wb' if encoding is None else 'w', encoding=encoding) as f:
+            write(f)
+        getattr(os, 'replace', os.rename)(temp_path, path)
+    except Exception:
+        os.remove(temp_path)
+        raise
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+"""
+csv_table
+----------------------------------
+
+Streaming renderer for the HTML tables built from CSV files by :mod:`docdown.include`.
+
+Rows are read, escaped and rendered one at a time so memory use does not grow with the size of the CSV file, other
+than for whatever the caller keeps of the output.
+"""
+
+from __future__ import absolute_import, unicode_literals, print_function
+
+import io
+import os
+import sys
+
+from .cache import file_digest, write_atomically
+
+if sys.version_info[0] >= 3:
+    import csv
+else:
+    import unicodecsv as csv
+
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+TRUNCATION_NOTICE = '<p class="csv-truncated">Showing the first {rows} rows.</p>'
+
+SIDECAR_NOTICE = ('<p class="csv-truncated">Showing the first {rows} rows.'
+                  ' <a class="csv-sidecar-link" href="{url}">Show all rows</a></p>')
+SIDECAR_WRAP = '<div class="csv-sidecar" data-src="{url}">{table}</div>'
+
+
+def iter_csv_rows(file_path):
+    """
+    Yield each row of the CSV file at `file_path` as a list of unicode strings
+    """
+    if sys.version_info[0] >= 3:
+        csvfile = io.open(file_path, 'r', encoding='utf-8', newline='')
+    else:
+        csvfile = open(file_path, 'rb')
+    with csvfile:
+        for row in csv.reader(csvfile):
+            yield row
+
+
+def escape(text):
+    """
+    Escape `text` for use as HTML element content
+    """
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
+
+
+def iter_table_html(rows, max_rows=None, max_bytes=None, truncation_notice=TRUNCATION_NOTICE):
+    """
+    Yield the HTML for a table of `rows`, one row at a time.
+
+    The first row is rendered as headings.  If `max_rows` is given no more than that many rows follow the headings,
+    and if `max_bytes` is given rows stop before the table would grow past that many characters.  When either limit
+    cuts the table short `truncation_notice` is rendered after it, formatted with the number of rows shown.
+    """
+    yield '<table>'
+    size = len('<table></table>')
+    shown = 0
+    truncated = False
+    for index, row in enumerate(rows):
+        if index and max_rows is not None and shown >= max_rows:
+            truncated = True
+            break
+
+        cell = 'th' if index == 0 else 'td'
+        html = '<tr>%s</tr>' % ''.join('<%s>%s</%s>' % (cell, escape(column), cell) for column in row)
+        if max_bytes is not None and size + len(html) > max_bytes:
+            truncated = True
+            break
+
+        size += len(html)
+        if index:
+            shown += 1
+        yield html
+    yield '</table>'
+
+    if truncated and truncation_notice:
+        yield truncation_notice.format(rows=shown)
+
+
+def iter_csv_table(file_path, **kwargs):
+    """
+    Yield the HTML table for the CSV file at `file_path` one row at a time.
+
+    Takes the same keyword arguments as :func:`iter_table_html`.
+    """
+    return iter_table_html(iter_csv_rows(file_path), **kwargs)
+
+
+def render_csv_table(file_path, **kwargs):
+    """
+    Return the HTML table for the CSV file at `file_path` as a single string
+    """
+    return ''.join(iter_csv_table(file_path, **kwargs))
+
+
+def write_csv_table(file_path, out, chunk_size=DEFAULT_CHUNK_SIZE, **kwargs):
+    """
+    Write the HTML table for the CSV file at `file_path` to the text file `out`.
+
+    Output is buffered and written in chunks of roughly `chunk_size` characters.  Returns the number of characters
+    written.
+    """
+    written = 0
+    buffered = []
+    buffered_size = 0
+    for html in iter_csv_table(file_path, **kwargs):
+        buffered.append(html)
+        buffered_size += len(html)
+        if buffered_size >= chunk_size:
+            out.write(''.join(buffered))
+            written += buffered_size
+            buffered = []
+            buffered_size = 0
+    if buffered:
+        out.write(''.join(buffered))
+        written += buffered_size
+    return written
+
+
+def write_csv_sidecar(file_path, directory):
+    """
+    Write the whole HTML table for the CSV file at `file_path` to a sidecar file in `directory`.
+
+    The sidecar is named by the SHA-1 of the CSV file, so every page including the same CSV shares one sidecar and
+    it is only written once.  Returns the sidecar's file name.
+    """
+    file_name = 'csv-%s.html' % file_digest(file_path)
+    sidecar_path = os.path.join(directory, file_name)
+    if not os.path.exists(sidecar_path):
+        write_atomically(sidecar_path, lambda out: write_csv_table(file_path, out))
+    return file_name
+
+
+def render_csv_preview(file_path, url, max_rows):
+    """
+    Return the first `max_rows` rows of the CSV file at `file_path` as a placeholder for the whole table at `url`.
+
+    The table is wrapped in a `<div class="csv-sidecar">` whose `data-src` attribute is the url of the sidecar, for a
+    script to load it in place, and is followed by a link to it.
+    """
+    url = escape(url)
+    notice = SIDECAR_NOTICE.replace('{url}', url.replace('{', '{{').replace('}', '}}'))
+    table = ''.join(iter_csv_table(file_path, max_rows=max_rows, truncation_notice=notice))
+    return SIDECAR_WRAP.format(url=url, table=table)
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+
+"""
+diagrams
+----------------------------------
+
+Diagrams rendered from their text source by a local renderer, used by :mod:`docdown.sequence` for `|||` blocks which
+carry the source of their diagram.
+
+Rendered diagrams are kept in a directory and named by the hash of their source, so a diagram is only rendered again
+when its source or renderer changes.  Small SVG diagrams can be read back to be inlined in the page.
+"""
+
+from __future__ import absolute_import, unicode_literals, print_function
+
+from collections import namedtuple, OrderedDict
+from multiprocessing.pool import ThreadPool
+import hashlib
+import io
+import os
+import re
+import shlex
+import subprocess
+
+from .cache import LRUCache, file_signature, text_size, write_atomically
+
+try:
+    basestring
+except NameError:
+    basestring = (str, bytes)
+
+
+# The opening line of a fenced block of diagram source, ```mermaid
+SOURCE_FENCE_RE = re.compile(r'(?P<fence>`{3,}|~{3,})[ ]*(?P<language>[\w+-]+)[ ]*$')
+
+# XML declarations, doctypes and comments before the root element of an SVG file
+SVG_PROLOG_RE = re.compile(r'(?:\s|<\?.*?\?>|<!DOCTYPE[^>]*>|<!--.*?-->)*', re.DOTALL)
+SVG_ROOT_RE = re.compile(r'<svg\b[^>]*>')
+SVG_SIZE_ATTRIBUTE_RE = re.compile(r'''\s(?:width|height|viewBox)\s*=\s*(?:"[^"]*"|'[^']*')''')
+SVG_ID_RE = re.compile(r'''\sid\s*=\s*(?:"(?P<double>[^"]*)"|'(?P<single>[^']*)')''')
+
+DEFAULT_SVG_CACHE_MAX_BYTES = 4 * 1024 * 1024
+
+# An SVG ready to be inlined in a page, the markup for its first use and for later uses on the same page
+InlineSVG = namedtuple('InlineSVG', ['digest', 'markup', 'reference'])
+
+_inline_svgs = LRUCache(max_size=DEFAULT_SVG_CACHE_MAX_BYTES,
+                        sizeof=lambda svg: text_size(svg.markup) + text_size(svg.reference))
+
+
+class DiagramRenderError(Exception):
+    """
+    Raised when a diagram renderer command fails
+    """
+
+
+def run_renderer(renderer, source):
+    """
+    Return the diagram rendered from `source` by `renderer`, as bytes.
+
+    A renderer is either a callable taking the source text and returning bytes or text, or a command, given as a
+    string or a list of arguments, which reads the source on stdin and writes the diagram to stdout.
+    """
+    if callable(renderer):
+        output = renderer(source)
+    else:
+        args = shlex.split(renderer) if isinstance(renderer, basestring) else list(renderer)
+        process = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        output, errors = process.communicate(source.encode('utf-8'))
+        if process.returncode:
+            raise DiagramRenderError('%s exited with status %d: %s' % (
+                args[0], process.returncode, errors.decode('utf-8', 'replace').strip()))
+    if not isinstance(output, bytes):
+        output = output.encode('utf-8')
+    return output
+
+
+def match_source_fence(lines, index, languages, end=None):
+    """
+    Return `(language, source, closing line index)` for a fenced block of diagram source opened at `lines[index]`,
+    or None.
+
+    The block must be in one of `languages` and be closed by a fence of the same character and at least the same
+    length before the line at `end`.
+    """
+    m = SOURCE_FENCE_RE.match(lines[index])
+    if m is None or m.group('language') not in languages:
+        return None
+    fence = m.group('fence')
+    closer = re.compile(r'%s{%d,}[ ]*$' % (re.escape(fence[0]), len(fence)))
+    for closing in range(index + 1, len(lines) if end is None else end):
+        if closer.match(lines[closing]):
+            return m.group('language'), '\n'.join(lines[index + 1:closing]), closing
+    return None
+
+
+def find_diagram_sources(lines, languages):
+    """
+    Yield `(language, source)` for every fenced block of diagram source in `lines`
+    """
+    index = 0
+    while index < len(lines):
+        source = match_source_fence(lines, index, languages)
+        if source is not None:
+            yield source[:2]
+            index = source[2]
+        index += 1
+
+
+class DiagramCache(object):
+    """
+    Directory of diagrams rendered by `renderers`, a dict of source language to renderer.
+
+    Each diagram file is named by the SHA-1 of its language, renderer and source, so pages using the same diagram share
+    one file and a diagram is only rendered when its file is missing.
+    """
+
+    def __init__(self, directory, renderers, file_format='svg'):
+        self.directory = directory
+        self.renderers = renderers
+        self.file_format = file_format
+
+    def renderer_key(self, language):
+        renderer = self.renderers[language]
+        if callable(renderer):
+            name = getattr(renderer, '__name__', type(renderer).__name__)
+            return '%s.%s' % (getattr(renderer, '__module__', ''), name)
+        if isinstance(renderer, basestring):
+            return renderer
+        return ' '.join(renderer)
+
+    def file_name(self, language, source):
+        key = '\0'.join([language, self.renderer_key(language), self.file_format, source])
+        return 'diagram-%s.%s' % (hashlib.sha1(key.encode('utf-8')).hexdigest(), self.file_format)
+
+    def render(self, language, source):
+        """
+        Render the diagram for `source` if it is not in the cache yet and return its file name
+        """
+        file_name = self.file_name(language, source)
+        file_path = os.path.join(self.directory, file_name)
+        if not os.path.exists(file_path):
+            output = run_renderer(self.renderers[language], source)
+            write_atomically(file_path, lambda out: out.write(output), encoding=None)
+        return file_name
+
+    def render_all(self, diagrams, workers=4):
+        """
+        Render every `(language, source)` in `diagrams` which is not in the cache yet using `workers` threads.
+
+        Returns the file names of the diagrams, without duplicates, in the order they are first found.
+        """
+        diagrams = OrderedDict((self.file_name(language, source), (language, source))
+                               for language, source in diagrams)
+        missing = [diagram for file_name, diagram in diagrams.items()
+                   if not os.path.exists(os.path.join(self.directory, file_name))]
+        if workers > 1 and len(missing) > 1:
+            pool = ThreadPool(min(workers, len(missing)))
+            try:
+                pool.map(lambda diagram: self.render(*diagram), missing)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for language, source in missing:
+                self.render(language, source)
+        return list(diagrams)
+
+
+def make_inline_svg(svg):
+    """
+    Return the :class:`InlineSVG` for the text of an SVG file, or None if it has no `<svg>` root element.
+
+    The root element is given an id, unless it has one, so later uses can be `<svg><use href="#id"/></svg>` with the
+    same size and view box.
+    """
+    svg = svg[SVG_PROLOG_RE.match(svg).end():].strip()
+    root = SVG_ROOT_RE.match(svg)
+    if root is None:
+        return None
+    digest = hashlib.sha1(svg.encode('utf-8')).hexdigest()
+
+    id_match = SVG_ID_RE.search(root.group())
+    if id_match:
+        svg_id = id_match.group('double') if id_match.group('double') is not None else id_match.group('single')
+    else:
+        svg_id = 'diagram-%s' % digest[:12]
+        svg = '<svg id="%s"%s' % (svg_id, svg[len('<svg'):])
+
+    size = ''.join(SVG_SIZE_ATTRIBUTE_RE.findall(root.group()))
+    reference = ('<svg%s xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink">'
+                 '<use href="#%s" xlink:href="#%s"/></svg>' % (size, svg_id, svg_id))
+    return InlineSVG(digest, svg, reference)
+
+
+def load_inline_svg(path, max_bytes):
+    """
+    Return the :class:`InlineSVG` for the SVG file at `path`, or None if it is missing, not an SVG or is `max_bytes`
+    or larger.
+
+    Files are read once and cached while their `(mtime, size)` is unchanged.
+    """
+    signature = file_signature(path)
+    if signature is None or signature[1] >= max_bytes:
+        return None
+    key = (path, signature)
+    svg = _inline_svgs.get(key)
+    if svg is None:
+        with io.open(path, encoding='utf-8') as f:
+            svg = make_inline_svg(f.read())
+        if svg is None:
+            return None
+        _inline_svgs.set(key, svg)
+    return svg
@@ -2,6 +2,7 @@
 from __future__ import absolute_import, unicode_literals, print_function
 
 import importlib
+import os
 
 
 class TemplateRenderMixin(object):
@@ -18,3 +19,38 @@ class TemplateRenderMixin(object):
         my_module = importlib.import_module(module_name)
         AdapterClass = getattr(my_module, class_name)
         return AdapterClass()
+
+
+def add_preprocessor(md, name, preprocessor):
+    """
+    Add a DocDown `preprocessor` to the Markdown instance `md` after `normalize_whitespace`.
+
+    `platform_sections` is kept ahead of the other DocDown preprocessors whatever order the extensions are loaded in,
+    so the includes, notes and diagrams in sections for other platforms are removed before they are processed.
+    """
+    md.preprocessors.add(name, preprocessor, '>normalize_whitespace')
+    if 'platform_sections' in md.preprocessors:
+        md.preprocessors.link('platform_sections', '>normalize_whitespace')
+
+
+def set_render_context(md, document_path=None, current_directory=None, media_url=None):
+    """
+    Point the DocDown extensions of the Markdown instance `md` at the document about to be rendered.
+
+    Includes are looked for starting from `current_directory`, or the directory of `document_path`, and media urls
+    are built from `media_url`.  Arguments left as None are not changed.  Calling ``md.reset()`` restores the values
+    the extensions were configured with, so a single Markdown instance can render a whole tree::
+
+        for path in paths:
+            md.reset()
+            set_render_context(md, document_path=path, media_url=media_urls[path])
+            html = md.convert(source[path])
+    """
+    if current_directory is None and document_path is not None:
+        current_directory = os.path.dirname(os.path.abspath(document_path))
+
+    for extension in md.registeredExtensions:
+        if current_directory is not None and hasattr(extension, 'set_current_directory'):
+            extension.set_current_directory(current_directory)
+        if media_url is not None and hasattr(extension, 'set_media_url'):
+            extension.set_media_url(media_url)
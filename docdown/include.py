@@ -4,19 +4,92 @@ from __future__ import absolute_import, unicode_literals, print_function
 
 from markdown.preprocessors import Preprocessor
 from markdown.extensions import Extension
+from markdown.extensions.codehilite import CodeHilite, CodeHiliteExtension
 
+from collections import namedtuple, OrderedDict
+from multiprocessing.pool import ThreadPool
+import io
+import logging
 import os
 import codecs
-import unicodecsv
+import fnmatch
+import re
+import threading
+
+from .asset_index import get_asset_index
+from .cache import LRUCache, file_digest, file_signature, text_size
+from .csv_table import escape, iter_csv_table, render_csv_preview, write_csv_sidecar
+from .docdown import add_preprocessor
+from .line_index import get_line_index
+from .symbol_index import DEFAULT_INDEXERS, get_symbols
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_MAX_BYTES = 32 * 1024 * 1024
+DEFAULT_MAX_DEPTH = 8
+DEFAULT_CSV_SIDECAR_PREVIEW_ROWS = 20
+
+_include_caches = {}
+_include_caches_lock = threading.Lock()
+
+
+def get_include_cache(max_bytes=DEFAULT_CACHE_MAX_BYTES):
+    """
+    Return the process wide cache of rendered includes for a budget of `max_bytes`, creating it if needed.
+
+    Sizes are measured in characters of the cached output.
+    """
+    with _include_caches_lock:
+        cache = _include_caches.get(max_bytes)
+        if cache is None:
+            cache = _include_caches[max_bytes] = LRUCache(max_size=max_bytes, sizeof=text_size)
+        return cache
+
+
+IncludedFile = namedtuple('IncludedFile', ['file_name', 'fragment', 'file_path', 'kind', 'content', 'digest'])
+
+
+class IncludeError(Exception):
+    """
+    Raised when nested includes form a cycle or are nested too deeply
+    """
 
 
 class IncludePreprocessor(Preprocessor):
 
-    def __init__(self, root_directory='', current_directory='', asset_directory='', extension_map=None, **kwargs):
+    LINE_RANGE_RE = re.compile(r'^L(?P<start>\d+)(?:-L?(?P<end>\d+))?$')
+    GLOB_RE = re.compile(r'[*?[]')
+    # The fences of a `docdown.scoped_code_tabs` group, which needs to see the fenced code blocks inside it
+    CODE_TABS_START_RE = re.compile(r'^ *\|\~\s*$')
+    CODE_TABS_END_RE = re.compile(r'^\s*\~\|\s*$')
+
+    def __init__(self, root_directory='', current_directory='', asset_directory='', extension_map=None,
+                 asset_index=False, cache=None, csv_max_rows=None, csv_max_bytes=None, fragment_extensions=None,
+                 max_depth=DEFAULT_MAX_DEPTH, prefetch_workers=0, symbol_indexers=None, symbol_cache_directory=None,
+                 glob_code_tabs=False, defer_threshold=None, csv_sidecar_threshold=None, csv_sidecar_directory=None,
+                 csv_sidecar_url='', csv_sidecar_preview_rows=DEFAULT_CSV_SIDECAR_PREVIEW_ROWS, **kwargs):
         self.asset_directory = asset_directory
         self.current_directory = current_directory
         self.root_directory = root_directory
         self.extension_map = extension_map or {}
+        self.asset_index = asset_index
+        self.cache = cache
+        self.csv_max_rows = csv_max_rows
+        self.csv_max_bytes = csv_max_bytes
+        self.fragment_extensions = fragment_extensions or []
+        self.max_depth = max_depth
+        self.prefetch_workers = prefetch_workers
+        self._pool = None
+        self.symbol_indexers = dict(DEFAULT_INDEXERS, **(symbol_indexers or {}))
+        self.symbol_cache_directory = symbol_cache_directory
+        self.glob_code_tabs = glob_code_tabs
+        self.defer_threshold = defer_threshold
+        self.csv_sidecar_threshold = csv_sidecar_threshold
+        self.csv_sidecar_directory = csv_sidecar_directory
+        self.csv_sidecar_url = csv_sidecar_url
+        self.csv_sidecar_preview_rows = csv_sidecar_preview_rows
+        self.dependency_graph = OrderedDict()
         super(IncludePreprocessor, self).__init__(**kwargs)
 
     def find_file_path(self, file_name):
@@ -26,28 +99,177 @@ class IncludePreprocessor(Preprocessor):
         Start at `self.current_directory/self.asset_directory/file_name` looking for `file_name`.  Recursively
         strip one directory level off of `self.current_directory` to see if `self.asset_directory/file_name`
         exists there up until the path matched `self.root_directory`
+
+        If `self.asset_index` is enabled the lookup is answered by the shared
+        :class:`docdown.asset_index.AssetIndex` for `self.root_directory` instead of checking each level on disk.
         """
-        current_dir = self.current_directory
-        asset_directory = os.path.join(current_dir, self.asset_directory)
-        file_path = os.path.join(asset_directory, file_name)
+        if self.asset_index and self.root_directory:
+            index = get_asset_index(self.root_directory, self.asset_directory)
+            return index.find(self.current_directory, file_name)
 
-        root_directory = os.path.join(self.root_directory, self.asset_directory)
+        for asset_directory in self.asset_directories():
+            file_path = os.path.join(asset_directory, file_name)
+            if os.path.isfile(file_path):
+                return file_path
+        return None
 
-        while not os.path.isfile(file_path):
+    def asset_directories(self):
+        """
+        Yield `self.current_directory/self.asset_directory` and the asset directory of each parent of
+        `self.current_directory` up to and including `self.root_directory`
+        """
+        asset_directory = os.path.join(self.current_directory, self.asset_directory)
+        root_directory = os.path.join(self.root_directory, self.asset_directory)
+        while True:
+            yield asset_directory
             if asset_directory == root_directory:
-                return None
+                return
 
             head, tail = os.path.split(os.path.split(asset_directory)[0])
-            asset_directory = os.path.join(head, self.asset_directory)
-            file_path = os.path.join(asset_directory, file_name)
-        return file_path
+            parent = os.path.join(head, self.asset_directory)
+            if parent == asset_directory:
+                return
+            asset_directory = parent
+
+    def is_glob(self, file_name):
+        return self.GLOB_RE.search(file_name) is not None
+
+    @staticmethod
+    def list_files(directory):
+        """
+        Return the names of the files in `directory`, or an empty list if it does not exist
+        """
+        try:
+            if hasattr(os, 'scandir'):
+                return [entry.name for entry in os.scandir(directory) if entry.is_file()]
+            return [name for name in os.listdir(directory) if os.path.isfile(os.path.join(directory, name))]
+        except OSError:
+            return []
+
+    def find_glob_paths(self, pattern):
+        """
+        Find the files matching `pattern`, such as `snippets/*.java`, within self.root_directory
 
-    def handle_code(self, file_path, file_extension):
+        Wildcards may only be used in the last part of the pattern.  Each asset directory from
+        `self.current_directory` up to `self.root_directory` is listed once, and as with :meth:`find_file_path` a
+        file in a nearer directory hides one with the same name further up.  Returns a list of `(file_name,
+        file_path)` sorted by file name.
+        """
+        directory, name_pattern = os.path.split(pattern)
+        matches = {}
+        for asset_directory in self.asset_directories():
+            search_directory = os.path.join(asset_directory, directory)
+            for name in fnmatch.filter(self.list_files(search_directory), name_pattern):
+                if name not in matches:
+                    matches[name] = os.path.join(search_directory, name)
+        return [(os.path.join(directory, name), matches[name]) for name in sorted(matches)]
+
+    def cached(self, key, file_path, build):
+        """
+        Return `build()`, reusing the result from `self.cache` while `file_path` is unchanged.  None is not cached.
+        """
+        signature = file_signature(file_path) if self.cache is not None else None
+        if signature is None:
+            return build()
+
+        key = key + (file_path, signature)
+        value = self.cache.get(key)
+        if value is None:
+            value = build()
+            if value is not None:
+                self.cache.set(key, value)
+        return value
+
+    def split_fragment(self, file_name):
+        """
+        Split `file.py#L10-L20`, `file.py#region` or `file.py::Class.method` into the file name and the fragment,
+        which may be None.  Symbol fragments keep their leading `::`.
+        """
+        if '::' in file_name:
+            file_name, symbol = file_name.split('::', 1)
+            return file_name, '::' + symbol.strip()
+        if '#' in file_name:
+            file_name, fragment = file_name.rsplit('#', 1)
+            return file_name, fragment.strip() or None
+        return file_name, None
+
+    def resolve_target(self, target):
+        """
+        Split `target` with :meth:`split_fragment` and find the file, returning `(file_name, fragment, file_path)`.
+
+        A file named by the whole target, such as `a#b.js`, is included whole rather than read as `a` and the
+        region `b.js`.
+        """
+        file_name, fragment = self.split_fragment(target)
+        if fragment is not None and not fragment.startswith('::'):
+            file_path = self.find_file_path(target)
+            if file_path:
+                return target, None, file_path
+        return file_name, fragment, self.find_file_path(file_name)
+
+    def handle_code(self, file_path, file_extension, fragment=None):
         """
         Parse source code lines
+
+        `fragment` may select a range of lines, `L120-L180`, or a region marked in the file with
+        `docdown:region name` and `docdown:endregion` comments, or a symbol, `::ClassName.method`.  Returns None if
+        the region or symbol does not exist.
         """
-        md_lines = []
         code_type = self.extension_map.get(file_extension, file_extension)
+        if fragment:
+            key = ('code', code_type, fragment)
+            lines = self.cached(key, file_path, lambda: self.read_code_fragment(file_path, code_type, fragment))
+        else:
+            key = ('code', code_type)
+            lines = self.cached(key, file_path, lambda: tuple(self.read_code(file_path, code_type)))
+        return list(lines) if lines is not None else None
+
+    def find_symbol(self, file_path, symbol):
+        """
+        Return the `(start, end)` lines of `symbol` in the included file, or None if it is not defined there.
+
+        The indexer is chosen by the file's extension, or failing that by what `self.extension_map` maps it to.
+        """
+        file_extension = os.path.splitext(file_path)[1]
+        indexer = self.symbol_indexers.get(file_extension)
+        if indexer is None:
+            indexer = self.symbol_indexers.get(self.extension_map.get(file_extension))
+        if indexer is None:
+            logger.warning('No symbol indexer for %s files', file_extension)
+            return None
+        return get_symbols(file_path, indexer, self.symbol_cache_directory).get(symbol)
+
+    def read_lines(self, file_path, fragment):
+        """
+        Read a range of lines, a named region or a symbol of the included file, or None if the region or symbol does
+        not exist
+        """
+        line_index = get_line_index(file_path)
+        if fragment.startswith('::'):
+            lines = self.find_symbol(file_path, fragment[2:])
+            return line_index.lines(*lines) if lines is not None else None
+
+        m = self.LINE_RANGE_RE.match(fragment)
+        if m:
+            start = int(m.group('start'))
+            end = int(m.group('end') or start)
+            return line_index.lines(start, end)
+        return line_index.region(fragment)
+
+    def read_code_fragment(self, file_path, code_type, fragment):
+        """
+        Read a range of lines or a named region of the included file into fenced code lines
+        """
+        lines = self.read_lines(file_path, fragment)
+        if lines is None:
+            return None
+        return tuple(['``` %s' % code_type] + lines + ['```'])
+
+    def read_code(self, file_path, code_type):
+        """
+        Read the included file into fenced code lines
+        """
+        md_lines = []
         included_file = codecs.open(file_path, 'r')
         # TODO: We are forcing the backticks in here.  Should this extension
         # ensure that the fenced_code extension is loaded and raise an exception
@@ -61,42 +283,290 @@ class IncludePreprocessor(Preprocessor):
         return md_lines
 
     def build_csv_table(self, file_path):
-        table_html = ['<table>']
-        with open(file_path, 'rb') as csvfile:
-            reader = unicodecsv.reader(csvfile)
-            for index, row in enumerate(reader):
-                table_html.append('<tr>')
-                for column in row:
-                    table_html.append('<th>' if index == 0 else '<td>')
-                    table_html.append(column)
-                    table_html.append('</th>' if index == 0 else '</td>')
-                table_html.append('</tr>')
-        table_html.append('</table>')
-        return table_html
+        """
+        Render the csv file as a list of html table chunks, one per row
+        """
+        return list(iter_csv_table(file_path, max_rows=self.csv_max_rows, max_bytes=self.csv_max_bytes))
+
+    def render_csv(self, file_path):
+        """
+        Render csv file as an html table
+        """
+        if self.use_csv_sidecar(file_path):
+            return self.render_csv_sidecar(file_path)
+        key = ('csv', self.csv_max_rows, self.csv_max_bytes)
+        return self.cached(key, file_path, lambda: ''.join(self.build_csv_table(file_path)))
+
+    def use_csv_sidecar(self, file_path):
+        if not self.csv_sidecar_directory or self.csv_sidecar_threshold is None:
+            return False
+        return os.path.getsize(file_path) >= self.csv_sidecar_threshold
+
+    def render_csv_sidecar(self, file_path):
+        """
+        Write the whole csv table to a sidecar file in `self.csv_sidecar_directory` and return a preview of its first
+        rows which links to the sidecar
+        """
+        file_name = write_csv_sidecar(file_path, self.csv_sidecar_directory)
+        url = '%s/%s' % (self.csv_sidecar_url.rstrip('/'), file_name) if self.csv_sidecar_url else file_name
+        key = ('csv_sidecar', url, self.csv_sidecar_preview_rows)
+        return self.cached(key, file_path, lambda: render_csv_preview(file_path, url, self.csv_sidecar_preview_rows))
 
     def handle_csv(self, file_path):
         """
         Parse csv file and return as an html table
         """
-        return self.markdown.htmlStash.store(''.join(self.build_csv_table(file_path)), safe=True)
+        return self.markdown.htmlStash.store(self.render_csv(file_path), safe=True)
+
+    def handle_fragment(self, file_path, fragment=None):
+        """
+        Read an included markdown fragment, or a range or region of it, as lines
+        """
+        key = ('fragment', fragment, self.markdown.tab_length)
+        lines = self.cached(key, file_path, lambda: self.read_fragment_lines(file_path, fragment))
+        return list(lines) if lines is not None else None
+
+    def read_fragment_lines(self, file_path, fragment=None):
+        """
+        Read an included markdown fragment, normalizing line endings and tabs like markdown does for the document
+        """
+        if fragment:
+            lines = self.read_lines(file_path, fragment)
+        else:
+            with io.open(file_path, 'r', encoding='utf-8') as included_file:
+                lines = included_file.read().replace('\r\n', '\n').replace('\r', '\n').split('\n')
+        if lines is None:
+            return None
+        return tuple(line.expandtabs(self.markdown.tab_length) for line in lines)
+
+    def load_include(self, target):
+        """
+        Resolve and read the file for a `+++ target` line.
+
+        This does not touch the markdown instance or the dependency graph, so it can be run from worker threads.
+        `content` is None if the file or the requested region could not be found.
+        """
+        return self.load_file(*self.resolve_target(target))
+
+    def load_file(self, file_name, fragment, file_path):
+        """
+        Read the resolved `file_path` for `file_name` as an :class:`IncludedFile`
+        """
+        if not file_path:
+            return IncludedFile(file_name, fragment, None, 'missing', None, None)
+
+        file_extension = os.path.splitext(file_name)[1]
+        if file_extension in self.fragment_extensions:
+            kind = 'fragment'
+            content = self.handle_fragment(file_path, fragment)
+        elif file_extension == '.csv':
+            kind = 'csv'
+            content = self.render_csv(file_path)
+        else:
+            kind = 'code'
+            content = self.handle_code(file_path, file_extension, fragment)
+        digest = file_digest(file_path) if content is not None else None
+        return IncludedFile(file_name, fragment, file_path, kind, content, digest)
+
+    def load_include_or_error(self, target):
+        try:
+            return self.load_include(target)
+        except Exception as e:
+            return e
+
+    def prefetch(self, lines):
+        """
+        Load every include in `lines` concurrently using `self.prefetch_workers` threads.
+
+        Returns a dict of target to :class:`IncludedFile`, or to the exception raised while loading it.  Exceptions
+        are raised later when the include is reached in document order.
+        """
+        targets = list(OrderedDict((line[3:].strip(), None) for line in lines
+                                   if line.startswith('+++') and not self.is_glob(line[3:])))
+        if len(targets) < 2:
+            return {}
+        if self._pool is None:
+            self._pool = ThreadPool(self.prefetch_workers)
+        return dict(zip(targets, self._pool.map(self.load_include_or_error, targets)))
+
+    def handle_include(self, target, parent=None, stack=(), included=None, deferrable=True):
+        """
+        Return the markdown lines for a single `+++ target` line.
+
+        Markdown fragments are expanded recursively.  `stack` holds the fragments currently being expanded and
+        `parent` is the fragment the include was found in, or None for the document itself.  `included` is the
+        already loaded :class:`IncludedFile` for `target`, if it was prefetched.  `deferrable` is False inside a
+        scoped code tab group.
+        """
+        if included is None:
+            file_name, fragment, file_path = self.resolve_target(target)
+            if file_path is None and self.is_glob(file_name):
+                # A file literally named like a glob, such as `test[1].js`, is included rather than matched
+                self.add_lookups(parent, file_name)
+                return self.handle_glob(file_name, fragment, parent, stack, deferrable)
+            included = self.load_file(file_name, fragment, file_path)
+        elif isinstance(included, Exception):
+            raise included
+
+        fragment = self.split_fragment(target)[1]
+        if fragment is not None and not fragment.startswith('::') and included.file_name != target:
+            # No file is named by the whole target, as checked by resolve_target
+            self.add_lookups(parent, target)
+        self.add_lookups(parent, included.file_name, included.file_path)
+        return self.insert_include(included, parent, stack, deferrable)
+
+    def handle_glob(self, pattern, fragment=None, parent=None, stack=(), deferrable=True):
+        """
+        Return the markdown lines for every file matching a `+++ pattern` line, in file name order.
+
+        With `self.glob_code_tabs` the blocks are wrapped in a `|~ ... ~|` scoped code tab group.  The pattern within
+        each asset directory it was matched in is recorded in the dependency graph with a None digest.
+        """
+        for asset_directory in self.asset_directories():
+            self.add_dependency_path(parent, os.path.join(asset_directory, pattern), None)
+        matches = self.find_glob_paths(pattern)
+        if not matches:
+            logger.warning('No included files match %s', pattern)
+            return []
 
-    def run(self, lines):
         md_lines = []
+        for file_name, file_path in matches:
+            lines = self.insert_include(self.load_file(file_name, fragment, file_path), parent, stack,
+                                        deferrable=deferrable and not self.glob_code_tabs)
+            if lines:
+                if md_lines:
+                    md_lines.append('')
+                md_lines.extend(lines)
+        if self.glob_code_tabs and md_lines:
+            md_lines = ['|~'] + md_lines + ['~|']
+        return md_lines
+
+    def insert_include(self, included, parent=None, stack=(), deferrable=True):
+        """
+        Return the markdown lines for a loaded :class:`IncludedFile`, recording it in the dependency graph
+
+        Code of at least `self.defer_threshold` lines is rendered now and replaced by a single placeholder line, unless
+        `deferrable` is False because a later preprocessor needs to see the fenced code.  The includes of a markdown
+        fragment inserted where `deferrable` is False are not deferred either.
+        """
+        if included.kind == 'missing':
+            logger.warning('Included file %s could not be found', included.file_name)
+            return []
+        if included.content is None:
+            logger.warning('%s could not be found in %s', included.fragment, included.file_path)
+            # The region or symbol may be added to the file later
+            self.add_dependency_path(parent, included.file_path, file_digest(included.file_path))
+            return []
+
+        if included.kind == 'fragment':
+            resolved_path = os.path.abspath(included.file_path)
+            if resolved_path in stack:
+                raise IncludeError('Include cycle: %s' % ' -> '.join(stack + (resolved_path,)))
+            if len(stack) >= self.max_depth:
+                raise IncludeError('Includes nested more than %d deep: %s' % (
+                    self.max_depth, ' -> '.join(stack + (resolved_path,))))
+            self.add_dependency(parent, included)
+            lines = self.filter_platform_sections(included.content)
+            return self.expand(lines, resolved_path, stack + (resolved_path,), deferrable)
+
+        self.add_dependency(parent, included)
+        if included.kind == 'csv':
+            return [self.markdown.htmlStash.store(included.content, safe=True)]
+        if deferrable and self.defer_threshold and len(included.content) - 2 >= self.defer_threshold:
+            file_extension = os.path.splitext(included.file_name)[1]
+            code_type = self.extension_map.get(file_extension, file_extension)
+            placeholder = self.markdown.htmlStash.store(self.render_code(code_type, included.content[1:-1]), safe=True)
+            # Blank lines keep the placeholder in a block of its own, as fenced_code does
+            return ['', placeholder, '']
+        return included.content
+
+    def filter_platform_sections(self, lines):
+        """
+        Filter the platform sections of an included markdown fragment for the platform being rendered.
+
+        `docdown.platform_section` runs before includes are expanded, so fragments are filtered here instead.
+        """
+        if 'platform_sections' not in self.markdown.preprocessors:
+            return lines
+        platform_sections = self.markdown.preprocessors['platform_sections']
+        return platform_sections.process_platform_sections('\n'.join(lines)).split('\n')
+
+    def codehilite_config(self):
+        for extension in self.markdown.registeredExtensions:
+            if isinstance(extension, CodeHiliteExtension):
+                return extension.config
+        return None
+
+    def render_code(self, code_type, lines):
+        """
+        Render code lines as html the same way `markdown.extensions.fenced_code` would, highlighted with codehilite
+        if it is in use
+        """
+        code = '\n'.join(lines) + '\n'
+        lang = code_type.lstrip('.')
+        config = self.codehilite_config()
+        if config:
+            return CodeHilite(code,
+                              linenums=config['linenums'][0],
+                              guess_lang=config['guess_lang'][0],
+                              css_class=config['css_class'][0],
+                              style=config['pygments_style'][0],
+                              use_pygments=config['use_pygments'][0],
+                              lang=lang or None,
+                              noclasses=config['noclasses'][0]).hilite()
+        return '<pre><code%s>%s</code></pre>' % (' class="%s"' % lang if lang else '', escape(code))
+
+    def add_dependency(self, parent, included):
+        self.add_dependency_path(parent, included.file_path, included.digest)
+
+    def add_dependency_path(self, parent, path, digest):
+        self.dependency_graph.setdefault(parent, []).append((os.path.abspath(path), digest))
+
+    def add_lookups(self, parent, file_name, file_path=None):
+        """
+        Record the paths where `file_name` was looked for and not found, nearest first, with a None digest.
+
+        These are every asset directory's path for `file_name` up to `file_path`, where it was found, or all of them
+        if it was not found.  A file created at one of them would be included instead.
+        """
+        found = os.path.abspath(file_path) if file_path else None
+        candidates = []
+        for asset_directory in self.asset_directories():
+            candidate = os.path.abspath(os.path.join(asset_directory, file_name))
+            if candidate == found:
+                break
+            if candidate not in candidates:
+                candidates.append(candidate)
+        if candidates:
+            self.dependency_graph.setdefault(parent, []).extend((candidate, None) for candidate in candidates)
+
+    def expand(self, lines, parent=None, stack=(), deferrable=True):
+        """
+        Return `lines` with their includes replaced.
+
+        Includes between the `|~` and `~|` fences of a scoped code tab group are never deferred, so
+        `docdown.scoped_code_tabs` still finds their fenced code.
+        """
+        prefetched = self.prefetch(lines) if self.prefetch_workers else {}
+        md_lines = []
+        in_code_tabs = False
         for line in lines:
             if line.startswith('+++'):
-                file_name = line[3:].strip()
-                file_path = self.find_file_path(file_name)
-                if not file_path:
-                    break
-                file_extension = os.path.splitext(file_name)[1]
-                if file_extension == '.csv':
-                    md_lines.append(self.handle_csv(file_path))
-                else:
-                    md_lines.extend(self.handle_code(file_path, file_extension))
+                target = line[3:].strip()
+                md_lines.extend(self.handle_include(target, parent, stack, prefetched.get(target),
+                                                    deferrable and not in_code_tabs))
             else:
+                if self.CODE_TABS_START_RE.match(line):
+                    in_code_tabs = True
+                elif in_code_tabs and self.CODE_TABS_END_RE.match(line):
+                    in_code_tabs = False
                 md_lines.append(line)
         return md_lines
 
+    def run(self, lines):
+        self.dependency_graph = OrderedDict()
+        return self.expand(lines)
+
 
 class IncludeExtension(Extension):
 
@@ -107,10 +577,72 @@ class IncludeExtension(Extension):
             'current_directory': ['', 'Root directory to stop searching for assets'],
             'root_directory': ['', 'Root directory to stop searching for assets'],
             'extension_map': [{}, ('Optional dictionary mapping one file extension to another'
-                                   ' to override the default assigned by markdown.extensions.fenced_code')]
+                                   ' to override the default assigned by markdown.extensions.fenced_code')],
+            'asset_index': [False, ('Resolve includes from an index of root_directory built once per process'
+                                    ' instead of checking each directory level on disk')],
+            'cache_max_bytes': [DEFAULT_CACHE_MAX_BYTES, ('Size of the process wide cache of rendered includes,'
+                                                          ' in characters.  0 disables caching')],
+            'csv_max_rows': [0, ('Maximum number of rows rendered below the headings of an included csv file.'
+                                 '  0 renders every row')],
+            'csv_max_bytes': [0, ('Maximum size in characters of the html table for an included csv file.'
+                                  '  0 renders every row')],
+            'fragment_extensions': [[], ('File extensions, such as .md, which are included as markdown and may'
+                                         ' include other files in turn')],
+            'max_depth': [DEFAULT_MAX_DEPTH, 'Maximum depth of nested markdown fragment includes'],
+            'prefetch_workers': [0, ('Number of threads used to resolve and read all of the includes in a document'
+                                     ' concurrently before they are inserted.  0 reads them one at a time')],
+            'symbol_indexers': [{}, ('Dict of file extension to symbol indexer used for `+++ file::Symbol` includes,'
+                                     ' added to the defaults in docdown.symbol_index.DEFAULT_INDEXERS')],
+            'symbol_cache_directory': ['', 'Directory where symbol indexes are stored between builds'],
+            'glob_code_tabs': [False, ('Wrap the files included by a glob, such as `+++ snippets/*.java`, in a'
+                                       ' scoped code tab group')],
+            'defer_threshold': [0, ('Code includes of at least this many lines are rendered to html straight away'
+                                    ' and kept out of the markdown seen by later preprocessors.  0 disables this')],
+            'csv_sidecar_threshold': [0, ('Size in bytes from which included csv files are written to a sidecar'
+                                          ' html file in csv_sidecar_directory instead of the page.  0 disables'
+                                          ' sidecars')],
+            'csv_sidecar_directory': ['', 'Directory where csv sidecar files are written'],
+            'csv_sidecar_url': ['', 'Url of csv_sidecar_directory, used to link to the sidecar files'],
+            'csv_sidecar_preview_rows': [DEFAULT_CSV_SIDECAR_PREVIEW_ROWS, ('Number of rows of a csv sidecar table'
+                                                                            ' shown in the page')],
         }
+        self.cache = None
+        self.preprocessor = None
         super(IncludeExtension, self).__init__(**kwargs)
 
+    @property
+    def dependency_graph(self):
+        """
+        Files included by the last render.
+
+        Maps None, for the rendered document, and the absolute path of each included markdown fragment to a list of
+        `(absolute path, sha1 hex digest)` for the files it included.  Paths which were looked for and not found, and
+        glob patterns, have a None digest.
+        """
+        if self.preprocessor is None:
+            return OrderedDict()
+        return self.preprocessor.dependency_graph
+
+    def set_current_directory(self, current_directory):
+        """
+        Look for includes starting from `current_directory` for the documents rendered until the next reset.
+
+        This lets one Markdown instance render documents from every directory below `root_directory`.
+        """
+        if self.preprocessor is not None:
+            self.preprocessor.current_directory = current_directory
+
+    def reset(self):
+        self.set_current_directory(self.getConfig('current_directory'))
+
+    def cache_info(self):
+        """
+        Hit and miss counters and the current size of the include cache used by this extension
+        """
+        if self.cache is None:
+            return None
+        return self.cache.info()
+
     def extendMarkdown(self, md, md_globals):
         """ Add IncludePreprocessor to the Markdown instance. """
         md.registerExtension(self)
@@ -119,15 +651,44 @@ class IncludeExtension(Extension):
         root_directory = self.getConfig('root_directory')
         current_directory = self.getConfig('current_directory')
         extension_map = self.getConfig('extension_map')
+        asset_index = self.getConfig('asset_index')
+        cache_max_bytes = self.getConfig('cache_max_bytes')
+        self.cache = get_include_cache(cache_max_bytes) if cache_max_bytes else None
+        csv_max_rows = self.getConfig('csv_max_rows') or None
+        csv_max_bytes = self.getConfig('csv_max_bytes') or None
+        fragment_extensions = self.getConfig('fragment_extensions')
+        max_depth = self.getConfig('max_depth')
+        prefetch_workers = self.getConfig('prefetch_workers')
+        symbol_indexers = self.getConfig('symbol_indexers')
+        symbol_cache_directory = self.getConfig('symbol_cache_directory') or None
+        glob_code_tabs = self.getConfig('glob_code_tabs')
+        defer_threshold = self.getConfig('defer_threshold') or None
+        csv_sidecar_threshold = self.getConfig('csv_sidecar_threshold') or None
+        csv_sidecar_directory = self.getConfig('csv_sidecar_directory') or None
+        csv_sidecar_url = self.getConfig('csv_sidecar_url')
+        csv_sidecar_preview_rows = self.getConfig('csv_sidecar_preview_rows')
 
-        md.preprocessors.add(
-            'include',
-            IncludePreprocessor(root_directory=root_directory,
-                                current_directory=current_directory,
-                                asset_directory=asset_directory,
-                                extension_map=extension_map,
-                                markdown_instance=md),
-            ">normalize_whitespace")
+        self.preprocessor = IncludePreprocessor(root_directory=root_directory,
+                                                current_directory=current_directory,
+                                                asset_directory=asset_directory,
+                                                extension_map=extension_map,
+                                                asset_index=asset_index,
+                                                cache=self.cache,
+                                                csv_max_rows=csv_max_rows,
+                                                csv_max_bytes=csv_max_bytes,
+                                                fragment_extensions=fragment_extensions,
+                                                max_depth=max_depth,
+                                                prefetch_workers=prefetch_workers,
+                                                symbol_indexers=symbol_indexers,
+                                                symbol_cache_directory=symbol_cache_directory,
+                                                glob_code_tabs=glob_code_tabs,
+                                                defer_threshold=defer_threshold,
+                                                csv_sidecar_threshold=csv_sidecar_threshold,
+                                                csv_sidecar_directory=csv_sidecar_directory,
+                                                csv_sidecar_url=csv_sidecar_url,
+                                                csv_sidecar_preview_rows=csv_sidecar_preview_rows,
+                                                markdown_instance=md)
+        add_preprocessor(md, 'include', self.preprocessor)
 
 
 def makeExtension(*args, **kwargs):
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+"""
+line_index
+----------------------------------
+
+Line offset index for included source files so that a range of lines, or a named region, can be decoded without
+reading the whole file.
+
+Regions are marked in the source with comments such as::
+
+    // docdown:region setup
+    ...
+    // docdown:endregion
+"""
+
+from __future__ import absolute_import, unicode_literals, print_function
+
+from array import array
+import bisect
+import mmap
+import re
+
+from .cache import LRUCache, file_signature
+
+
+REGION_RE = re.compile(br'docdown:(?P<end>end)?region\b[ \t]*(?P<name>[\w.-]*)')
+
+
+class LineIndex(object):
+    """
+    The byte offset of the start of every line of a file, plus the line ranges of its named regions.
+
+    The file is memory mapped to build the index and to read each slice, so only the pages holding the requested
+    lines are read once the index exists.  Line numbers are 1-based and ranges are inclusive.
+    """
+
+    def __init__(self, file_path, encoding='utf-8'):
+        self.file_path = file_path
+        self.encoding = encoding
+        self.offsets = array(str('L'), [0])
+        self.regions = {}
+        self.marker_lines = set()
+        self.size = 0
+
+        with open(file_path, 'rb') as f:
+            data = self._map(f)
+            if data is None:
+                return
+            try:
+                self._index(data)
+            finally:
+                data.close()
+
+    @staticmethod
+    def _map(f):
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            return None
+
+    def _index(self, data):
+        self.size = len(data)
+        position = data.find(b'\n')
+        while position != -1:
+            self.offsets.append(position + 1)
+            position = data.find(b'\n', position + 1)
+        if self.offsets[-1] == self.size:
+            self.offsets.pop()
+
+        open_regions = []
+        for match in REGION_RE.finditer(data):
+            line_number = bisect.bisect_right(self.offsets, match.start())
+            self.marker_lines.add(line_number)
+            name = match.group('name').decode('ascii')
+            if not match.group('end'):
+                open_regions.append((name, line_number))
+                continue
+            if name:
+                # A named end marker closes the matching region and any left open inside it
+                while open_regions and open_regions[-1][0] != name:
+                    open_regions.pop()
+            if open_regions:
+                region_name, start = open_regions.pop()
+                self.regions.setdefault(region_name, (start + 1, line_number - 1))
+
+    @property
+    def line_count(self):
+        return len(self.offsets) if self.size else 0
+
+    def lines(self, start, end, skip_markers=False):
+        """
+        Decode lines `start` through `end`, with trailing whitespace stripped from each.
+
+        The range is clamped to the lines in the file.  With `skip_markers` region marker lines are left out.
+        """
+        start = max(start, 1)
+        end = min(end, self.line_count)
+        if start > end:
+            return []
+
+        begin = self.offsets[start - 1]
+        finish = self.offsets[end] if end < len(self.offsets) else self.size
+        with open(self.file_path, 'rb') as f:
+            data = self._map(f)
+            try:
+                text = data[begin:finish].decode(self.encoding, 'replace')
+            finally:
+                data.close()
+
+        lines = text.split('\n')
+        if text.endswith('\n'):
+            lines.pop()
+        lines = [line.rstrip() for line in lines]
+        if skip_markers:
+            lines = [line for number, line in enumerate(lines, start) if number not in self.marker_lines]
+        return lines
+
+    def region(self, name):
+        """
+        Return the lines of the region called `name`, or None if there is no such region
+        """
+        try:
+            start, end = self.regions[name]
+        except KeyError:
+            return None
+        return self.lines(start, end, skip_markers=True)
+
+
+_line_indexes = LRUCache(max_size=256)
+
+
+def get_line_index(file_path):
+    """
+    Return the :class:`LineIndex` for `file_path`, reusing the cached one while the file is unchanged
+    """
+    key = (file_path, file_signature(file_path))
+    index = _line_indexes.get(key)
+    if index is None:
+        index = LineIndex(file_path)
+        _line_indexes.set(key, index)
+    return index
@@ -5,32 +5,154 @@ from __future__ import absolute_import, unicode_literals, print_function
 from markdown.treeprocessors import Treeprocessor
 from markdown.extensions import Extension
 
+from .asset_manifest import load_asset_manifest
+from .media_urls import get_media_url_resolver, is_absolute_url
+
+
+# Attributes holding media urls for each tag
+DEFAULT_MEDIA_ATTRIBUTES = {
+    'img': ['src', 'srcset'],
+    'source': ['src', 'srcset'],
+    'video': ['src', 'poster'],
+    'audio': ['src'],
+    'track': ['src'],
+    'a': ['href'],
+}
+
+# Link targets with these extensions are assets, other links are left as they are
+DEFAULT_ASSET_EXTENSIONS = ['.pdf', '.zip', '.gz', '.tgz', '.dmg', '.apk', '.ipa', '.jar', '.aar', '.png', '.jpg',
+                            '.jpeg', '.gif', '.svg', '.webp', '.mp4', '.webm', '.mov', '.mp3', '.ogg', '.wav']
+
 
 class MediaTreeprocessor(Treeprocessor):
+    """
+    Join the relative media urls in the document to the media url.
+
+    The document is walked once, and the attributes rewritten for each tag are looked up in `media_attributes`.
+    `srcset` attributes have each of their candidate urls rewritten, and `href` attributes are only rewritten when
+    they link to a file with one of `asset_extensions`.
+
+    With an `asset_manifest`, the path of a JSON manifest file or a callable returning the manifest dict, the urls of
+    the assets in the manifest include their hash, as `name.<hash>.ext` or `name.ext?v=<hash>` depending on
+    `fingerprint_style`.  The manifest is loaded once per run, and each source is looked up in it once per manifest.
+    """
 
-    def __init__(self, media_url=None, **kwargs):
+    FINGERPRINT_STYLES = ('query', 'name')
+
+    def __init__(self, media_url=None, url_resolver=None, media_attributes=None, asset_extensions=None,
+                 asset_manifest=None, fingerprint_style='query', **kwargs):
+        if fingerprint_style not in self.FINGERPRINT_STYLES:
+            raise ValueError('fingerprint_style must be one of %s, not %r' % (', '.join(self.FINGERPRINT_STYLES),
+                                                                              fingerprint_style))
         self.media_url = media_url
+        self.asset_manifest = asset_manifest
+        self.fingerprint_style = fingerprint_style
+        # Fingerprinted sources for the manifest they were looked up in
+        self._manifest = None
+        self._fingerprints = {}
+        self.url_resolver = get_media_url_resolver() if url_resolver is None else url_resolver
+        if media_attributes is None:
+            media_attributes = DEFAULT_MEDIA_ATTRIBUTES
+        if asset_extensions is None:
+            asset_extensions = DEFAULT_ASSET_EXTENSIONS
+        self.media_attributes = dict((tag, tuple(attributes)) for tag, attributes in media_attributes.items())
+        self.asset_extensions = tuple(extension.lower() for extension in asset_extensions)
         super(MediaTreeprocessor, self).__init__(**kwargs)
 
+    def get_manifest(self):
+        if callable(self.asset_manifest):
+            return self.asset_manifest()
+        if self.asset_manifest:
+            return load_asset_manifest(self.asset_manifest)
+        return None
+
+    def fingerprint(self, src):
+        """
+        Return `src` with the hash of the asset from the manifest, or unchanged if it is not in the manifest
+        """
+        fingerprinted = self._fingerprints.get(src)
+        if fingerprinted is None:
+            fingerprinted = self._fingerprints[src] = self.add_fingerprint(src)
+        return fingerprinted
+
+    def add_fingerprint(self, src):
+        if is_absolute_url(src):
+            return src
+        split = len(src)
+        for separator in '?#':
+            position = src.find(separator)
+            if position >= 0:
+                split = min(split, position)
+        path, suffix = src[:split], src[split:]
+
+        asset_path = path[2:] if path.startswith('./') else path
+        digest = self._manifest.get(asset_path.lstrip('/'))
+        if digest is None:
+            return src
+
+        if self.fingerprint_style == 'query':
+            query, hash_mark, fragment = suffix.partition('#')
+            query = '%s&v=%s' % (query, digest) if query else '?v=%s' % digest
+            return path + query + hash_mark + fragment
+
+        directory, slash, name = path.rpartition('/')
+        stem, dot, extension = name.rpartition('.')
+        if stem:
+            name = '%s.%s.%s' % (stem, digest, extension)
+        else:
+            name = '%s.%s' % (name, digest)
+        return directory + slash + name + suffix
+
+    def is_asset(self, href):
+        path = href.split('#', 1)[0].split('?', 1)[0]
+        return path.lower().endswith(self.asset_extensions)
+
+    def resolve_srcset(self, srcset):
+        """
+        Resolve each url of a `srcset` attribute, `image.png 1x, image@2x.png 2x`
+        """
+        candidates = []
+        for candidate in srcset.split(','):
+            parts = candidate.strip().split(None, 1)
+            if parts:
+                parts[0] = self.resolve(parts[0])
+                candidates.append(' '.join(parts))
+        return ', '.join(candidates)
+
+    def resolve(self, src):
+        """
+        Return the url of `src` in the media url.
+
+        Sources starting with http or // are left as they are, others are joined to the media url with a single
+        slash, see :func:`docdown.media_urls.join_media_url`.
+        """
+        if self._manifest:
+            src = self.fingerprint(src)
+        return self.url_resolver.resolve(self.media_url, src)
+
     def run(self, root):
-        image_tags = root.findall('.//img')
-        if self.media_url is not None:
-            for image_tag in image_tags:
-                tag_src = image_tag.get('src')
-                if not tag_src.lower().startswith('http') and not tag_src.startswith('//'):
-                    if tag_src.startswith('./'):
-                        tag_src = tag_src[2:]
-                    # TODO: relative image tag source starting with . like sequence
-                    # diagrams?
-
-                    # Make sure we don't create a url like http://example.org//something.html
-                    # if media_url ends with / and tag_src starts with /
-                    # example.com/ + /blah.html = example.com/blah.html
-                    # example.com + /blah.html = example.com/blah.html
-                    # example.com/ + blah.html = example.com/blah.html
-                    # example.com + blah.html = example.com/blah.html
-                    # example.com + ./blah.html = example.com/blah.html
-                    image_tag.set('src', self.media_url.rstrip('/') + '/' + tag_src.lstrip('/'))
+        if self.media_url is None:
+            return
+
+        manifest = self.get_manifest()
+        if manifest is not self._manifest:
+            self._manifest = manifest
+            self._fingerprints = {}
+
+        resolve = self.resolve
+        media_attributes = self.media_attributes
+        for element in root.iter():
+            attributes = media_attributes.get(element.tag)
+            if attributes is None:
+                continue
+            for attribute in attributes:
+                value = element.get(attribute)
+                if value is None:
+                    continue
+                if attribute == 'srcset':
+                    element.set(attribute, self.resolve_srcset(value))
+                elif attribute != 'href' or self.is_asset(value):
+                    element.set(attribute, resolve(value))
 
 
 class MediaExtension(Extension):
@@ -38,15 +160,41 @@ class MediaExtension(Extension):
     def __init__(self, **kwargs):
         self.config = {
             'media_url': ['.', 'Path or URL base for the media'],
+            'normalize_media_urls': [False, 'Resolve . and .. segments in the paths of media urls'],
+            'media_attributes': [DEFAULT_MEDIA_ATTRIBUTES, ('Dict of tag to the list of its attributes holding media'
+                                                            ' urls')],
+            'asset_extensions': [DEFAULT_ASSET_EXTENSIONS, 'File extensions of the link targets which are media'],
+            'asset_manifest': ['', ('Path of a JSON manifest of asset path to content hash, or a callable returning'
+                                    ' the manifest dict')],
+            'fingerprint_style': ['query', "'query' for name.ext?v=<hash> urls or 'name' for name.<hash>.ext urls"],
         }
+        self.treeprocessor = None
         super(MediaExtension, self).__init__(**kwargs)
 
+    def set_media_url(self, media_url):
+        """
+        Use `media_url` for the documents rendered until the next reset
+        """
+        if self.treeprocessor is not None:
+            self.treeprocessor.media_url = media_url
+
+    def reset(self):
+        self.set_media_url(self.getConfig('media_url'))
+
     def extendMarkdown(self, md, md_globals):
         """ Add MediaTreeprocessor to the Markdown instance. """
         md.registerExtension(self)
 
         media_url = self.getConfig('media_url')
-        md.treeprocessors.add('media', MediaTreeprocessor(media_url=media_url, markdown_instance=md), '>inline')
+        url_resolver = get_media_url_resolver(normalize=self.getConfig('normalize_media_urls'))
+        self.treeprocessor = MediaTreeprocessor(media_url=media_url,
+                                                url_resolver=url_resolver,
+                                                media_attributes=self.getConfig('media_attributes'),
+                                                asset_extensions=self.getConfig('asset_extensions'),
+                                                asset_manifest=self.getConfig('asset_manifest') or None,
+                                                fingerprint_style=self.getConfig('fingerprint_style'),
+                                                markdown_instance=md)
+        md.treeprocessors.add('media', self.treeprocessor, '>inline')
 
 
 def makeExtension(*args, **kwargs):
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+"""
+media_urls
+----------------------------------
+
+Resolution of image sources against a media url, shared by :mod:`docdown.media` and :mod:`docdown.sequence`.
+"""
+
+from __future__ import absolute_import, unicode_literals, print_function
+
+from collections import OrderedDict
+import posixpath
+import threading
+
+try:
+    from urllib.parse import urlsplit, urlunsplit
+except ImportError:
+    from urlparse import urlsplit, urlunsplit
+
+
+DEFAULT_MAX_SIZE = 8192
+
+
+def is_absolute_url(src):
+    """
+    Whether `src` is left as it is by :func:`join_media_url`, because it starts with http or //
+    """
+    return src.lower().startswith('http') or src.startswith('//')
+
+
+def normalize_url(url):
+    """
+    Return `url` with `.` and `..` path segments and repeated slashes removed from its path
+    """
+    parts = urlsplit(url)
+    if not parts.path:
+        return url
+    path = posixpath.normpath(parts.path)
+    if path.startswith('//'):
+        path = '/' + path.lstrip('/')
+    if parts.path.endswith('/') and not path.endswith('/'):
+        path += '/'
+    return urlunsplit(parts._replace(path=path))
+
+
+def join_media_url(base, src, normalize=False):
+    """
+    Return the url of the media `src` relative to the media url `base`.
+
+    Sources starting with http or // are returned unchanged.  Otherwise a leading `./` is removed and the source is
+    joined to `base` with a single slash, so `example.com/` and `example.com` both give `example.com/image.png` for
+    `image.png`, `/image.png` and `./image.png`.  If `base` is None the source is only stripped of its `./`.  With
+    `normalize` the `.` and `..` segments of the resulting path are resolved.
+    """
+    if is_absolute_url(src):
+        return src
+    if src.startswith('./'):
+        src = src[2:]  # ./assets/image.png -> assets/image.png
+    if base is None:
+        url = src
+    else:
+        url = base.rstrip('/') + '/' + src.lstrip('/')
+    if normalize:
+        url = normalize_url(url)
+    return url
+
+
+class MediaURLResolver(object):
+    """
+    Memoized :func:`join_media_url`.
+
+    Urls are kept in a least recently used memo of up to `max_size` entries keyed by `(base, src)`, so pages which
+    use the same images many times, or a tree of pages sharing a media url, only join each url once.
+    """
+
+    def __init__(self, normalize=False, max_size=DEFAULT_MAX_SIZE):
+        self.normalize = normalize
+        self.max_size = max_size
+        self._urls = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._urls)
+
+    def resolve(self, base, src):
+        key = (base, src)
+        url = self._urls.get(key)
+        if url is not None:
+            try:
+                self._urls.move_to_end(key)
+            except (AttributeError, KeyError):
+                # Python 2, or evicted by another thread since the lookup
+                pass
+            return url
+
+        url = join_media_url(base, src, normalize=self.normalize)
+        if self.max_size:
+            with self._lock:
+                self._urls[key] = url
+                while len(self._urls) > self.max_size:
+                    self._urls.popitem(last=False)
+        return url
+
+    def clear(self):
+        with self._lock:
+            self._urls.clear()
+
+
+_resolvers = {}
+_resolvers_lock = threading.Lock()
+
+
+def get_media_url_resolver(normalize=False):
+    """
+    Return the process wide :class:`MediaURLResolver` with or without path normalization, creating it if needed
+    """
+    with _resolvers_lock:
+        resolver = _resolvers.get(normalize)
+        if resolver is None:
+            resolver = _resolvers[normalize] = MediaURLResolver(normalize=normalize)
+        return resolver
@@ -11,21 +11,39 @@ from __future__ import absolute_import, unicode_literals, print_function
 
 from markdown.extensions import Extension
 from markdown.preprocessors import Preprocessor
+from collections import namedtuple
+import bisect
+import logging
 import re
 
-from .docdown import TemplateRenderMixin
+from .docdown import TemplateRenderMixin, add_preprocessor
 
 
+logger = logging.getLogger(__name__)
+
 DEFAULT_ADAPTER = 'docdown.template_adapters.StringFormatAdapter'
 
+NoteTemplate = namedtuple('NoteTemplate', ['prefix', 'postfix'])
+
 
 class NoteBlockPreprocessor(TemplateRenderMixin, Preprocessor):
+    """
+    Replace `!!! TYPE ... !!!` blocks, found in a single pass over the lines, with the note type's rendered templates.
+    """
 
     RE = re.compile(r'''
 (?P<fence>^(?:!{3,}))\W(?P<type>\w+)\W*\n
 (?P<content>.*?)(?<=\n)
 (?P=fence)[ ]*$''', re.MULTILINE | re.DOTALL | re.VERBOSE)
 
+    # An opening fence and note type on one line, `!!! MUST`
+    OPENER_RE = re.compile(r'(?P<fence>!{3,})\W(?P<type>\w+)\W*\Z')
+    # An opening fence on a line of its own, when the type starts the following line
+    BARE_FENCE_RE = re.compile(r'(?P<fence>!{3,})\Z')
+    TYPE_LINE_RE = re.compile(r'(?P<type>\w+)\W*\Z')
+    CLOSER_RE = re.compile(r'(?P<fence>!{3,}) *\Z')
+    NON_WORD_RE = re.compile(r'\W*\Z')
+
     def __init__(self, prefix='', postfix='', tags=None, template_adapter=DEFAULT_ADAPTER, default_tag='', **kwargs):
         if tags is None:
             tags = {}
@@ -34,38 +52,204 @@ class NoteBlockPreprocessor(TemplateRenderMixin, Preprocessor):
         self.tags = tags
         self.default_tag = default_tag
         super(NoteBlockPreprocessor, self).__init__(template_adapter=template_adapter, **kwargs)
+        self.templates = {}
+        self.renderer = None
+        # Warnings for the notes which were never closed or were closed with a nested note still open, by the last run
+        self.problems = []
+
+    def get_template(self, fence_type):
+        """
+        Return the rendered :class:`NoteTemplate` for a note of type `fence_type`, using the default tag if it is not
+        one of `self.tags`.
+
+        Each tag is rendered once.  Its context is copied with `tag` added, so `self.tags` is left unchanged.  Clear
+        `self.templates` after changing the tags or templates.
+        """
+        css_class = fence_type.lower()
+        if css_class not in self.tags:
+            css_class = self.default_tag
+
+        template = self.templates.get(css_class)
+        if template is None:
+            if self.renderer is None:
+                self.renderer = self.get_template_adapter()
+            context = dict(self.tags.get(css_class, {}), tag=css_class)
+            prefix_template = context.get('prefix', self.prefix)
+            postfix_template = context.get('postfix', self.postfix)
+            template = NoteTemplate(prefix=self.renderer.render(template=prefix_template, context=context),
+                                    postfix=self.renderer.render(template=postfix_template, context=context))
+            self.templates[css_class] = template
+        return template
+
+    def stash_tags(self, fence_type):
+        """
+        Return the stash placeholders for the prefix and postfix of a note of type `fence_type`
+        """
+        template = self.get_template(fence_type)
+        start_tag = self.markdown.htmlStash.store(template.prefix, safe=True)
+        end_tag = self.markdown.htmlStash.store(template.postfix, safe=True)
+        return start_tag, end_tag
 
     def run(self, lines):
-        text = "\n".join(lines)
-        renderer = self.get_template_adapter()
-        while 1:
-            m = self.RE.search(text)
+        lines = "\n".join(lines).split("\n")
+        scanner = _NoteScanner(self, lines)
+        self.problems = []
+
+        new_lines = []
+        # Closing fence indexes of the notes which are open, innermost last, and their opening line numbers
+        open_notes, open_lines = [], {}
+        index, offset = 0, 0
+        while index < len(lines):
+            if index in scanner.end_tags:
+                # The closing fence of a note found earlier
+                new_lines.extend(['', scanner.end_tags[index], ''][offset:])
+                self.close_note(open_notes, open_lines, index)
+            else:
+                note = scanner.match(index)
+                if note is not None:
+                    fence_type, content_start, closer = note
+                    start_tag, end_tag = self.stash_tags(fence_type)
+                    new_lines.extend(['', start_tag, ''])
+                    scanner.close(closer, end_tag)
+                    open_notes.append(closer)
+                    open_lines[closer] = index + 1
+                    # Notes may be nested in the content, so continue from its first line
+                    index, offset = content_start
+                    continue
+                if self.OPENER_RE.match(lines[index]):
+                    self.report('Note block at line %d is never closed: %s', index + 1, lines[index])
+                new_lines.append(lines[index])
+            index, offset = index + 1, 0
+
+        return new_lines
+
+    def close_note(self, open_notes, open_lines, closer):
+        """
+        Remove the note closed by the fence at `closer` from the open notes, reporting it if a note nested in it is
+        still open.  Notes closed out of order are left on the stack and dropped once they reach the top.
+        """
+        line_number = open_lines.pop(closer)
+        if open_notes[-1] != closer:
+            self.report('Note block at line %d is closed at line %d while the note block at line %d inside it'
+                        ' is open.  Use a different fence, such as !!!!, for nested notes.',
+                        line_number, closer + 1, open_lines[open_notes[-1]])
+        while open_notes and open_notes[-1] not in open_lines:
+            open_notes.pop()
+
+    def report(self, message, *args):
+        logger.warning(message, *args)
+        self.problems.append(message % args)
+
+
+class _NoteScanner(object):
+    """
+    Finds the note starting at a line the same way :attr:`NoteBlockPreprocessor.RE` would.
+
+    Positions are `(line index, offset)` pairs.  The offset is only non-zero within a closing fence which has
+    already been replaced by the lines `['', end tag, '']`.
+    """
+
+    def __init__(self, preprocessor, lines):
+        self.preprocessor = preprocessor
+        self.lines = lines
+        self.end_tags = {}
+        self.closers = {}
+        # Positions in self.closers of used closing fences to the position of a later, or earlier, closing fence
+        self.skip = {}
+        self.skip_back = {}
+        for index, line in enumerate(lines):
+            m = preprocessor.CLOSER_RE.match(line)
             if m:
-                fence_type = m.group('type')
-                css_class = fence_type.lower()
-                content = m.group('content')
+                self.closers.setdefault(m.group('fence'), []).append(index)
 
-                try:
-                    context = self.tags[css_class]
-                except KeyError:
-                        css_class = self.default_tag
-                        context = self.tags.get(css_class, {})
+    def virtual_lines(self, index):
+        if index in self.end_tags:
+            return ['', self.end_tags[index], '']
+        return [self.lines[index]]
 
-                context.update({'tag': css_class})
+    def match(self, index):
+        """
+        Return `(type, content start position, closing fence index)` for a note opened at line `index`, or None
+        """
+        line = self.lines[index]
+        if not line.startswith('!!!'):
+            return None
 
-                prefix_template = context.get('prefix', self.prefix)
-                postfix_template = context.get('postfix', self.postfix)
-                prefix = renderer.render(template=prefix_template, context=context)
-                postfix = renderer.render(template=postfix_template, context=context)
+        type_line = index
+        m = self.preprocessor.OPENER_RE.match(line)
+        if m is None:
+            m = self.preprocessor.BARE_FENCE_RE.match(line)
+            if m is None or index + 1 >= len(self.lines) or index + 1 in self.end_tags:
+                return None
+            type_line = index + 1
+            type_match = self.preprocessor.TYPE_LINE_RE.match(self.lines[type_line])
+            if type_match is None:
+                return None
+            fence_type = type_match.group('type')
+        else:
+            fence_type = m.group('type')
+        fence = m.group('fence')
 
-                start_tag = self.markdown.htmlStash.store(prefix, safe=True)
-                end_tag = self.markdown.htmlStash.store(postfix, safe=True)
+        # The opening fence takes in every following line without word characters.  The content starts at the
+        # first line with one, unless no closing fence follows it.
+        run_end = self.run_end(type_line)
+        if run_end is None:
+            return None
 
-                text = '%s\n%s\n\n%s\n%s\n%s' % (text[:m.start()], start_tag, content, end_tag, text[m.end():])
-            else:
-                break
+        closers = self.closers.get(fence, [])
+        position = self.unused_closer(fence, bisect.bisect_left(closers, run_end[0]))
+        if position < len(closers):
+            return fence_type, run_end, closers[position]
+
+        # Otherwise a note with no content closes at the last closing fence taken in by the opening fence
+        position = self.unused_closer_before(fence, bisect.bisect_left(closers, run_end[0]) - 1)
+        if position >= 0 and closers[position] > type_line:
+            return fence_type, (closers[position], 0), closers[position]
+        return None
+
+    def unused_closer(self, fence, position):
+        """
+        Return the position in `self.closers[fence]` of the first closing fence at or after `position` which has not
+        been used yet.  Runs of used fences are skipped in one step once they have been walked.
+        """
+        closers = self.closers.get(fence, [])
+        skipped = []
+        while position < len(closers) and closers[position] in self.end_tags:
+            skipped.append(position)
+            position = self.skip.get((fence, position), position + 1)
+        for used in skipped:
+            self.skip[(fence, used)] = position
+        return position
+
+    def unused_closer_before(self, fence, position):
+        """
+        Return the position in `self.closers[fence]` of the last closing fence at or before `position` which has not
+        been used yet, or -1.  Runs of used fences are skipped in one step once they have been walked.
+        """
+        closers = self.closers.get(fence, [])
+        skipped = []
+        while position >= 0 and closers[position] in self.end_tags:
+            skipped.append(position)
+            position = self.skip_back.get((fence, position), position - 1)
+        for used in skipped:
+            self.skip_back[(fence, used)] = position
+        return position
+
+    def run_end(self, type_line):
+        """
+        Return the position of the first line after `type_line` with a word character, or of the last line if
+        there is none.  Returns None if `type_line` is the last line.
+        """
+        last = None
+        for index in range(type_line + 1, len(self.lines)):
+            for offset, line in enumerate(self.virtual_lines(index)):
+                last = (index, offset)
+                if not self.preprocessor.NON_WORD_RE.match(line):
+                    return last
+        return last
 
-        return text.split("\n")
+    def close(self, index, end_tag):
+        self.end_tags[index] = end_tag
 
 
 class NoteExtension(Extension):
@@ -116,14 +300,12 @@ class NoteExtension(Extension):
         template_adapter = self.getConfig('template_adapter')
         default_tag = self.getConfig('default_tag')
 
-        md.preprocessors.add('note_blocks',
-                             NoteBlockPreprocessor(prefix=prefix,
-                                                   postfix=postfix,
-                                                   tags=tags,
-                                                   template_adapter=template_adapter,
-                                                   default_tag=default_tag,
-                                                   markdown_instance=md),
-                             ">normalize_whitespace")
+        add_preprocessor(md, 'note_blocks', NoteBlockPreprocessor(prefix=prefix,
+                                                                  postfix=postfix,
+                                                                  tags=tags,
+                                                                  template_adapter=template_adapter,
+                                                                  default_tag=default_tag,
+                                                                  markdown_instance=md))
 
 
 def makeExtension(*args, **kwargs):
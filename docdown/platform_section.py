@@ -9,53 +9,180 @@ docdown.platform_section Markdown extension module
 
 from __future__ import absolute_import, print_function, unicode_literals
 
+from collections import OrderedDict, deque
+import bisect
 import re
 
 from markdown.extensions import Extension
 from markdown.preprocessors import Preprocessor
 
+from .docdown import add_preprocessor, set_render_context
+
 
 class PlatformSectionPreprocessor(Preprocessor):
+    """
+    Keep the `@![sections] ... !@` sections listing the configured platform and remove the others, in one pass.
+    """
 
     PLATFORM_SECTION_RE = re.compile(r'''@!\[(?P<sections>[\w, ]+)\](?P<content>.*?)!@''', re.DOTALL | re.VERBOSE)
+    SECTION_HEADER_RE = re.compile(r'@!\[(?P<sections>[\w, ]+)\]')
+    SECTION_END = '!@'
+    INCLUDE_LINE_START = '\n+++'
 
-    STARTSWITH_WHITESPACE_RE = re.compile(r'^\W+(@!\[|\n)')
-    MULTI_NEWLINE_RE = re.compile(r'^(\n){2,}')
+    NON_WORD_RE = re.compile(r'\W*')
+    WHITESPACE_RE = re.compile(r'\s*')
 
-    def __init__(self, platform_section, **kwargs):
+    def __init__(self, platform_section, platform_groups=None, **kwargs):
         self.platform_section = platform_section.lower().strip()
+        # Number of platform sections found, and of `+++` include lines removed with them, by the last run
+        self.sections_found = 0
+        self.includes_skipped = 0
+        # A bit for each lowercased platform or group name, and the compiled mask of each section list seen
+        self.platform_bits = {}
+        self.section_masks = {}
+        self.group_masks = {}
+        for group, platforms in (platform_groups or {}).items():
+            mask = self.platform_bit(group)
+            for platform in platforms:
+                mask |= self.platform_bit(platform)
+            self.group_masks[group.lower().strip()] = mask
         super(PlatformSectionPreprocessor, self).__init__(**kwargs)
 
     def run(self, lines):
         text = "\n".join(lines)
+        self.sections_found = 0
+        self.includes_skipped = 0
         text = self.process_platform_sections(text)
         return text.split("\n")
 
     def split_sections(self, sections_group):
         return [section.lower().strip() for section in sections_group.split(',')]
 
-    def process_platform_sections(self, text):
-        while 1:
-            m = self.PLATFORM_SECTION_RE.search(text)
-            if m:
-                sections = self.split_sections(m.group('sections'))
-
-                start = text[:m.start()]
-                end = text[m.end():]
-                if self.STARTSWITH_WHITESPACE_RE.match(end):
-                    if self.MULTI_NEWLINE_RE.match(end):
-                        end = '\n' + end.lstrip()
-                    else:
-                        end = end.lstrip()
-
-                if self.platform_section in sections:
-                    content = m.group('content')
-                    text = '%s%s%s' % (start, content, end)
-                else:
-                    text = '%s%s' % (start, end)
-            else:
+    def platform_bit(self, platform):
+        """
+        Return the bit standing for `platform`, case insensitively
+        """
+        name = platform.lower().strip()
+        bit = self.platform_bits.get(name)
+        if bit is None:
+            bit = self.platform_bits[name] = 1 << len(self.platform_bits)
+        return bit
+
+    def section_mask(self, sections_group):
+        """
+        Return the mask of the platforms listed in a section header, such as `iOS, mobile`.
+
+        Groups stand for their own name and all of their platforms.  Masks are compiled once per distinct header.
+        """
+        mask = self.section_masks.get(sections_group)
+        if mask is None:
+            mask = 0
+            for section in self.split_sections(sections_group):
+                mask |= self.group_masks.get(section) or self.platform_bit(section)
+            self.section_masks[sections_group] = mask
+        return mask
+
+    def header_masks(self, text):
+        """
+        Return the set of masks of the platform section headers in `text`
+        """
+        return set(self.section_mask(sections) for sections in set(self.SECTION_HEADER_RE.findall(text)))
+
+    def variant_platforms(self, text):
+        """
+        Return the set of lowercased platform and group names shown by the platform sections in `text`.
+
+        Every other platform gets the text with all of its platform sections removed.
+        """
+        shown = 0
+        for mask in self.header_masks(text):
+            shown |= mask
+        return set(name for name, bit in self.platform_bits.items() if shown & bit)
+
+    def platform_classes(self, text, platforms):
+        """
+        Group `platforms` into lists of platforms which get the same text from `text`, in the order they are given.
+
+        Only the section headers are looked at.  Platforms which are in the same section lists make the same choice
+        for every platform section, so the text left for them is the same and only needs rendering once.  The
+        platforms are split into classes with a mask for each distinct header.
+        """
+        bits = [self.platform_bit(platform) for platform in platforms]
+        classes = [sum(set(bits))]
+        for mask in self.header_masks(text):
+            classes = [part for members in classes for part in (members & mask, members & ~mask) if part]
+
+        grouped = OrderedDict()
+        for platform, bit in zip(platforms, bits):
+            members = next(members for members in classes if members & bit)
+            grouped.setdefault(members, []).append(platform)
+        return list(grouped.values())
+
+    def process_platform_sections(self, text, platform_section=None):
+        """
+        Return `text` filtered for `platform_section`, or the configured platform
+        """
+        if platform_section is None:
+            platform_section = self.platform_section
+        platform_bit = self.platform_bit(platform_section)
+
+        ends = [m.start() for m in re.finditer(re.escape(self.SECTION_END), text)]
+        output = []
+        # (end position, end of the whitespace removed after it, its replacement, index in `ends`) for each section
+        # being shown which contains `position`, outermost first
+        shown = deque()
+        # The run of non-word characters after the last section end, and the last newline or section header in it
+        run_end, run_stop = 0, -1
+
+        position = 0
+        header = self.SECTION_HEADER_RE.search(text)
+        while header is not None:
+            while shown and shown[0][0] < header.start():
+                end, after, replacement, _ = shown.popleft()
+                output.extend([text[position:end], replacement])
+                position = after
+            if header.start() < position:
+                # The header started at the end of a shown section, which has been removed
+                header = self.SECTION_HEADER_RE.search(text, position)
+                continue
+
+            index = bisect.bisect_left(ends, header.end())
+            if shown:
+                # The ends of the shown sections have already been removed from the text
+                index = max(index, shown[-1][3] + 1)
+            if index == len(ends):
+                # This and every later section is never closed
                 break
-        return text
+            self.sections_found += 1
+
+            end = ends[index]
+            after = end + len(self.SECTION_END)
+            if after >= run_end:
+                run_end = self.NON_WORD_RE.match(text, after).end()
+                run_stop = max(text.rfind('\n', after, run_end), text.rfind('@![', after, run_end))
+            if run_stop > after:
+                replacement = '\n' if text.startswith('\n\n', after) else ''
+                after = self.WHITESPACE_RE.match(text, after).end()
+            else:
+                replacement = ''
+
+            output.append(text[position:header.start()])
+            if self.section_mask(header.group('sections')) & platform_bit:
+                shown.append((end, after, replacement, index))
+                position = header.end()
+            else:
+                # Any sections being shown end inside the removed section
+                shown.clear()
+                self.includes_skipped += text.count(self.INCLUDE_LINE_START, header.end(), end)
+                output.append(replacement)
+                position = after
+            header = self.SECTION_HEADER_RE.search(text, position)
+
+        for end, after, replacement, _ in shown:
+            output.extend([text[position:end], replacement])
+            position = after
+        output.append(text[position:])
+        return ''.join(output)
 
 
 class PlatformSectionExtension(Extension):
@@ -66,26 +193,101 @@ class PlatformSectionExtension(Extension):
     Configuration Example:
     {
         'platform_section': 'Android',
+        'platform_groups': {
+            'mobile': ['iOS', 'Android'],
+        },
     }
     """
 
     def __init__(self, **kwargs):
         self.config = {
             'platform_section': ['', 'The platform section that should be rendered.'],
+            'platform_groups': [{}, ('Dict of group or alias name to the list of platforms it stands for in section'
+                                     ' headers')],
         }
+        self.preprocessor = None
         super(PlatformSectionExtension, self).__init__(**kwargs)
 
+    @property
+    def includes_skipped(self):
+        """
+        Number of `+++` include lines in the sections removed by the last render, which were never resolved or read
+        """
+        if self.preprocessor is None:
+            return 0
+        return self.preprocessor.includes_skipped
+
+    def set_platform_section(self, platform_section):
+        """
+        Show `platform_section` in the documents rendered until the next reset
+        """
+        if self.preprocessor is not None:
+            self.preprocessor.platform_section = platform_section.lower().strip()
+
+    def reset(self):
+        self.set_platform_section(self.getConfig('platform_section'))
+
     def extendMarkdown(self, md, md_globals):
         """ Add NoteBlockPreprocessor to the Markdown instance. """
         md.registerExtension(self)
 
         platform_section = self.getConfig('platform_section')
+        platform_groups = self.getConfig('platform_groups')
+
+        self.preprocessor = PlatformSectionPreprocessor(platform_section=platform_section,
+                                                        platform_groups=platform_groups,
+                                                        markdown_instance=md)
+        add_preprocessor(md, 'platform_sections', self.preprocessor)
+
+
+def render_platforms(md, text, platforms, **render_context):
+    """
+    Render `text` once for each of `platforms` with the Markdown instance `md` and return a dict of platform to html.
+
+    `md` must use :class:`PlatformSectionExtension`.  Whitespace is normalized once and the platforms are grouped by
+    :meth:`PlatformSectionPreprocessor.platform_classes`.  The platform sections are filtered once for each group,
+    and `text` is rendered once for each distinct filtered text, so groups which still end up with the same text, such
+    as platforms with sections of their own holding the same content, share a render.  The platform is set after each
+    ``md.reset()``, and `render_context` is passed on to :func:`docdown.docdown.set_render_context` for each render.
+
+    If a render finds platform sections that were not in `text`, such as sections in included files, the other
+    platforms sharing that render are rendered on their own so their output is the same as a separate render.
+    """
+    extension = None
+    for registered in md.registeredExtensions:
+        if isinstance(registered, PlatformSectionExtension):
+            extension = registered
+    if extension is None or extension.preprocessor is None:
+        raise ValueError('render_platforms needs a Markdown instance using docdown.platform_section')
+    preprocessor = extension.preprocessor
+
+    source = '\n'.join(md.preprocessors['normalize_whitespace'].run(text.split('\n')))
+    # Filtered text to the number of sections found in `text` for the first platform which gets it, and the platforms
+    # which get it
+    groups = OrderedDict()
+    for group in preprocessor.platform_classes(source, platforms):
+        filtered = preprocessor.process_platform_sections(source, group[0].lower().strip())
+        if filtered not in groups:
+            groups[filtered] = (preprocessor.sections_found, [])
+        groups[filtered][1].extend(group)
+
+    def render(platform):
+        md.reset()
+        set_render_context(md, **render_context)
+        extension.set_platform_section(platform)
+        return md.convert(text)
 
-        md.preprocessors.add('platform_sections',
-                             PlatformSectionPreprocessor(
-                                platform_section=platform_section,
-                                markdown_instance=md),
-                             ">normalize_whitespace")
+    rendered = {}
+    for sections_found, group in groups.values():
+        html = render(group[0])
+        if preprocessor.sections_found > sections_found:
+            for platform in group[1:]:
+                rendered[platform] = render(platform)
+        else:
+            for platform in group[1:]:
+                rendered[platform] = html
+        rendered[group[0]] = html
+    return rendered
 
 
 def makeExtension(*args, **kwargs):
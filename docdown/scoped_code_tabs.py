@@ -11,6 +11,8 @@ import re
 from markdown.preprocessors import Preprocessor
 from markdown_fenced_code_tabs import CodeTabsExtension
 
+from .docdown import add_preprocessor
+
 
 class ScopedCodeTabsPreprocessor(Preprocessor):
     RE_FENCE_START = r'^ *\|\~\s*$'  # start line, e.g., `   |~  `
@@ -112,10 +114,8 @@ class ScopedCodeTabExtension(CodeTabsExtension):
 
         md.registerExtension(self)
 
-        md.preprocessors.add('scoped_code_tabs',
-                             ScopedCodeTabsPreprocessor(md,
-                                                        code_tabs_preprocessor=code_tabs_preprocessor),
-                             ">normalize_whitespace")
+        add_preprocessor(md, 'scoped_code_tabs',
+                         ScopedCodeTabsPreprocessor(md, code_tabs_preprocessor=code_tabs_preprocessor))
 
 
 def makeExtension(*args, **kwargs):
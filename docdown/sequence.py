@@ -4,59 +4,219 @@ from __future__ import absolute_import, unicode_literals, print_function
 
 from markdown.extensions import Extension
 from markdown.preprocessors import Preprocessor
+import bisect
+import io
+import os
 import re
 
-from .docdown import TemplateRenderMixin
+from .diagrams import SOURCE_FENCE_RE, DiagramCache, find_diagram_sources, load_inline_svg, match_source_fence
+from .docdown import TemplateRenderMixin, add_preprocessor
+from .media_urls import get_media_url_resolver, is_absolute_url
 
 
 DEFAULT_ADAPTER = 'docdown.template_adapters.StringFormatAdapter'
 
 
 class SequenceDiagramBlockPreprocessor(TemplateRenderMixin, Preprocessor):
+    """
+    Replace `|||` blocks ending with an image line, found in a single pass over the lines, with the rendered templates.
+    """
 
     RE = re.compile(r'^\s*\|{3,}\s*?\n(?P<content>[\s\S\n]*?)!(\[(?P<title>.*)\])?\((?P<url>\S*)\)\n\|{3,}', re.MULTILINE)
 
-    def __init__(self, media_url=None, prefix='', postfix='', template_adapter=DEFAULT_ADAPTER, **kwargs):
+    OPENER_RE = re.compile(r'\s*\|{3,}\s*$')
+    FENCE = '|||'
+    LAST_WHITESPACE_RE = re.compile(r'.*\s')
+
+    def __init__(self, media_url=None, prefix='', postfix='', template_adapter=DEFAULT_ADAPTER, diagram_cache=None,
+                 diagram_url='', inline_svg_threshold=None, media_directory=None, url_resolver=None, **kwargs):
         self.media_url = media_url
+        self.url_resolver = get_media_url_resolver() if url_resolver is None else url_resolver
+        self.diagram_cache = diagram_cache
+        self.diagram_url = diagram_url
+        self.inline_svg_threshold = inline_svg_threshold
+        self.media_directory = media_directory
+        # Digests of the SVGs inlined so far on the page being rendered
+        self.inlined_svgs = set()
         self.prefix = prefix
         self.postfix = postfix
         self.template_adapter = template_adapter
         super(SequenceDiagramBlockPreprocessor, self).__init__(template_adapter=template_adapter, **kwargs)
 
-    def run(self, lines):
-        text = "\n".join(lines)
-        renderer = self.get_template_adapter()
+    def find_image(self, line):
+        """
+        Return `(position, title, url)` for the image which ends `line`, or None.
+
+        As with :attr:`RE` the image may start anywhere in the line, the earliest `!` which starts an image reaching
+        the end of the line is used, and the title runs to the last `](` before the url.  The title is None when the
+        image has no brackets.
+        """
+        if not line.endswith(')'):
+            return None
+        # The url cannot contain whitespace, so its `(` is in the last run of non-whitespace characters
+        m = self.LAST_WHITESPACE_RE.match(line)
+        url_start = m.end() if m else 0
+
+        image = None
+        title_end = line.rfind('](', url_start, len(line) - 1)
+        if title_end >= 0:
+            start = line.find('![', 0, title_end)
+            if start >= 0:
+                image = (start, line[start + 2:title_end], line[title_end + 2:-1])
+        start = line.find('!(', url_start, len(line) - 1)
+        if start >= 0 and (image is None or start < image[0]):
+            image = (start, None, line[start + 2:-1])
+        return image
+
+    def media_image_url(self, image_url):
+        """
+        Return the url of an image in the media directory
+        """
+        return self.url_resolver.resolve(self.media_url, image_url)
+
+    def media_image_path(self, image_url):
+        """
+        Return the local path of an image in the media directory, or None
+        """
+        if not self.media_directory or is_absolute_url(image_url):
+            return None
+        if image_url.startswith('./'):
+            image_url = image_url[2:]
+        return os.path.join(self.media_directory, image_url.lstrip('/'))
+
+    def inline_svg(self, image_path):
+        """
+        Return the markup to inline for the image at `image_path`, or an empty string if it is not a small SVG.
+
+        A diagram used more than once on a page is only inlined the first time, and later uses reference it with
+        `<use>`.
+        """
+        if not self.inline_svg_threshold or image_path is None or not image_path.lower().endswith('.svg'):
+            return ''
+        svg = load_inline_svg(image_path, self.inline_svg_threshold)
+        if svg is None:
+            return ''
+        if svg.digest in self.inlined_svgs:
+            return svg.reference
+        self.inlined_svgs.add(svg.digest)
+        return svg.markup
+
+    def diagram_image_url(self, file_name):
+        """
+        Return the url of a diagram rendered into the diagram cache
+        """
+        if self.diagram_url:
+            return self.url_resolver.resolve(self.diagram_url, file_name)
+        return self.media_image_url(file_name)
+
+    def find_source(self, lines, replaced, index, closer):
+        """
+        Return `(language, source, start, end)` for the first fenced block of diagram source between line `index` and
+        the image line `closer`, or None.
+
+        Used when the image has no url, `![Title]()`, and `diagram_cache` is set.  The search stops at the first
+        nested diagram, so no content is searched twice.
+        """
+        for start in range(index, closer):
+            if start in replaced or self.OPENER_RE.match(lines[start]):
+                return None
+            source = match_source_fence(lines, start, self.diagram_cache.renderers, closer)
+            if source is not None:
+                language, source, end = source
+                if any(line in replaced for line in range(start, end + 1)):
+                    return None
+                return language, source, start, end
+            m = SOURCE_FENCE_RE.match(lines[start])
+            if m and m.group('language') in self.diagram_cache.renderers:
+                # The first block of diagram source is not closed before the image
+                return None
+        return None
+
+    def stash_tags(self, renderer, title, image_url, svg=''):
+        """
+        Render the prefix and postfix templates for a diagram and return their stash placeholders
+        """
+        title = title or 'Sequence Diagram'
 
-        while 1:
-            m = self.RE.search(text)
-            if m:
-                content = m.group('content')
-                image_url = m.group('url')
-                title = m.group('title') or 'Sequence Diagram'
+        context = {
+            'image_url': image_url,
+            'title': title,
+            'svg': svg,
+        }
+
+        prefix = renderer.render(template=self.prefix, context=context)
+        postfix = renderer.render(template=self.postfix, context=context)
 
-                if image_url.startswith('./'):
-                    image_url = image_url[2:]  # ./assets/image.png -> assets/image.png
+        start_tag = self.markdown.htmlStash.store(prefix, safe=True)
+        end_tag = self.markdown.htmlStash.store(postfix, safe=True)
+        return start_tag, end_tag
 
-                if self.media_url is not None:
-                    if not image_url.lower().startswith('http') and not image_url.startswith('//'):
-                        image_url = self.media_url + image_url
+    def run(self, lines):
+        lines = "\n".join(lines).split("\n")
+        renderer = self.get_template_adapter()
+        self.inlined_svgs = set()
 
-                context = {
-                    'image_url': image_url,
-                    'title': title
-                }
+        # Lines ending with an image and followed by a closing fence
+        closers = [index for index in range(len(lines) - 1)
+                   if lines[index + 1].startswith(self.FENCE) and self.find_image(lines[index]) is not None]
+        # The lines taking the place of the image and closing fence lines of diagrams found so far
+        replaced = {}
+        unused = 0
 
-                prefix = renderer.render(template=self.prefix, context=context)
-                postfix = renderer.render(template=self.postfix, context=context)
+        new_lines = []
+        index, offset = 0, 0
+        while index < len(lines):
+            current = replaced.get(index, [lines[index]])
+            if not current:
+                # A block of diagram source which has been taken out
+                index += 1
+                continue
+            line = current[offset]
+            if self.OPENER_RE.match(line):
+                position = max(bisect.bisect_right(closers, index), unused)
+                if position == len(closers):
+                    # Neither this nor any later diagram is closed
+                    new_lines.extend(current[offset:])
+                    for rest in range(index + 1, len(lines)):
+                        new_lines.extend(replaced.get(rest, [lines[rest]]))
+                    break
+                closer = closers[position]
+                unused = position + 1
 
-                start_tag = self.markdown.htmlStash.store(prefix, safe=True)
-                end_tag = self.markdown.htmlStash.store(postfix, safe=True)
+                image_line = replaced.get(closer, [lines[closer]])[0]
+                start, title, image_url = self.find_image(image_line)
+                source = None
+                if not image_url and self.diagram_cache is not None and index not in replaced:
+                    source = self.find_source(lines, replaced, index + 1, closer)
+                if source is not None:
+                    language, source, source_start, source_end = source
+                    file_name = self.diagram_cache.render(language, source)
+                    image_path = os.path.join(self.diagram_cache.directory, file_name)
+                    image_url = self.diagram_image_url(file_name)
+                    for source_line in range(source_start, source_end + 1):
+                        replaced[source_line] = []
+                else:
+                    image_path = self.media_image_path(image_url)
+                    image_url = self.media_image_url(image_url)
+                start_tag, end_tag = self.stash_tags(renderer, title, image_url, svg=self.inline_svg(image_path))
 
-                text = '%s\n%s\n\n%s\n%s\n%s' % (text[:m.start()], start_tag, content, end_tag, text[m.end():])
+                # Blank lines before the opening fence are replaced along with it
+                while new_lines and not new_lines[-1].strip():
+                    new_lines.pop()
+                new_lines.extend(['', start_tag, ''])
+                replaced[closer] = [image_line[:start], end_tag]
+                replaced[closer + 1] = [lines[closer + 1].lstrip('|')]
             else:
-                break
+                new_lines.append(line)
 
-        return text.split("\n")
+            # Diagrams may be nested in the content, so carry on from the line after the opening fence
+            if offset + 1 < len(current):
+                offset += 1
+            else:
+                replaced.pop(index, None)
+                index, offset = index + 1, 0
+
+        return new_lines
 
 
 class SequenceDiagramExtension(Extension):
@@ -69,9 +229,30 @@ class SequenceDiagramExtension(Extension):
             'template_adapter': ['docdown.template_adapters.StringFormatAdapter',
                                  ('Adapter for rendering prefix and postfix templates'
                                   ' using your template language of choice.')],
+            'diagram_renderers': [{}, ('Dict of fenced block language to the callable or command which renders'
+                                       ' diagrams from their source')],
+            'diagram_directory': ['', ('Directory where rendered diagrams are stored, named by the hash of their'
+                                       ' source')],
+            'diagram_url': ['', 'URL of diagram_directory.  The media_url is used if blank.'],
+            'diagram_format': ['svg', 'File extension of rendered diagrams'],
+            'inline_svg_threshold': [0, ('SVG diagrams smaller than this many bytes are passed to the templates'
+                                         ' as svg')],
+            'media_directory': ['', 'Local directory served at media_url, used to find SVG diagrams to inline'],
+            'normalize_media_urls': [False, 'Resolve . and .. segments in the paths of media urls'],
         }
+        self.preprocessor = None
         super(SequenceDiagramExtension, self).__init__(**kwargs)
 
+    def set_media_url(self, media_url):
+        """
+        Use `media_url` for the documents rendered until the next reset
+        """
+        if self.preprocessor is not None:
+            self.preprocessor.media_url = media_url
+
+    def reset(self):
+        self.set_media_url(self.getConfig('media_url'))
+
     def extendMarkdown(self, md, md_globals):
         """ Add SequenceDiagramBlockPreprocessor to the Markdown instance. """
         md.registerExtension(self)
@@ -80,14 +261,54 @@ class SequenceDiagramExtension(Extension):
         prefix = self.getConfig('prefix')
         postfix = self.getConfig('postfix')
         template_adapter = self.getConfig('template_adapter')
+        diagram_renderers = self.getConfig('diagram_renderers')
+        diagram_directory = self.getConfig('diagram_directory')
+        diagram_url = self.getConfig('diagram_url')
+        diagram_format = self.getConfig('diagram_format')
+        inline_svg_threshold = self.getConfig('inline_svg_threshold')
+        media_directory = self.getConfig('media_directory') or None
+        url_resolver = get_media_url_resolver(normalize=self.getConfig('normalize_media_urls'))
+
+        diagram_cache = None
+        if diagram_renderers and diagram_directory:
+            diagram_cache = DiagramCache(diagram_directory, diagram_renderers, file_format=diagram_format)
+
+        self.preprocessor = SequenceDiagramBlockPreprocessor(media_url=media_url,
+                                                             prefix=prefix,
+                                                             postfix=postfix,
+                                                             template_adapter=template_adapter,
+                                                             diagram_cache=diagram_cache,
+                                                             diagram_url=diagram_url,
+                                                             inline_svg_threshold=inline_svg_threshold,
+                                                             media_directory=media_directory,
+                                                             url_resolver=url_resolver,
+                                                             markdown_instance=md)
+        add_preprocessor(md, 'sequence', self.preprocessor)
+
+
+def render_diagrams(md, paths, workers=4):
+    """
+    Render the diagram sources in the markdown files at `paths` with `workers` threads, ahead of converting them with
+    the Markdown instance `md`, and return the file names of the diagrams.
+
+    `md` must use :class:`SequenceDiagramExtension` with `diagram_renderers` and `diagram_directory` configured.
+    Every fenced block in one of the renderer languages is rendered, apart from those already in the cache, so the
+    conversions only find cached diagrams.  Diagram sources in included files are not looked for.
+    """
+    preprocessor = None
+    for registered in md.registeredExtensions:
+        if isinstance(registered, SequenceDiagramExtension) and registered.preprocessor is not None:
+            preprocessor = registered.preprocessor
+    if preprocessor is None or preprocessor.diagram_cache is None:
+        raise ValueError('render_diagrams needs a Markdown instance using docdown.sequence with diagram_renderers'
+                         ' and diagram_directory configured')
+    diagram_cache = preprocessor.diagram_cache
 
-        md.preprocessors.add('sequence',
-                             SequenceDiagramBlockPreprocessor(media_url=media_url,
-                                                              prefix=prefix,
-                                                              postfix=postfix,
-                                                              template_adapter=template_adapter,
-                                                              markdown_instance=md),
-                             ">normalize_whitespace")
+    diagrams = []
+    for path in paths:
+        with io.open(path, encoding='utf-8') as f:
+            diagrams.extend(find_diagram_sources(f.read().split('\n'), diagram_cache.renderers))
+    return diagram_cache.render_all(diagrams, workers=workers)
 
 
 def makeExtension(*args, **kwargs):
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+"""
+symbol_index
+----------------------------------
+
+Index of the classes, functions and methods defined in a source file, used by :mod:`docdown.include` for
+`+++ file.py::ClassName.method` includes.
+
+Each indexer maps qualified symbol names to the 1-based, inclusive range of lines defining them.  Indexes are cached
+in memory by file content hash and can also be persisted to a directory so later builds do not parse the same
+source again.
+"""
+
+from __future__ import absolute_import, unicode_literals, print_function
+
+import ast
+import bisect
+import io
+import json
+import logging
+import os
+import re
+
+from .cache import LRUCache, file_digest, write_atomically
+
+
+logger = logging.getLogger(__name__)
+
+SYMBOL_INDEX_VERSION = 1
+
+
+class PythonSymbolIndexer(object):
+    """
+    Index Python classes and functions, including decorators, using :mod:`ast`
+    """
+    name = 'python'
+
+    def index(self, source):
+        try:
+            tree = ast.parse(source)
+        except (SyntaxError, ValueError):
+            logger.warning('Could not parse Python source for symbol index')
+            return {}
+
+        symbols = {}
+        self._visit(tree.body, '', symbols)
+        return symbols
+
+    def _visit(self, nodes, prefix, symbols):
+        definitions = [ast.ClassDef, ast.FunctionDef]
+        if hasattr(ast, 'AsyncFunctionDef'):
+            definitions.append(ast.AsyncFunctionDef)
+
+        for node in nodes:
+            if not isinstance(node, tuple(definitions)):
+                continue
+            name = prefix + node.name
+            start = min([decorator.lineno for decorator in node.decorator_list] + [node.lineno])
+            end = getattr(node, 'end_lineno', None)
+            if end is None:
+                # Before Python 3.8 only the start of each node is known, so use the start of its last line
+                end = max(getattr(child, 'lineno', start) for child in ast.walk(node))
+            symbols[name] = (start, end)
+            self._visit(node.body, name + '.', symbols)
+
+
+class BraceSymbolIndexer(object):
+    """
+    Index symbols in languages which delimit bodies with braces, using regular expressions.
+
+    Each pattern must match a declaration up to and including the opening brace of its body and capture the
+    symbol's name in a group called `name`.  The body ends at the matching closing brace.  Braces in strings and
+    comments are not taken into account.  Symbols declared inside the body of another are named
+    `Outer.inner`.
+    """
+    name = 'brace'
+
+    PATTERNS = [
+        # class Foo extends Bar {, struct Foo {, enum Foo: Int {
+        r'^[ \t]*(?:[\w@]+[ \t]+)*(?:class|struct|interface|enum|protocol|extension)[ \t]+(?P<name>\w+)[^;{}\n]*\{',
+        # public static void main(String[] args) {, func name(a: Int) -> Int {, function name(a) {
+        r'^[ \t]*(?:[\w@<>\[\],.*&]+[ \t]+)*\**(?P<name>\w+)[ \t]*\([^;{}]*\)[^;{}()\n]*\{',
+    ]
+
+    KEYWORDS = frozenset(['if', 'for', 'while', 'switch', 'catch', 'return', 'else', 'do', 'try', 'synchronized',
+                          'with', 'foreach', 'using', 'guard', 'defer', 'when', 'sizeof'])
+
+    def __init__(self, patterns=None, name=None):
+        self.patterns = [re.compile(pattern, re.MULTILINE) for pattern in (patterns or self.PATTERNS)]
+        if name is not None:
+            self.name = name
+
+    def index(self, source):
+        line_starts = [0] + [m.end() for m in re.finditer(r'\n', source)]
+
+        declarations = {}
+        for pattern in self.patterns:
+            for m in pattern.finditer(source):
+                name = m.group('name')
+                if name in self.KEYWORDS or m.start() in declarations:
+                    continue
+                end = self._block_end(source, m.end() - 1)
+                if end is not None:
+                    declarations[m.start()] = (name, end)
+
+        symbols = {}
+        enclosing = []
+        for start in sorted(declarations):
+            name, end = declarations[start]
+            while enclosing and enclosing[-1][1] < start:
+                enclosing.pop()
+            qualified_name = '.'.join([outer_name for outer_name, _ in enclosing] + [name])
+            symbols.setdefault(qualified_name, (self._line_number(line_starts, start),
+                                                self._line_number(line_starts, end)))
+            enclosing.append((name, end))
+        return symbols
+
+    @staticmethod
+    def _block_end(source, open_brace):
+        depth = 0
+        for m in re.compile(r'[{}]').finditer(source, open_brace):
+            depth += 1 if m.group() == '{' else -1
+            if depth == 0:
+                return m.start()
+        return None
+
+    @staticmethod
+    def _line_number(line_starts, offset):
+        return bisect.bisect_right(line_starts, offset)
+
+
+DEFAULT_INDEXERS = {
+    '.py': PythonSymbolIndexer(),
+}
+DEFAULT_INDEXERS.update((extension, BraceSymbolIndexer()) for extension in [
+    '.c', '.cc', '.cpp', '.cs', '.go', '.h', '.hpp', '.java', '.js', '.kt', '.m', '.swift', '.ts',
+])
+
+_symbol_indexes = LRUCache(max_size=256)
+
+
+def get_symbols(file_path, indexer, cache_directory=None):
+    """
+    Return the dict of symbol name to `(start line, end line)` for the file at `file_path`.
+
+    Indexes are cached in memory by the SHA-1 of the file's contents and, if `cache_directory` is given, stored there
+    as JSON so they survive between processes.
+    """
+    digest = file_digest(file_path)
+    key = '%s-%s-%d' % (digest, indexer.name, SYMBOL_INDEX_VERSION)
+    symbols = _symbol_indexes.get(key)
+    if symbols is not None:
+        return symbols
+
+    cache_path = os.path.join(cache_directory, key + '.json') if cache_directory else None
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with io.open(cache_path, 'r', encoding='utf-8') as f:
+                symbols = dict((name, tuple(lines)) for name, lines in json.load(f).items())
+        except (IOError, OSError, ValueError):
+            symbols = None
+
+    if symbols is None:
+        with io.open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+            symbols = indexer.index(f.read())
+        if cache_path:
+            write_atomically(cache_path, lambda f: f.write('%s' % json.dumps(symbols, sort_keys=True)))
+
+    _symbol_indexes.set(key, symbols)
+    return symbols
@@ -12,7 +12,7 @@ with open('HISTORY.rst') as history_file:
 requirements = [
     # TODO: put package requirements here
     'Markdown < 3.0.0',
-    'unicodecsv >= 0.14.1',
+    'unicodecsv >= 0.14.1; python_version < "3"',
     'markdown-fenced-code-tabs >= 1.0.5',
 ]
 
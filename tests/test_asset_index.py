@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_asset_index
+----------------------------------
+
+Tests for `docdown.asset_index` module.
+"""
+
+from __future__ import absolute_import, unicode_literals, print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import markdown
+
+from docdown.asset_index import AssetIndex
+from docdown.docdown import set_render_context
+from docdown.include import IncludePreprocessor
+
+
+class AssetIndexTest(unittest.TestCase):
+    TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+    ROOT_DIR = os.path.join(TESTS_DIR, 'test_files')
+    CURRENT_DIR = os.path.join(ROOT_DIR, 'deep_assets')
+    ASSET_DIR = 'assets'
+
+    def setUp(self):
+        self.index = AssetIndex(self.ROOT_DIR, asset_directory=self.ASSET_DIR)
+
+    def test_find_with_rollup(self):
+        self.assertEqual(
+            os.path.join(self.ROOT_DIR, 'assets', 'test.cpp'),
+            self.index.find(self.CURRENT_DIR, 'test.cpp')
+        )
+
+    def test_find_with_subdirectory(self):
+        self.assertEqual(
+            os.path.join(self.ROOT_DIR, 'assets', 'subdir', 'test.json'),
+            self.index.find(self.CURRENT_DIR, 'subdir/test.json')
+        )
+
+    def test_find_in_current_dir(self):
+        self.assertEqual(
+            os.path.join(self.CURRENT_DIR, 'assets', 'test.json'),
+            self.index.find(self.CURRENT_DIR, 'test.json')
+        )
+
+    def test_find_missing(self):
+        self.assertIsNone(self.index.find(self.CURRENT_DIR, 'not_here.md'))
+
+    def test_matches_find_file_path(self):
+        """
+        The index gives the same answers as the on-disk walk in IncludePreprocessor.find_file_path
+        """
+        md = markdown.Markdown()
+        preprocessor = IncludePreprocessor(root_directory=self.ROOT_DIR,
+                                           current_directory=self.CURRENT_DIR,
+                                           asset_directory=self.ASSET_DIR,
+                                           markdown_instance=md)
+        for file_name in ['test.cpp', 'test.json', 'subdir/test.json', 'test.csv', 'not_here.md']:
+            self.assertEqual(preprocessor.find_file_path(file_name), self.index.find(self.CURRENT_DIR, file_name))
+
+    def test_relative_root_directory(self):
+        """
+        A relative root directory matches the absolute current directory set by set_render_context
+        """
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.TESTS_DIR)
+        md = markdown.Markdown(extensions=['markdown.extensions.fenced_code', 'docdown.include'],
+                               extension_configs={'docdown.include': {
+                                   'asset_directory': self.ASSET_DIR,
+                                   'root_directory': 'test_files',
+                                   'asset_index': True,
+                               }},
+                               output_format='html5')
+        set_render_context(md, document_path=os.path.join('test_files', 'deep_assets', 'page.md'))
+        self.assertEqual('<pre><code class="js">alert(\'test\');\n</code></pre>', md.convert('+++ test.js'))
+        self.assertEqual(os.path.join(self.ROOT_DIR, 'assets', 'test.cpp'),
+                         AssetIndex('test_files', asset_directory=self.ASSET_DIR).find('test_files', 'test.cpp'))
+
+
+class AssetIndexInvalidationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.current = os.path.join(self.root, 'guides', 'nested')
+        os.makedirs(os.path.join(self.current, 'assets'))
+        os.makedirs(os.path.join(self.root, 'assets'))
+        with open(os.path.join(self.root, 'assets', 'shared.js'), 'w') as f:
+            f.write('shared();\n')
+        self.index = AssetIndex(self.root, asset_directory='assets', check_interval=None)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def touch(self, path):
+        with open(path, 'w') as f:
+            f.write('')
+        # Make sure the directory modification time moves even on coarse grained filesystems
+        directory = os.path.dirname(path)
+        stat = os.stat(directory)
+        os.utime(directory, (stat.st_atime, stat.st_mtime + 5))
+
+    def test_negative_result_cached_until_check(self):
+        self.assertIsNone(self.index.find(self.current, 'new.js'))
+        self.touch(os.path.join(self.current, 'assets', 'new.js'))
+        self.assertIsNone(self.index.find(self.current, 'new.js'))
+
+        self.assertTrue(self.index.check())
+        self.assertEqual(os.path.join(self.current, 'assets', 'new.js'), self.index.find(self.current, 'new.js'))
+
+    def test_nearer_file_shadows_after_check(self):
+        self.assertEqual(os.path.join(self.root, 'assets', 'shared.js'), self.index.find(self.current, 'shared.js'))
+        self.touch(os.path.join(self.current, 'assets', 'shared.js'))
+        self.index.check()
+        self.assertEqual(os.path.join(self.current, 'assets', 'shared.js'), self.index.find(self.current, 'shared.js'))
+
+    def test_new_asset_directory(self):
+        os.makedirs(os.path.join(self.root, 'guides', 'assets'))
+        self.touch(os.path.join(self.root, 'guides', 'assets', 'guide.js'))
+        stat = os.stat(os.path.join(self.root, 'guides'))
+        os.utime(os.path.join(self.root, 'guides'), (stat.st_atime, stat.st_mtime + 5))
+        self.index.check()
+        self.assertEqual(os.path.join(self.root, 'guides', 'assets', 'guide.js'),
+                         self.index.find(self.current, 'guide.js'))
+
+    def test_removed_file(self):
+        os.remove(os.path.join(self.root, 'assets', 'shared.js'))
+        directory = os.path.join(self.root, 'assets')
+        stat = os.stat(directory)
+        os.utime(directory, (stat.st_atime, stat.st_mtime + 5))
+        self.index.check()
+        self.assertIsNone(self.index.find(self.current, 'shared.js'))
+
+    def test_unchanged_tree(self):
+        self.assertFalse(self.index.check())
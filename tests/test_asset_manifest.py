@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_asset_manifest
+----------------------------------
+
+Tests for `docdown.asset_manifest` module.
+"""
+
+from __future__ import absolute_import, unicode_literals, print_function
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from docdown.asset_manifest import build_asset_manifest, load_asset_manifest, signatures_path
+
+
+class AssetManifestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.manifest_path = os.path.join(self.root, 'manifest.json')
+        self.old = time.time() - 3600
+        self.write('assets/image.png', b'image')
+        self.write('downloads/sdk.zip', b'sdk')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, asset_path, content, mtime=None):
+        path = os.path.join(self.root, *asset_path.split('/'))
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(content)
+        mtime = self.old if mtime is None else mtime
+        os.utime(path, (mtime, mtime))
+
+    def test_build(self):
+        manifest = build_asset_manifest(self.root, workers=4)
+        self.assertEqual({'assets/image.png': hashlib.sha1(b'image').hexdigest()[:12],
+                          'downloads/sdk.zip': hashlib.sha1(b'sdk').hexdigest()[:12]}, manifest)
+
+    def test_written_and_loaded(self):
+        manifest = build_asset_manifest(self.root, manifest_path=self.manifest_path, hash_length=8)
+        self.assertEqual(manifest, load_asset_manifest(self.manifest_path))
+        self.assertEqual(8, len(manifest['assets/image.png']))
+        self.assertNotIn('manifest.json', manifest)
+
+    def test_incremental(self):
+        build_asset_manifest(self.root, manifest_path=self.manifest_path)
+        with open(signatures_path(self.manifest_path)) as f:
+            signatures = json.load(f)
+        # Recorded hashes are reused while a file's (mtime, size) is unchanged
+        signatures['assets/image.png'][2] = 'unchanged'
+        with open(signatures_path(self.manifest_path), 'w') as f:
+            json.dump(signatures, f)
+        self.write('downloads/sdk.zip', b'new sdk', mtime=self.old + 120)
+        self.write('assets/new.png', b'new', mtime=self.old + 120)
+
+        manifest = build_asset_manifest(self.root, manifest_path=self.manifest_path)
+        self.assertEqual({'assets/image.png': 'unchanged',
+                          'assets/new.png': hashlib.sha1(b'new').hexdigest()[:12],
+                          'downloads/sdk.zip': hashlib.sha1(b'new sdk').hexdigest()[:12]}, manifest)
+        self.assertNotIn('manifest.json.signatures', manifest)
+
+    def test_changed_size_with_old_mtime(self):
+        build_asset_manifest(self.root, manifest_path=self.manifest_path)
+        # Copied over the asset keeping an mtime older than the manifest, as cp -p, tar and rsync -t do
+        self.write('assets/image.png', b'a new image', mtime=self.old - 60)
+
+        manifest = build_asset_manifest(self.root, manifest_path=self.manifest_path)
+        self.assertEqual(hashlib.sha1(b'a new image').hexdigest()[:12], manifest['assets/image.png'])
+
+    def test_removed_files_dropped(self):
+        build_asset_manifest(self.root, manifest_path=self.manifest_path)
+        os.remove(os.path.join(self.root, 'downloads', 'sdk.zip'))
+        manifest = build_asset_manifest(self.root, manifest_path=self.manifest_path)
+        self.assertEqual(['assets/image.png'], list(manifest))
+
+    def test_load_validated_by_mtime(self):
+        with open(self.manifest_path, 'w') as f:
+            json.dump({'a.png': '1'}, f)
+        os.utime(self.manifest_path, (self.old, self.old))
+        self.assertIs(load_asset_manifest(self.manifest_path), load_asset_manifest(self.manifest_path))
+
+        with open(self.manifest_path, 'w') as f:
+            json.dump({'a.png': '2'}, f)
+        self.assertEqual({'a.png': '2'}, load_asset_manifest(self.manifest_path))
+        self.assertEqual({}, load_asset_manifest(os.path.join(self.root, 'missing.json')))
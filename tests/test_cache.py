@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_cache
+----------------------------------
+
+Tests for `docdown.cache` module.
+"""
+
+from __future__ import absolute_import, unicode_literals, print_function
+
+import unittest
+
+from docdown.cache import LRUCache, text_size
+
+
+class LRUCacheTest(unittest.TestCase):
+
+    def test_hits_and_misses(self):
+        cache = LRUCache(max_size=2)
+        self.assertIsNone(cache.get('a'))
+        cache.set('a', 1)
+        self.assertEqual(1, cache.get('a'))
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(max_size=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+
+    def test_size_budget(self):
+        cache = LRUCache(max_size=10, sizeof=text_size)
+        cache.set('a', 'x' * 6)
+        cache.set('b', 'y' * 6)
+        self.assertEqual(1, len(cache))
+        self.assertEqual(6, cache.size)
+        self.assertIn('b', cache)
+
+    def test_value_larger_than_budget_not_stored(self):
+        cache = LRUCache(max_size=10, sizeof=text_size)
+        cache.set('a', 'x' * 11)
+        self.assertEqual(0, len(cache))
+        self.assertEqual(0, cache.size)
+
+    def test_replace_entry(self):
+        cache = LRUCache(max_size=10, sizeof=text_size)
+        cache.set('a', 'x' * 4)
+        cache.set('a', 'y' * 2)
+        self.assertEqual(2, cache.size)
+        self.assertEqual('yy', cache.get('a'))
+
+    def test_info(self):
+        cache = LRUCache(max_size=10, sizeof=text_size)
+        cache.set('a', ['abc', 'de'])
+        cache.get('a')
+        cache.get('b')
+        self.assertEqual((1, 1, 10, 7, 1), tuple(cache.info()))
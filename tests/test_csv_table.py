@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_csv_table
+----------------------------------
+
+Tests for `docdown.csv_table` module.
+"""
+
+from __future__ import absolute_import, unicode_literals, print_function
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from docdown.csv_table import (iter_table_html, render_csv_preview, render_csv_table, write_csv_sidecar,
+                               write_csv_table)
+
+
+class CsvTableTest(unittest.TestCase):
+
+    ROWS = [['Name', 'Value'], ['a', '1'], ['b', '2'], ['c', '3']]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_csv(self, content, name='test.csv'):
+        path = os.path.join(self.directory, name)
+        with io.open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def test_render(self):
+        path = self.write_csv('Name,Value\na,1\n')
+        self.assertEqual('<table><tr><th>Name</th><th>Value</th></tr><tr><td>a</td><td>1</td></tr></table>',
+                         render_csv_table(path))
+
+    def test_cells_escaped(self):
+        path = self.write_csv('Name\n"<b>bold</b> & ""quoted"""\n')
+        self.assertEqual('<table><tr><th>Name</th></tr>'
+                         '<tr><td>&lt;b&gt;bold&lt;/b&gt; &amp; &quot;quoted&quot;</td></tr></table>',
+                         render_csv_table(path))
+
+    def test_unicode(self):
+        path = self.write_csv('Name\nümläut\n')
+        self.assertEqual('<table><tr><th>Name</th></tr><tr><td>ümläut</td></tr></table>',
+                         render_csv_table(path))
+
+    def test_max_rows(self):
+        html = ''.join(iter_table_html(self.ROWS, max_rows=2))
+        self.assertEqual('<table><tr><th>Name</th><th>Value</th></tr>'
+                         '<tr><td>a</td><td>1</td></tr><tr><td>b</td><td>2</td></tr></table>'
+                         '<p class="csv-truncated">Showing the first 2 rows.</p>', html)
+
+    def test_max_rows_not_reached(self):
+        html = ''.join(iter_table_html(self.ROWS, max_rows=3))
+        self.assertNotIn('csv-truncated', html)
+
+    def test_max_bytes(self):
+        html = ''.join(iter_table_html(self.ROWS, max_bytes=100, truncation_notice='<p>{rows}</p>'))
+        self.assertEqual('<table><tr><th>Name</th><th>Value</th></tr>'
+                         '<tr><td>a</td><td>1</td></tr></table><p>1</p>', html)
+
+    def test_write_in_chunks(self):
+        path = self.write_csv('Name,Value\n' + 'a,1\n' * 100)
+
+        class Out(object):
+            writes = []
+
+            def write(self, text):
+                self.writes.append(text)
+
+        out = Out()
+        written = write_csv_table(path, out, chunk_size=64)
+        self.assertGreater(len(out.writes), 1)
+        self.assertEqual(render_csv_table(path), ''.join(out.writes))
+        self.assertEqual(written, len(''.join(out.writes)))
+
+    def test_sidecar_shared_by_identical_files(self):
+        first = self.write_csv('Name,Value\na,1\n')
+        second = self.write_csv('Name,Value\na,1\n', name='copy.csv')
+        sidecars = os.path.join(self.directory, 'sidecars')
+
+        file_name = write_csv_sidecar(first, sidecars)
+        self.assertEqual(file_name, write_csv_sidecar(second, sidecars))
+        self.assertEqual([file_name], os.listdir(sidecars))
+        with io.open(os.path.join(sidecars, file_name), encoding='utf-8') as f:
+            self.assertEqual(render_csv_table(first), f.read())
+
+    def test_preview(self):
+        path = self.write_csv('Name,Value\na,1\nb,2\nc,3\n')
+        self.assertEqual('<div class="csv-sidecar" data-src="/tables/csv-1.html">'
+                         '<table><tr><th>Name</th><th>Value</th></tr><tr><td>a</td><td>1</td></tr></table>'
+                         '<p class="csv-truncated">Showing the first 1 rows.'
+                         ' <a class="csv-sidecar-link" href="/tables/csv-1.html">Show all rows</a></p></div>',
+                         render_csv_preview(path, '/tables/csv-1.html', 1))
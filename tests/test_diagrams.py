@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_diagrams
+----------------------------------
+
+Tests for `docdown.diagrams` module.
+"""
+
+from __future__ import absolute_import, unicode_literals, print_function
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+from docdown.diagrams import (DiagramCache, DiagramRenderError, find_diagram_sources, load_inline_svg, make_inline_svg,
+                              run_renderer)
+
+
+class StubRenderer(object):
+    """
+    Renders a diagram source as an svg containing the source, counting the calls
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, source):
+        with self.lock:
+            self.calls.append(source)
+        return '<svg>%s</svg>' % source
+
+
+class DiagramCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.renderer = StubRenderer()
+        self.cache = DiagramCache(self.directory, {'sequence': self.renderer})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self, file_name):
+        with open(os.path.join(self.directory, file_name), 'rb') as f:
+            return f.read()
+
+    def test_render_once(self):
+        file_name = self.cache.render('sequence', 'A->B: hi')
+        self.assertTrue(file_name.startswith('diagram-') and file_name.endswith('.svg'))
+        self.assertEqual(b'<svg>A->B: hi</svg>', self.read(file_name))
+        self.assertEqual(file_name, self.cache.render('sequence', 'A->B: hi'))
+        self.assertEqual(['A->B: hi'], self.renderer.calls)
+
+    def test_named_by_source(self):
+        self.assertNotEqual(self.cache.render('sequence', 'A->B: hi'), self.cache.render('sequence', 'A->B: bye'))
+        other = DiagramCache(self.directory, {'sequence': 'cat'})
+        self.assertNotEqual(self.cache.file_name('sequence', 'x'), other.file_name('sequence', 'x'))
+
+    def test_render_all(self):
+        diagrams = [('sequence', 'diagram %d' % (index % 20)) for index in range(100)]
+        file_names = self.cache.render_all(diagrams, workers=4)
+        self.assertEqual(20, len(file_names))
+        self.assertEqual(20, len(self.renderer.calls))
+        self.assertEqual(sorted(file_names), sorted(os.listdir(self.directory)))
+
+        self.assertEqual(file_names, self.cache.render_all(diagrams, workers=4))
+        self.assertEqual(20, len(self.renderer.calls))
+
+    def test_command_renderer(self):
+        command = [sys.executable, '-c', 'import sys; sys.stdout.write(sys.stdin.read().upper())']
+        self.assertEqual(b'A->B', run_renderer(command, 'a->b'))
+
+        failing = [sys.executable, '-c', 'import sys; sys.stderr.write("bad diagram"); sys.exit(3)']
+        with self.assertRaises(DiagramRenderError) as cm:
+            run_renderer(failing, 'a->b')
+        self.assertIn('bad diagram', str(cm.exception))
+
+    def test_find_diagram_sources(self):
+        lines = ['text', '```sequence', 'A->B', 'B->A', '```', '```python', 'x = 1', '```',
+                 '~~~~ sequence', 'C', '~~~~', '```sequence', 'unclosed']
+        self.assertEqual([('sequence', 'A->B\nB->A'), ('sequence', 'C')],
+                         list(find_diagram_sources(lines, {'sequence': None})))
+
+
+class InlineSVGTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'diagram.svg')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, svg, mtime):
+        with open(self.path, 'w') as f:
+            f.write(svg)
+        os.utime(self.path, (mtime, mtime))
+
+    def test_make_inline_svg(self):
+        svg = make_inline_svg('<?xml version="1.0"?>\n<!-- Diagram -->\n'
+                              '<svg width="10" viewBox="0 0 10 10"><rect/></svg>')
+        svg_id = 'diagram-%s' % svg.digest[:12]
+        self.assertEqual('<svg id="%s" width="10" viewBox="0 0 10 10"><rect/></svg>' % svg_id, svg.markup)
+        self.assertEqual('<svg width="10" viewBox="0 0 10 10" xmlns="http://www.w3.org/2000/svg"'
+                         ' xmlns:xlink="http://www.w3.org/1999/xlink"><use href="#%s" xlink:href="#%s"/></svg>'
+                         % (svg_id, svg_id), svg.reference)
+
+    def test_existing_id_kept(self):
+        svg = make_inline_svg("<svg id='flow' height='3'><g/></svg>")
+        self.assertEqual("<svg id='flow' height='3'><g/></svg>", svg.markup)
+        self.assertIn('href="#flow"', svg.reference)
+        self.assertIsNone(make_inline_svg('<html></html>'))
+
+    def test_load_validated_by_mtime(self):
+        self.write('<svg><g/></svg>', 1000)
+        first = load_inline_svg(self.path, 1024)
+        self.assertIs(first, load_inline_svg(self.path, 1024))
+
+        self.write('<svg><a/></svg>', 2000)
+        self.assertIn('<a/>', load_inline_svg(self.path, 1024).markup)
+
+    def test_load_threshold(self):
+        self.write('<svg>%s</svg>' % ('<g/>' * 100), 1000)
+        self.assertIsNone(load_inline_svg(self.path, 100))
+        self.assertIsNone(load_inline_svg(os.path.join(self.directory, 'missing.svg'), 100))
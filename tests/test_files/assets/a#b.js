@@ -0,0 +1 @@
+var name = 'a#b';
@@ -0,0 +1,14 @@
+import os
+
+
+# docdown:region setup
+def setup():
+    # docdown:region inner
+    path = os.getcwd()
+    # docdown:endregion inner
+    return path
+# docdown:endregion setup
+
+
+def teardown():
+    pass
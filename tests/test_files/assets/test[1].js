@@ -0,0 +1 @@
+var test = 1;
@@ -12,9 +12,14 @@ from __future__ import absolute_import, unicode_literals, print_function
 import markdown
 import unittest
 
+import hashlib
 import os
+import shutil
+import tempfile
 
-from docdown.include import IncludePreprocessor
+from docdown.cache import LRUCache, file_digest, text_size
+from docdown.docdown import set_render_context
+from docdown.include import IncludeError, IncludeExtension, IncludePreprocessor
 
 class IncludeExtensionTest(unittest.TestCase):
     """
@@ -67,6 +72,21 @@ class IncludeExtensionTest(unittest.TestCase):
         expected_output = '<p>Test File:</p>'
         self.assertEqual(html, expected_output)
 
+    def test_missing_file_keeps_rest_of_document(self):
+        text = ('Test File:\n'
+                '+++ not_here.md\n\n'
+                'After the include')
+
+        html = markdown.markdown(
+            text,
+            extensions=self.MARKDOWN_EXTENSIONS,
+            extension_configs=self.EXTENSION_CONFIGS,
+            output_format='html5'
+        )
+
+        expected_output = '<p>Test File:</p>\n<p>After the include</p>'
+        self.assertEqual(html, expected_output)
+
     def test_json(self):
         text = ('Test JSON:\n'
                 '+++ test.json')
@@ -292,6 +312,475 @@ class IncludeExtensionTest(unittest.TestCase):
 
         self.assertEqual(html, expected_output)
 
+    def test_csv_max_rows(self):
+        text = '+++ test.csv'
+        configs = {'docdown.include': dict(self.EXTENSION_CONFIGS['docdown.include'], csv_max_rows=0)}
+
+        html = markdown.markdown(
+            text,
+            extensions=self.MARKDOWN_EXTENSIONS,
+            extension_configs=configs,
+            output_format='html5'
+        )
+        self.assertIn('<td>a</td>', html)
+
+        configs['docdown.include']['csv_max_rows'] = 1
+        html = markdown.markdown(
+            text,
+            extensions=self.MARKDOWN_EXTENSIONS,
+            extension_configs=configs,
+            output_format='html5'
+        )
+        self.assertIn('<td>a</td>', html)
+        self.assertNotIn('csv-truncated', html)
+
+    def test_json_with_asset_index(self):
+        config = {'docdown.include': dict(self.EXTENSION_CONFIGS['docdown.include'], asset_index=True)}
+        text = ('Test JSON:\n'
+                '+++ subdir/test.json')
+
+        html = markdown.markdown(
+            text,
+            extensions=self.MARKDOWN_EXTENSIONS,
+            extension_configs=config,
+            output_format='html5'
+        )
+
+        expected_output = ('<p>Test JSON:</p>\n'
+                           '<pre><code class="json">{&quot;test&quot;: &quot;subdir content&quot;}\n'
+                           '</code></pre>')
+        self.assertEqual(html, expected_output)
+
+    def test_line_range(self):
+        text = '+++ regions.py#L5-L7'
+
+        html = markdown.markdown(
+            text,
+            extensions=self.MARKDOWN_EXTENSIONS,
+            extension_configs=self.EXTENSION_CONFIGS,
+            output_format='html5'
+        )
+
+        expected_output = ('<pre><code class="py">def setup():\n'
+                           '    # docdown:region inner\n'
+                           '    path = os.getcwd()\n'
+                           '</code></pre>')
+        self.assertEqual(html, expected_output)
+
+    def test_region(self):
+        text = '+++ regions.py#setup'
+
+        html = markdown.markdown(
+            text,
+            extensions=self.MARKDOWN_EXTENSIONS,
+            extension_configs=self.EXTENSION_CONFIGS,
+            output_format='html5'
+        )
+
+        expected_output = ('<pre><code class="py">def setup():\n'
+                           '    path = os.getcwd()\n'
+                           '    return path\n'
+                           '</code></pre>')
+        self.assertEqual(html, expected_output)
+
+    def test_hash_in_file_name(self):
+        text = '+++ a#b.js'
+
+        html = markdown.markdown(
+            text,
+            extensions=self.MARKDOWN_EXTENSIONS,
+            extension_configs=self.EXTENSION_CONFIGS,
+            output_format='html5'
+        )
+
+        self.assertEqual(html, "<pre><code class=\"js\">var name = 'a#b';\n</code></pre>")
+
+    def test_python_symbol(self):
+        text = '+++ regions.py::setup'
+
+        html = markdown.markdown(
+            text,
+            extensions=self.MARKDOWN_EXTENSIONS,
+            extension_configs=self.EXTENSION_CONFIGS,
+            output_format='html5'
+        )
+
+        expected_output = ('<pre><code class="py">def setup():\n'
+                           '    # docdown:region inner\n'
+                           '    path = os.getcwd()\n'
+                           '    # docdown:endregion inner\n'
+                           '    return path\n'
+                           '</code></pre>')
+        self.assertEqual(html, expected_output)
+
+    def test_java_method_symbol(self):
+        text = '+++ test.java::TestJava.main'
+
+        html = markdown.markdown(
+            text,
+            extensions=self.MARKDOWN_EXTENSIONS,
+            extension_configs=self.EXTENSION_CONFIGS,
+            output_format='html5'
+        )
+
+        expected_output = ('<pre><code class="java">    public static void main(String[] args) {\n'
+                           '        System.out.println(&quot;Test&quot;);\n'
+                           '    }\n'
+                           '</code></pre>')
+        self.assertEqual(html, expected_output)
+
+    def test_missing_symbol(self):
+        text = ('Test:\n'
+                '+++ test.java::TestJava.missing')
+
+        html = markdown.markdown(
+            text,
+            extensions=self.MARKDOWN_EXTENSIONS,
+            extension_configs=self.EXTENSION_CONFIGS,
+            output_format='html5'
+        )
+        self.assertEqual(html, '<p>Test:</p>')
+
+    def test_glob(self):
+        text = '+++ snippets/*.java'
+
+        html = markdown.markdown(
+            text,
+            extensions=self.MARKDOWN_EXTENSIONS,
+            extension_configs=self.EXTENSION_CONFIGS,
+            output_format='html5'
+        )
+
+        expected_output = ('<pre><code class="java">class First {}\n'
+                           '</code></pre>\n\n'
+                           '<pre><code class="java">class DeepSecond {}\n'
+                           '</code></pre>')
+        self.assertEqual(html, expected_output)
+
+    def test_glob_no_matches(self):
+        text = ('Test:\n'
+                '+++ snippets/*.kt')
+
+        html = markdown.markdown(
+            text,
+            extensions=self.MARKDOWN_EXTENSIONS,
+            extension_configs=self.EXTENSION_CONFIGS,
+            output_format='html5'
+        )
+        self.assertEqual(html, '<p>Test:</p>')
+
+    def test_glob_characters_in_file_name(self):
+        text = '+++ test[1].js'
+
+        html = markdown.markdown(
+            text,
+            extensions=self.MARKDOWN_EXTENSIONS,
+            extension_configs=self.EXTENSION_CONFIGS,
+            output_format='html5'
+        )
+        self.assertEqual(html, '<pre><code class="js">var test = 1;\n</code></pre>')
+
+    def test_glob_character_class(self):
+        text = '+++ snippets/[f]irst.java'
+
+        html = markdown.markdown(
+            text,
+            extensions=self.MARKDOWN_EXTENSIONS,
+            extension_configs=self.EXTENSION_CONFIGS,
+            output_format='html5'
+        )
+        self.assertEqual(html, '<pre><code class="java">class First {}\n</code></pre>')
+
+    def test_glob_code_tabs(self):
+        text = '+++ snippets/*.java'
+        configs = {'docdown.include': dict(self.EXTENSION_CONFIGS['docdown.include'], glob_code_tabs=True)}
+
+        html = markdown.markdown(
+            text,
+            extensions=['docdown.scoped_code_tabs', 'docdown.include'],
+            extension_configs=configs,
+            output_format='html5'
+        )
+        self.assertEqual(1, html.count('<div class=md-fenced-code-tabs'))
+        self.assertIn('<pre><code class=java>class First {}', html)
+        self.assertIn('<pre><code class=java>class DeepSecond {}', html)
+
+    def test_current_directory_per_render(self):
+        md = markdown.Markdown(extensions=self.MARKDOWN_EXTENSIONS, extension_configs=self.EXTENSION_CONFIGS,
+                               output_format='html5')
+        text = '+++ test.json'
+
+        set_render_context(md, document_path=os.path.join(self.ROOT_DIR, 'index.md'))
+        self.assertIn('&quot;test&quot;: &quot;content&quot;', md.convert(text))
+
+        md.reset()
+        self.assertIn('Deep content', md.convert(text))
+
+        md.reset()
+        set_render_context(md, current_directory=self.ROOT_DIR)
+        self.assertIn('&quot;test&quot;: &quot;content&quot;', md.convert(text))
+
+
+class IncludeFragmentTest(unittest.TestCase):
+    """
+    Test recursive includes of markdown fragments
+    """
+    TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+    ROOT_DIR = os.path.join(TESTS_DIR, 'test_files')
+    FRAGMENTS_DIR = os.path.join(ROOT_DIR, 'assets', 'fragments')
+
+    def setUp(self):
+        self.extension = IncludeExtension(root_directory=self.ROOT_DIR,
+                                          current_directory=self.ROOT_DIR,
+                                          asset_directory='assets',
+                                          fragment_extensions=['.md'])
+        self.md = markdown.Markdown(extensions=['markdown.extensions.fenced_code', self.extension],
+                                    output_format='html5')
+
+    def test_nested_fragments(self):
+        html = self.md.convert('+++ fragments/intro.md')
+        expected_output = ('<h2>Intro</h2>\n'
+                           '<p>See the script:</p>\n'
+                           '<pre><code class="js">alert(\'test\');\n'
+                           '</code></pre>\n\n'
+                           '<p>Nested content</p>')
+        self.assertEqual(html, expected_output)
+
+    def test_dependency_graph(self):
+        self.md.convert('+++ fragments/intro.md')
+        intro = os.path.join(self.FRAGMENTS_DIR, 'intro.md')
+        graph = self.extension.dependency_graph
+
+        self.assertEqual([None, intro], list(graph))
+        self.assertEqual([intro], [path for path, digest in graph[None]])
+        self.assertEqual([os.path.join(self.ROOT_DIR, 'assets', 'test.js'),
+                          os.path.join(self.FRAGMENTS_DIR, 'nested.md')],
+                         [path for path, digest in graph[intro]])
+        with open(os.path.join(self.ROOT_DIR, 'assets', 'test.js'), 'rb') as f:
+            self.assertEqual(hashlib.sha1(f.read()).hexdigest(), graph[intro][0][1])
+
+    def test_dependency_graph_reset_per_render(self):
+        self.md.convert('+++ fragments/intro.md')
+        self.md.reset()
+        self.md.convert('+++ test.js')
+        self.assertEqual([None], list(self.extension.dependency_graph))
+
+    def test_cycle(self):
+        with self.assertRaises(IncludeError) as cm:
+            self.md.convert('+++ fragments/cycle_a.md')
+        self.assertIn('cycle_a.md -> ', str(cm.exception))
+
+    def test_max_depth(self):
+        extension = IncludeExtension(root_directory=self.ROOT_DIR,
+                                     current_directory=self.ROOT_DIR,
+                                     asset_directory='assets',
+                                     fragment_extensions=['.md'],
+                                     max_depth=1)
+        md = markdown.Markdown(extensions=[extension])
+        with self.assertRaises(IncludeError):
+            md.convert('+++ fragments/intro.md')
+
+
+class IncludeDependencyGraphTest(unittest.TestCase):
+    """
+    Lookups recorded in the dependency graph so that new files invalidate the pages they would change
+    """
+    TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+    ROOT_DIR = os.path.join(TESTS_DIR, 'test_files')
+    CURRENT_DIR = os.path.join(ROOT_DIR, 'deep_assets')
+
+    def render(self, text):
+        extension = IncludeExtension(root_directory=self.ROOT_DIR,
+                                     current_directory=self.CURRENT_DIR,
+                                     asset_directory='assets')
+        md = markdown.Markdown(extensions=['markdown.extensions.fenced_code', extension], output_format='html5')
+        md.convert(text)
+        return extension.dependency_graph[None]
+
+    def test_shadowing_candidates(self):
+        self.assertEqual([(os.path.join(self.CURRENT_DIR, 'assets', 'test.cpp'), None),
+                          (os.path.join(self.ROOT_DIR, 'assets', 'test.cpp'),
+                           file_digest(os.path.join(self.ROOT_DIR, 'assets', 'test.cpp')))],
+                         self.render('+++ test.cpp'))
+
+    def test_missing_include(self):
+        self.assertEqual([(os.path.join(self.CURRENT_DIR, 'assets', 'missing.js'), None),
+                          (os.path.join(self.ROOT_DIR, 'assets', 'missing.js'), None)],
+                         self.render('+++ missing.js'))
+
+    def test_glob_patterns(self):
+        dependencies = self.render('+++ snippets/*.java')
+        self.assertEqual([(os.path.join(self.CURRENT_DIR, 'assets', 'snippets', '*.java'), None),
+                          (os.path.join(self.ROOT_DIR, 'assets', 'snippets', '*.java'), None)],
+                         dependencies[2:4])
+        self.assertEqual([os.path.join(self.ROOT_DIR, 'assets', 'snippets', 'first.java'),
+                          os.path.join(self.CURRENT_DIR, 'assets', 'snippets', 'second.java')],
+                         [path for path, digest in dependencies if digest is not None])
+
+    def test_missing_region(self):
+        file_path = os.path.join(self.ROOT_DIR, 'assets', 'regions.py')
+        self.assertEqual([(os.path.join(self.CURRENT_DIR, 'assets', 'regions.py#missing'), None),
+                          (os.path.join(self.ROOT_DIR, 'assets', 'regions.py#missing'), None),
+                          (os.path.join(self.CURRENT_DIR, 'assets', 'regions.py'), None),
+                          (file_path, file_digest(file_path))],
+                         self.render('+++ regions.py#missing'))
+
+
+class IncludePrefetchTest(unittest.TestCase):
+    """
+    Test loading includes concurrently
+    """
+    TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+    ROOT_DIR = os.path.join(TESTS_DIR, 'test_files')
+    CURRENT_DIR = os.path.join(ROOT_DIR, 'deep_assets')
+    TEXT = ('Includes:\n\n'
+            '+++ test.js\n\n'
+            '+++ not_here.js\n\n'
+            '+++ test.csv\n\n'
+            '+++ test.java\n\n'
+            '+++ test.js\n\n'
+            '+++ test.css\n')
+
+    def render(self, **config):
+        extension = IncludeExtension(root_directory=self.ROOT_DIR,
+                                     current_directory=self.CURRENT_DIR,
+                                     asset_directory='assets',
+                                     **config)
+        md = markdown.Markdown(extensions=['markdown.extensions.fenced_code', extension], output_format='html5')
+        return md.convert(self.TEXT), extension.dependency_graph
+
+    def test_same_output_as_serial(self):
+        self.assertEqual(self.render(cache_max_bytes=0), self.render(cache_max_bytes=0, prefetch_workers=4))
+
+    def test_errors_raised_in_document_order(self):
+        class FailingIncludePreprocessor(IncludePreprocessor):
+            def read_code(self, file_path, code_type):
+                if code_type in ('.java', '.css'):
+                    raise ValueError(code_type)
+                return super(FailingIncludePreprocessor, self).read_code(file_path, code_type)
+
+        md = markdown.Markdown()
+        preprocessor = FailingIncludePreprocessor(root_directory=self.ROOT_DIR,
+                                                  current_directory=self.CURRENT_DIR,
+                                                  asset_directory='assets',
+                                                  prefetch_workers=4,
+                                                  markdown_instance=md)
+        for _ in range(5):
+            with self.assertRaises(ValueError) as cm:
+                preprocessor.run(self.TEXT.split('\n'))
+            self.assertEqual('.java', str(cm.exception))
+
+
+class IncludeCsvSidecarTest(unittest.TestCase):
+    TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+    ROOT_DIR = os.path.join(TESTS_DIR, 'test_files')
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def render(self, threshold):
+        return markdown.markdown(
+            '+++ test.csv',
+            extensions=['markdown.extensions.fenced_code', 'docdown.include'],
+            extension_configs={
+                'docdown.include': {
+                    'asset_directory': 'assets',
+                    'current_directory': self.ROOT_DIR,
+                    'root_directory': self.ROOT_DIR,
+                    'csv_sidecar_threshold': threshold,
+                    'csv_sidecar_directory': self.directory,
+                    'csv_sidecar_url': '/tables/',
+                    'csv_sidecar_preview_rows': 0,
+                },
+            },
+            output_format='html5'
+        )
+
+    def test_sidecar(self):
+        html = self.render(1)
+
+        file_name = 'csv-%s.html' % hashlib.sha1(
+            open(os.path.join(self.ROOT_DIR, 'assets', 'test.csv'), 'rb').read()).hexdigest()
+        self.assertEqual(html, (
+            '<div class="csv-sidecar" data-src="/tables/{0}">'
+            '<table><tr><th>Test 1</th><th>Test 2</th><th>Test 3</th></tr></table>'
+            '<p class="csv-truncated">Showing the first 0 rows.'
+            ' <a class="csv-sidecar-link" href="/tables/{0}">Show all rows</a></p></div>').format(file_name))
+        self.assertEqual([file_name], os.listdir(self.directory))
+
+    def test_below_threshold(self):
+        html = self.render(1024 * 1024)
+
+        self.assertEqual(html, ('<table><tr><th>Test 1</th><th>Test 2</th><th>Test 3</th></tr>'
+                                '<tr><td>a</td><td>b</td><td>c</td></tr></table>'))
+        self.assertEqual([], os.listdir(self.directory))
+
+
+class IncludeDeferTest(unittest.TestCase):
+    """
+    Large code includes rendered before the other preprocessors run
+    """
+    TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+    ROOT_DIR = os.path.join(TESTS_DIR, 'test_files')
+    CURRENT_DIR = os.path.join(ROOT_DIR, 'deep_assets')
+
+    def render(self, text, defer_threshold, extensions=None):
+        return markdown.markdown(
+            text,
+            extensions=(extensions or ['markdown.extensions.fenced_code']) + ['docdown.include'],
+            extension_configs={
+                'docdown.include': {
+                    'asset_directory': 'assets',
+                    'current_directory': self.CURRENT_DIR,
+                    'root_directory': self.ROOT_DIR,
+                    'extension_map': {'.m': '.c'},
+                    'defer_threshold': defer_threshold,
+                },
+            },
+            output_format='html5'
+        )
+
+    def test_same_output_as_fenced_code(self):
+        for text in ['Test:\n+++ test.java\nafter', '+++ test.m', '+++ test.html\n\n+++ regions.py#setup',
+                     '* item\n\n    +++ test.js']:
+            self.assertEqual(self.render(text, None), self.render(text, 1))
+
+    def test_same_output_as_codehilite(self):
+        extensions = ['markdown.extensions.fenced_code', 'markdown.extensions.codehilite']
+        text = 'Test:\n+++ test.java\nafter'
+        self.assertEqual(self.render(text, None, extensions), self.render(text, 1, extensions))
+
+    def test_not_deferred_in_scoped_code_tabs(self):
+        extensions = ['docdown.scoped_code_tabs']
+        text = '|~\n+++ test.java\n+++ test.js\n~|'
+        html = self.render(text, 1, extensions)
+        self.assertEqual(1, html.count('md-fenced-code-tabs'))
+        self.assertEqual(self.render(text, None, extensions), html)
+
+    def test_deferred_after_scoped_code_tabs(self):
+        md = markdown.Markdown()
+        preprocessor = IncludePreprocessor(root_directory=self.ROOT_DIR,
+                                           current_directory=self.CURRENT_DIR,
+                                           asset_directory='assets',
+                                           defer_threshold=1,
+                                           markdown_instance=md)
+        lines = preprocessor.run(['|~', '+++ test.js', '~|', '+++ test.js'])
+        self.assertEqual(['|~', '``` .js', "alert('test');", '```', '~|', '', md.htmlStash.get_placeholder(0), ''],
+                         lines)
+
+    def test_single_placeholder_line(self):
+        md = markdown.Markdown()
+        preprocessor = IncludePreprocessor(root_directory=self.ROOT_DIR,
+                                           current_directory=self.CURRENT_DIR,
+                                           asset_directory='assets',
+                                           defer_threshold=5,
+                                           markdown_instance=md)
+        lines = preprocessor.run(['+++ test.java', '+++ test.js'])
+        self.assertEqual(['', md.htmlStash.get_placeholder(0), '', '``` .js', "alert('test');", '```'], lines)
+
 
 class IncludePreprocessorTest(unittest.TestCase):
     """
@@ -337,20 +826,25 @@ class IncludePreprocessorTest(unittest.TestCase):
             self.preprocessor.find_file_path('test.json')
         )
 
+    def test_find_glob_paths(self):
+        self.assertEqual([
+            (os.path.join('snippets', 'first.java'), os.path.join(self.ROOT_DIR, 'assets', 'snippets', 'first.java')),
+            (os.path.join('snippets', 'second.java'),
+             os.path.join(self.CURRENT_DIR, 'assets', 'snippets', 'second.java')),
+        ], self.preprocessor.find_glob_paths('snippets/*.java'))
+
+    def test_asset_directories(self):
+        self.assertEqual([
+            os.path.join(self.CURRENT_DIR, 'assets'),
+            os.path.join(self.ROOT_DIR, 'assets'),
+        ], list(self.preprocessor.asset_directories()))
+
     def test_build_csv_table(self):
         output = self.preprocessor.build_csv_table(os.path.join(self.ROOT_DIR, self.ASSET_DIR, 'test.csv'))
         expected_output = [
             '<table>',
-            '<tr>',
-            '<th>', 'Test 1', '</th>',
-            '<th>', 'Test 2', '</th>',
-            '<th>', 'Test 3', '</th>',
-            '</tr>',
-            '<tr>',
-            '<td>', 'a', '</td>',
-            '<td>', 'b', '</td>',
-            '<td>', 'c', '</td>',
-            '</tr>',
+            '<tr><th>Test 1</th><th>Test 2</th><th>Test 3</th></tr>',
+            '<tr><td>a</td><td>b</td><td>c</td></tr>',
             '</table>'
         ]
         self.assertEqual(expected_output, output)
@@ -391,3 +885,100 @@ class IncludePreprocessorTest(unittest.TestCase):
             u'}',
             u'```']
         self.assertEqual(output, expected_output)
+
+    def test_handle_code_single_line(self):
+        output = self.preprocessor.handle_code(os.path.join(self.ROOT_DIR, self.ASSET_DIR, 'test.java'), '.java',
+                                               'L4')
+        self.assertEqual(output, ['``` .java', '        System.out.println("Test");', '```'])
+
+    def test_handle_code_missing_region(self):
+        output = self.preprocessor.handle_code(os.path.join(self.ROOT_DIR, self.ASSET_DIR, 'regions.py'), '.py',
+                                               'missing')
+        self.assertIsNone(output)
+
+    def test_resolve_target(self):
+        assets = os.path.join(self.ROOT_DIR, self.ASSET_DIR)
+        self.assertEqual(('a#b.js', None, os.path.join(assets, 'a#b.js')), self.preprocessor.resolve_target('a#b.js'))
+        self.assertEqual(('regions.py', 'setup', os.path.join(assets, 'regions.py')),
+                         self.preprocessor.resolve_target('regions.py#setup'))
+        self.assertEqual(('missing.py', 'L1', None), self.preprocessor.resolve_target('missing.py#L1'))
+
+    def test_split_fragment(self):
+        self.assertEqual(('test.py', 'L1-L2'), self.preprocessor.split_fragment('test.py#L1-L2'))
+        self.assertEqual(('test.py', 'setup'), self.preprocessor.split_fragment('test.py#setup'))
+        self.assertEqual(('test.py', None), self.preprocessor.split_fragment('test.py'))
+        self.assertEqual(('test.py', '::Class.method'), self.preprocessor.split_fragment('test.py::Class.method'))
+
+
+class IncludeCacheTest(unittest.TestCase):
+    """
+    Test caching of rendered includes
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root, 'assets'))
+        self.write('test.js', "alert('test');\n")
+        self.write('test.csv', 'a,b\n1,2\n')
+        self.cache = LRUCache(max_size=1024, sizeof=text_size)
+        self.preprocessor = IncludePreprocessor(root_directory=self.root,
+                                                current_directory=self.root,
+                                                asset_directory='assets',
+                                                cache=self.cache,
+                                                markdown_instance=markdown.Markdown())
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, file_name, content):
+        path = os.path.join(self.root, 'assets', file_name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def test_code_cached(self):
+        path = os.path.join(self.root, 'assets', 'test.js')
+        first = self.preprocessor.handle_code(path, '.js')
+        second = self.preprocessor.handle_code(path, '.js')
+        self.assertEqual(first, second)
+        self.assertEqual((1, 1), (self.cache.hits, self.cache.misses))
+
+    def test_code_cache_keyed_by_code_type(self):
+        path = os.path.join(self.root, 'assets', 'test.js')
+        self.preprocessor.handle_code(path, '.js')
+        self.preprocessor.extension_map = {'.js': 'javascript'}
+        self.assertEqual('``` javascript', self.preprocessor.handle_code(path, '.js')[0])
+        self.assertEqual(2, self.cache.misses)
+
+    def test_code_cache_invalidated_by_change(self):
+        path = os.path.join(self.root, 'assets', 'test.js')
+        self.preprocessor.handle_code(path, '.js')
+        self.write('test.js', "alert('changed');\nalert('again');\n")
+        stat = os.stat(path)
+        os.utime(path, (stat.st_atime, stat.st_mtime + 5))
+        self.assertEqual(['``` .js', "alert('changed');", "alert('again');", '```'],
+                         self.preprocessor.handle_code(path, '.js'))
+        self.assertEqual(2, self.cache.misses)
+
+    def test_csv_cached(self):
+        path = os.path.join(self.root, 'assets', 'test.csv')
+        self.preprocessor.handle_csv(path)
+        self.preprocessor.handle_csv(path)
+        self.assertEqual((1, 1), (self.cache.hits, self.cache.misses))
+
+    def test_extension_cache_info(self):
+        extension = IncludeExtension(root_directory=self.root, current_directory=self.root,
+                                     asset_directory='assets', cache_max_bytes=4096)
+        md = markdown.Markdown(extensions=['markdown.extensions.fenced_code', extension])
+        md.convert('+++ test.js')
+        md.reset()
+        md.convert('+++ test.js')
+        info = extension.cache_info()
+        self.assertEqual(1, info.hits)
+        self.assertEqual(1, info.misses)
+        self.assertEqual(4096, info.max_size)
+
+    def test_extension_cache_disabled(self):
+        extension = IncludeExtension(cache_max_bytes=0)
+        markdown.Markdown(extensions=[extension])
+        self.assertIsNone(extension.cache_info())
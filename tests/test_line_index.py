@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_line_index
+----------------------------------
+
+Tests for `docdown.line_index` module.
+"""
+
+from __future__ import absolute_import, unicode_literals, print_function
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from docdown.line_index import LineIndex, get_line_index
+
+
+class LineIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, content, file_name='test.py'):
+        path = os.path.join(self.directory, file_name)
+        with io.open(path, 'w', encoding='utf-8', newline='') as f:
+            f.write(content)
+        return path
+
+    def test_lines(self):
+        index = LineIndex(self.write('one\ntwo  \nthree\nfour'))
+        self.assertEqual(4, index.line_count)
+        self.assertEqual(['two', 'three'], index.lines(2, 3))
+        self.assertEqual(['four'], index.lines(4, 4))
+
+    def test_lines_clamped(self):
+        index = LineIndex(self.write('one\ntwo\n'))
+        self.assertEqual(2, index.line_count)
+        self.assertEqual(['one', 'two'], index.lines(0, 10))
+        self.assertEqual([], index.lines(3, 5))
+
+    def test_crlf_and_unicode(self):
+        index = LineIndex(self.write('one\r\nzwei ü\r\ndrei\r\n'))
+        self.assertEqual(['zwei ü', 'drei'], index.lines(2, 3))
+
+    def test_empty_file(self):
+        index = LineIndex(self.write(''))
+        self.assertEqual(0, index.line_count)
+        self.assertEqual([], index.lines(1, 1))
+
+    def test_regions(self):
+        index = LineIndex(self.write('a\n// docdown:region outer\nb\n// docdown:region inner\nc\n'
+                                     '// docdown:endregion\nd\n// docdown:endregion outer\ne\n'))
+        self.assertEqual(['b', 'c', 'd'], index.region('outer'))
+        self.assertEqual(['c'], index.region('inner'))
+        self.assertIsNone(index.region('missing'))
+
+    def test_cached_until_changed(self):
+        path = self.write('one\n')
+        index = get_line_index(path)
+        self.assertIs(index, get_line_index(path))
+
+        self.write('one\ntwo\n')
+        stat = os.stat(path)
+        os.utime(path, (stat.st_atime, stat.st_mtime + 5))
+        self.assertEqual(['one', 'two'], get_line_index(path).lines(1, 2))
@@ -9,9 +9,15 @@ Tests for `docdown.media` module.
 
 from __future__ import absolute_import, unicode_literals, print_function
 
+import json
 import markdown
+import os
+import shutil
+import tempfile
 import unittest
+from markdown.util import etree
 
+from docdown.docdown import set_render_context
 from docdown.media import MediaTreeprocessor
 
 class MediaExtensionTest(unittest.TestCase):
@@ -108,3 +114,119 @@ class MediaExtensionTest(unittest.TestCase):
         )
         expected_output = '<p><img alt="Alt text" src="http://example.com/path/to/img.jpg"></p>'
         self.assertEqual(html, expected_output)
+
+    def test_media_url_per_render(self):
+        md = markdown.Markdown(extensions=self.MARKDOWN_EXTENSIONS, extension_configs=self.EXTENSION_CONFIGS,
+                               output_format='html5')
+        text = '![Alt text](img.jpg)'
+
+        set_render_context(md, media_url='http://example.com/guides/')
+        self.assertEqual('<p><img alt="Alt text" src="http://example.com/guides/img.jpg"></p>', md.convert(text))
+
+        md.reset()
+        self.assertEqual('<p><img alt="Alt text" src="http://example.com/img.jpg"></p>', md.convert(text))
+
+    def test_normalize_media_urls(self):
+        text = '![Alt text](../shared/./img.jpg)'
+        html = markdown.markdown(
+            text,
+            extensions=self.MARKDOWN_EXTENSIONS,
+            extension_configs={'docdown.media': {'media_url': 'http://example.com/guides/',
+                                                 'normalize_media_urls': True}},
+            output_format='html5'
+        )
+        self.assertEqual('<p><img alt="Alt text" src="http://example.com/shared/img.jpg"></p>', html)
+
+    def test_asset_links(self):
+        text = '[SDK](downloads/sdk.zip) [Guide](guides/setup.html) [Top](#top) [Spec](./spec.PDF?v=2#page=3)'
+        html = markdown.markdown(
+            text,
+            extensions=self.MARKDOWN_EXTENSIONS,
+            extension_configs=self.EXTENSION_CONFIGS,
+            output_format='html5'
+        )
+        self.assertEqual('<p><a href="http://example.com/downloads/sdk.zip">SDK</a>'
+                         ' <a href="guides/setup.html">Guide</a> <a href="#top">Top</a>'
+                         ' <a href="http://example.com/spec.PDF?v=2#page=3">Spec</a></p>', html)
+
+
+class MediaTreeprocessorTest(unittest.TestCase):
+
+    def make_tree(self):
+        root = etree.Element('div')
+        video = etree.SubElement(root, 'video', src='video.mp4', poster='./poster.png')
+        etree.SubElement(video, 'source', src='video.webm', type='video/webm')
+        etree.SubElement(video, 'track', src='captions.vtt')
+        etree.SubElement(root, 'audio', src='//cdn.example.org/sound.mp3')
+        etree.SubElement(root, 'img', src='image.png', srcset='image.png 1x,  ./image@2x.png 2x, http://x.org/i.png 3x')
+        etree.SubElement(root, 'iframe', src='embed.html')
+        return root
+
+    def test_media_elements(self):
+        root = self.make_tree()
+        MediaTreeprocessor(media_url='/media/', markdown_instance=markdown.Markdown()).run(root)
+        self.assertEqual('/media/video.mp4', root.find('video').get('src'))
+        self.assertEqual('/media/poster.png', root.find('video').get('poster'))
+        self.assertEqual('/media/video.webm', root.find('video/source').get('src'))
+        self.assertEqual('/media/captions.vtt', root.find('video/track').get('src'))
+        self.assertEqual('//cdn.example.org/sound.mp3', root.find('audio').get('src'))
+        self.assertEqual('/media/image.png', root.find('img').get('src'))
+        self.assertEqual('/media/image.png 1x, /media/image@2x.png 2x, http://x.org/i.png 3x',
+                         root.find('img').get('srcset'))
+        self.assertEqual('embed.html', root.find('iframe').get('src'))
+
+    def test_media_attributes_table(self):
+        root = self.make_tree()
+        MediaTreeprocessor(media_url='/media/', media_attributes={'iframe': ['src'], 'video': ['poster']},
+                           markdown_instance=markdown.Markdown()).run(root)
+        self.assertEqual('/media/embed.html', root.find('iframe').get('src'))
+        self.assertEqual('/media/poster.png', root.find('video').get('poster'))
+        self.assertEqual('video.mp4', root.find('video').get('src'))
+        self.assertEqual('image.png', root.find('img').get('src'))
+
+
+class AssetFingerprintTest(unittest.TestCase):
+
+    MANIFEST = {'assets/image.png': 'abc123', 'downloads/sdk.zip': 'def456', 'LICENSE': '789abc'}
+
+    def render(self, text, **config):
+        config = dict({'media_url': 'https://cdn.example.com/', 'asset_manifest': lambda: self.MANIFEST}, **config)
+        return markdown.markdown(text, extensions=['docdown.media'], extension_configs={'docdown.media': config},
+                                 output_format='html5')
+
+    def test_query_style(self):
+        self.assertEqual('<p><img alt="A" src="https://cdn.example.com/assets/image.png?v=abc123"></p>',
+                         self.render('![A](./assets/image.png)'))
+        self.assertEqual('<p><a href="https://cdn.example.com/downloads/sdk.zip?x=1&amp;v=def456#top">SDK</a></p>',
+                         self.render('[SDK](/downloads/sdk.zip?x=1#top)'))
+
+    def test_name_style(self):
+        self.assertEqual('<p><img alt="A" src="https://cdn.example.com/assets/image.abc123.png"></p>',
+                         self.render('![A](assets/image.png)', fingerprint_style='name'))
+        root = etree.Element('div')
+        etree.SubElement(root, 'img', src='LICENSE', srcset='assets/image.png 1x, other.png 2x')
+        MediaTreeprocessor(media_url='/', asset_manifest=lambda: self.MANIFEST, fingerprint_style='name',
+                           markdown_instance=markdown.Markdown()).run(root)
+        self.assertEqual('/LICENSE.789abc', root.find('img').get('src'))
+        self.assertEqual('/assets/image.abc123.png 1x, /other.png 2x', root.find('img').get('srcset'))
+
+    def test_not_in_manifest(self):
+        self.assertEqual('<p><img alt="A" src="https://cdn.example.com/assets/other.png"></p>',
+                         self.render('![A](assets/other.png)'))
+        self.assertEqual('<p><img alt="A" src="http://example.org/assets/image.png"></p>',
+                         self.render('![A](http://example.org/assets/image.png)'))
+
+    def test_manifest_file(self):
+        directory = tempfile.mkdtemp()
+        try:
+            manifest_path = os.path.join(directory, 'manifest.json')
+            with open(manifest_path, 'w') as f:
+                json.dump(self.MANIFEST, f)
+            self.assertEqual('<p><img alt="A" src="https://cdn.example.com/assets/image.png?v=abc123"></p>',
+                             self.render('![A](assets/image.png)', asset_manifest=manifest_path))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_invalid_style(self):
+        with self.assertRaises(ValueError):
+            MediaTreeprocessor(media_url='/', fingerprint_style='hash')
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_media_urls
+----------------------------------
+
+Tests for `docdown.media_urls` module.
+"""
+
+from __future__ import absolute_import, unicode_literals, print_function
+
+import unittest
+
+from docdown.media_urls import MediaURLResolver, join_media_url, normalize_url
+
+
+class JoinMediaURLTest(unittest.TestCase):
+
+    def test_join(self):
+        for base in ('https://example.com/media', 'https://example.com/media/'):
+            for src in ('image.png', '/image.png', './image.png'):
+                self.assertEqual('https://example.com/media/image.png', join_media_url(base, src))
+        self.assertEqual('./assets/image.png', join_media_url('.', 'assets/image.png'))
+        self.assertEqual('./assets/image.png', join_media_url('.', '/assets/image.png'))
+
+    def test_absolute_unchanged(self):
+        for src in ('http://example.org/image.png', 'HTTPS://example.org/image.png', '//cdn.example.org/image.png'):
+            self.assertEqual(src, join_media_url('https://example.com/media/', src))
+
+    def test_no_base(self):
+        self.assertEqual('assets/image.png', join_media_url(None, './assets/image.png'))
+
+    def test_normalize(self):
+        self.assertEqual('https://example.com/../assets/image.png',
+                         join_media_url('https://example.com/', '../assets/image.png'))
+        self.assertEqual('https://example.com/assets/image.png',
+                         join_media_url('https://example.com/media/', '../assets/./image.png', normalize=True))
+        self.assertEqual('https://example.com/a/b.png?v=1#top', normalize_url('https://example.com//a/./b.png?v=1#top'))
+        self.assertEqual('/media/', normalize_url('/media/x/../'))
+
+
+class MediaURLResolverTest(unittest.TestCase):
+
+    def test_memoized(self):
+        resolver = MediaURLResolver()
+        self.assertEqual('/media/a.png', resolver.resolve('/media/', 'a.png'))
+        self.assertEqual('/static/a.png', resolver.resolve('/static', 'a.png'))
+        self.assertEqual('/media/a.png', resolver.resolve('/media/', 'a.png'))
+        self.assertEqual(2, len(resolver))
+
+    def test_least_recently_used_evicted(self):
+        resolver = MediaURLResolver(max_size=2)
+        resolver.resolve('/media/', 'a.png')
+        resolver.resolve('/media/', 'b.png')
+        resolver.resolve('/media/', 'a.png')
+        resolver.resolve('/media/', 'c.png')
+        self.assertEqual([('/media/', 'a.png'), ('/media/', 'c.png')], list(resolver._urls))
+
+    def test_normalize(self):
+        resolver = MediaURLResolver(normalize=True)
+        self.assertEqual('/assets/a.png', resolver.resolve('/media/', '../assets/a.png'))
@@ -11,8 +11,11 @@ from __future__ import absolute_import, unicode_literals, print_function
 
 import copy
 import markdown
+import random
 import unittest
 
+from docdown.note_blocks import NoteBlockPreprocessor
+
 
 class NoteBlockExtensionTest(unittest.TestCase):
     """
@@ -217,3 +220,124 @@ class NoteBlockExtensionTest(unittest.TestCase):
             '{% svg "standard/icon-note" %}<img class="icon--pdf" src="{% static "svg/standard/icon-note.svg" %}">'
             '</div>\n<h5>Postfixed</h5>\n\n<p>hello world</p>\n<p>Postfix</p></div>')
         self.assertEqual(html, expected_output)
+
+
+class NoteBlockPreprocessorTest(unittest.TestCase):
+    """
+    :class:`docdown.note_blocks.NoteBlockPreprocessor` gives the same output as repeatedly searching the whole
+    document with its regular expression
+    """
+    LINES = ['!!! MUST', '!!!', '!!!!', '!!!! NOTE', '!!!MUST', '!!!!MUST', '', 'text', '- item', '!!! ', '---',
+             '!!! MUST:', 'MUST', '!!!  MUST', '!!! must', '  !!!', '!!!!!', '!!! NOTE -', 'word !!!', '!!!\tX']
+
+    def search_from_start(self, preprocessor, lines):
+        text = "\n".join(lines)
+        while 1:
+            m = preprocessor.RE.search(text)
+            if not m:
+                break
+            start_tag, end_tag = preprocessor.stash_tags(m.group('type'))
+            text = '%s\n%s\n\n%s\n%s\n%s' % (text[:m.start()], start_tag, m.group('content'), end_tag, text[m.end():])
+        return text.split("\n")
+
+    def assertSameAsSearch(self, lines):
+        expected = self.search_from_start(NoteBlockPreprocessor(markdown_instance=markdown.Markdown()), lines)
+        processed = NoteBlockPreprocessor(markdown_instance=markdown.Markdown()).run(lines)
+        self.assertEqual(expected, processed, lines)
+
+    def test_nested(self):
+        lines = ['!!! NOTE', 'a', '!!! MUST', 'b', '!!!', '!!!']
+        self.assertSameAsSearch(lines)
+        md = markdown.Markdown()
+        self.assertEqual(['', md.htmlStash.get_placeholder(0), '', 'a', '', md.htmlStash.get_placeholder(2), '',
+                          'b', '', md.htmlStash.get_placeholder(1), '', '', md.htmlStash.get_placeholder(3), ''],
+                         NoteBlockPreprocessor(markdown_instance=md).run(lines))
+
+    def test_type_on_next_line(self):
+        self.assertSameAsSearch(['!!!', 'MUST', 'content', '!!!'])
+
+    def test_unterminated(self):
+        self.assertSameAsSearch(['!!! MUST', 'content'])
+
+    def test_tags_not_changed(self):
+        tags = {'must': {'title': 'Must'}}
+        preprocessor = NoteBlockPreprocessor(prefix='<div class="{tag}">{title}', postfix='</div>', tags=tags,
+                                             default_tag='must', markdown_instance=markdown.Markdown())
+        preprocessor.run(['!!! MUST', 'a', '!!!', '!!! OTHER', 'b', '!!!'])
+        self.assertEqual({'must': {'title': 'Must'}}, tags)
+        self.assertEqual('<div class="must">Must', preprocessor.get_template('OTHER').prefix)
+
+    def test_templates_rendered_once(self):
+        md = markdown.Markdown()
+        preprocessor = NoteBlockPreprocessor(prefix='<div class="{tag}">', postfix='</div>', markdown_instance=md)
+        renderer = preprocessor.get_template_adapter()
+        rendered = []
+
+        class CountingRenderer(object):
+            def render(self, template, context):
+                rendered.append(template)
+                return renderer.render(template=template, context=context)
+
+        preprocessor.renderer = CountingRenderer()
+        preprocessor.run(['!!! MUST', 'a', '!!!', '!!! MUST', 'b', '!!!'])
+        preprocessor.run(['!!! MUST', 'c', '!!!'])
+        self.assertEqual(['<div class="{tag}">', '</div>'], rendered)
+        self.assertEqual('<div class="">', md.htmlStash.rawHtmlBlocks[4][0])
+
+    def test_nested_by_fence_length(self):
+        md = markdown.Markdown()
+        preprocessor = NoteBlockPreprocessor(markdown_instance=md)
+        lines = preprocessor.run(['!!! MUST', 'a', '!!!! NOTE', 'b', '!!!!', 'c', '!!!'])
+        self.assertEqual(['', md.htmlStash.get_placeholder(0), '', 'a', '', md.htmlStash.get_placeholder(2), '',
+                          'b', '', md.htmlStash.get_placeholder(3), '', 'c', '', md.htmlStash.get_placeholder(1), ''],
+                         lines)
+        self.assertEqual([], preprocessor.problems)
+
+    def test_unterminated_reported(self):
+        preprocessor = NoteBlockPreprocessor(markdown_instance=markdown.Markdown())
+        lines = preprocessor.run(['text', '!!! MUST', 'content'])
+        self.assertEqual(['text', '!!! MUST', 'content'], lines)
+        self.assertEqual(['Note block at line 2 is never closed: !!! MUST'], preprocessor.problems)
+
+    def test_same_fence_nesting_reported(self):
+        preprocessor = NoteBlockPreprocessor(markdown_instance=markdown.Markdown())
+        preprocessor.run(['!!! MUST', '!!! NOTE', '!!!', '!!!'])
+        self.assertEqual(['Note block at line 1 is closed at line 3 while the note block at line 2 inside it is'
+                          ' open.  Use a different fence, such as !!!!, for nested notes.'], preprocessor.problems)
+
+    def test_many_unterminated_fences(self):
+        lines = ['!!! MUST', 'content'] * 20000
+        preprocessor = NoteBlockPreprocessor(markdown_instance=markdown.Markdown())
+        self.assertEqual(lines, preprocessor.run(lines))
+        self.assertEqual(20000, len(preprocessor.problems))
+
+    def test_many_nested_notes(self):
+        lines = ['!!!! NOTE'] * 5000 + ['!!! MUST', 'content', '!!!'] * 5000 + ['!!!!'] * 5000
+        self.assertSameAsSearch(lines[:300] + lines[-300:])
+        preprocessor = NoteBlockPreprocessor(markdown_instance=markdown.Markdown())
+        processed = preprocessor.run(lines)
+        self.assertEqual(len(lines) * 3, len(processed) + 10000)
+        self.assertEqual(4999, len(preprocessor.problems))
+
+    def test_closed_then_unterminated(self):
+        lines = ['!!! NOTE', 'content', '!!!', ''] * 50 + ['!!! NOTE', 'text', ''] * 50
+        self.assertSameAsSearch(lines)
+        self.assertSameAsSearch(lines + ['!!! MUST', '!!!', '', '!!!', '!!! NOTE'])
+        self.assertSameAsSearch(['!!! MUST', '!!!', '!!!', '!!! NOTE', '!!!', '!!! NOTE', '', '!!!'] * 20)
+
+    def test_deeply_nested_by_fence_length(self):
+        depth = 1000
+        lines = ['!' * (3 + level) + ' NOTE' for level in range(depth)] + ['content']
+        lines += ['!' * (3 + level) for level in reversed(range(depth))]
+        md = markdown.Markdown()
+        preprocessor = NoteBlockPreprocessor(markdown_instance=md)
+        processed = preprocessor.run(lines)
+        self.assertEqual(depth * 6 + 1, len(processed))
+        self.assertEqual('content', processed[depth * 3])
+        self.assertEqual(md.htmlStash.get_placeholder(1), processed[-2])
+        self.assertEqual([], preprocessor.problems)
+
+    def test_random_documents(self):
+        generator = random.Random(0)
+        for _ in range(2000):
+            self.assertSameAsSearch([generator.choice(self.LINES) for _ in range(generator.randint(0, 20))])
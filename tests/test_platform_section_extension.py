@@ -9,10 +9,19 @@ Tests for `docdown.platform_section` module.
 
 from __future__ import absolute_import, print_function, unicode_literals
 
+import os
+import random
+import re
+import shutil
+import tempfile
 import unittest
 
+import itertools
 import markdown
 
+from docdown.include import IncludeExtension
+from docdown.platform_section import PlatformSectionExtension, PlatformSectionPreprocessor, render_platforms
+
 
 class PlatformSectionExtensionTest(unittest.TestCase):
     """
@@ -329,3 +338,289 @@ class PlatformSectionExtensionTest(unittest.TestCase):
         )
         expected_output = '<p>You need to implement this. </p>\n<h2>Next Header</h2>\n<p>The header above should be rendered.</p>'
         self.assertEqual(expected_output, html)
+
+
+class PlatformGroupsTest(unittest.TestCase):
+    """
+    Tests for the `platform_groups` configuration of :class:`docdown.platform_section.PlatformSectionExtension`
+    """
+    GROUPS = {
+        'Mobile': ['iOS', 'Android'],
+        'java': ['JavaSE'],
+    }
+
+    def render(self, text, platform):
+        return markdown.markdown(text, extensions=['docdown.platform_section'], output_format='html5',
+                                 extension_configs={
+                                     'docdown.platform_section': {
+                                         'platform_section': platform,
+                                         'platform_groups': self.GROUPS,
+                                     },
+                                 })
+
+    def test_group(self):
+        text = 'Runs on @![mobile]a phone!@@![JavaSE, JavaEE]a server!@.'
+        self.assertEqual('<p>Runs on a phone.</p>', self.render(text, 'iOS'))
+        self.assertEqual('<p>Runs on a phone.</p>', self.render(text, 'android'))
+        self.assertEqual('<p>Runs on a phone.</p>', self.render(text, 'Mobile'))
+        self.assertEqual('<p>Runs on a server.</p>', self.render(text, 'JavaEE'))
+
+    def test_alias(self):
+        text = 'Uses @![java]Java!@@![ios]Swift!@.'
+        self.assertEqual('<p>Uses Java.</p>', self.render(text, 'JavaSE'))
+        self.assertEqual('<p>Uses .</p>', self.render(text, 'JavaEE'))
+
+    def test_masks_compiled_once(self):
+        preprocessor = PlatformSectionPreprocessor(platform_section='ios', platform_groups=self.GROUPS,
+                                                   markdown_instance=markdown.Markdown())
+        text = '@![iOS, Android]a!@ @![mobile]b!@ @![javase]c!@\n' * 1000
+        self.assertEqual('ab' * 1000 + '\n', preprocessor.process_platform_sections(text))
+        self.assertEqual(['iOS, Android', 'javase', 'mobile'], sorted(preprocessor.section_masks))
+        self.assertEqual(preprocessor.section_mask('iOS, Android') | preprocessor.platform_bit('mobile'),
+                         preprocessor.section_mask('mobile'))
+
+    def test_platform_classes(self):
+        preprocessor = PlatformSectionPreprocessor(platform_section='', platform_groups=self.GROUPS,
+                                                   markdown_instance=markdown.Markdown())
+        text = '@![mobile]phone!@ @![java]java!@ @![JavaEE, JavaSE]server!@'
+        self.assertEqual([['iOS', 'Android'], ['JavaSE'], ['JavaEE'], ['C']],
+                         preprocessor.platform_classes(text, ['iOS', 'JavaSE', 'Android', 'JavaEE', 'C']))
+        self.assertEqual({'mobile', 'ios', 'android', 'java', 'javase', 'javaee'},
+                         preprocessor.variant_platforms(text))
+
+
+class PlatformSectionOrderTest(unittest.TestCase):
+    """
+    Platform sections are filtered before the other DocDown preprocessors run
+    """
+    TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+    ROOT_DIR = os.path.join(TESTS_DIR, 'test_files')
+
+    def test_runs_first(self):
+        extensions = ['docdown.include', 'docdown.note_blocks', 'docdown.sequence', 'docdown.platform_section']
+        for order in itertools.permutations(extensions):
+            md = markdown.Markdown(extensions=list(order))
+            self.assertEqual(['normalize_whitespace', 'platform_sections'], list(md.preprocessors.keys())[:2], order)
+
+    def test_includes_in_removed_sections_skipped(self):
+        platform_sections = PlatformSectionExtension(platform_section='Android')
+        md = markdown.Markdown(extensions=['markdown.extensions.fenced_code', platform_sections, 'docdown.include'],
+                               extension_configs={
+                                   'docdown.include': {
+                                       'asset_directory': 'assets',
+                                       'current_directory': self.ROOT_DIR,
+                                       'root_directory': self.ROOT_DIR,
+                                   },
+                               })
+        text = ('@![iOS]\n'
+                '+++ test.swift\n'
+                '+++ missing.m\n'
+                '!@\n'
+                '@![Android]\n'
+                '+++ test.java\n'
+                '!@\n')
+        html = md.convert(text)
+        self.assertIn('<code class="java">', html)
+        self.assertNotIn('swift', html)
+        self.assertEqual(2, platform_sections.includes_skipped)
+        include = [extension for extension in md.registeredExtensions if isinstance(extension, IncludeExtension)][0]
+        self.assertEqual([os.path.join(self.ROOT_DIR, 'assets', 'test.java')],
+                         [path for path, _ in include.dependency_graph[None]])
+
+
+class PlatformSectionPreprocessorTest(unittest.TestCase):
+    """
+    Tests for :class:`docdown.platform_section.PlatformSectionPreprocessor`
+    """
+
+    def search_from_start(self, text, platform_section):
+        """
+        Filter `text` the way it was originally done, searching again from the start after each replacement
+        """
+        while 1:
+            m = PlatformSectionPreprocessor.PLATFORM_SECTION_RE.search(text)
+            if not m:
+                return text
+            start = text[:m.start()]
+            end = text[m.end():]
+            if re.match(r'^\W+(@!\[|\n)', end):
+                if re.match(r'^(\n){2,}', end):
+                    end = '\n' + end.lstrip()
+                else:
+                    end = end.lstrip()
+            if platform_section in [section.lower().strip() for section in m.group('sections').split(',')]:
+                text = start + m.group('content') + end
+            else:
+                text = start + end
+
+    def assertSameAsSearch(self, text, platform_section):
+        preprocessor = PlatformSectionPreprocessor(platform_section='', markdown_instance=markdown.Markdown())
+        self.assertEqual(self.search_from_start(text, platform_section),
+                         preprocessor.process_platform_sections(text, platform_section), text)
+
+    def test_nested(self):
+        self.assertSameAsSearch('@![a] A @![b] B !@ C !@ D', 'a')
+        self.assertSameAsSearch('@![a] A @![b] B !@ C !@ D', 'b')
+        self.assertSameAsSearch('@![a] A @![a] B !@ C !@ D @![a] E !@', 'a')
+
+    def test_unterminated(self):
+        self.assertSameAsSearch('@![a] A !@ @![b] B', 'a')
+        self.assertSameAsSearch('@![a] A @![b] B', 'a')
+
+    def test_whitespace_after_end(self):
+        for after in (' \n\nnext', '\n\n\nnext', ' !  \n next', ' @![b] B !@', '\t@![b]B!@\n\n', ' next'):
+            self.assertSameAsSearch('@![a] A !@' + after, 'a')
+            self.assertSameAsSearch('@![a] A !@' + after, 'b')
+
+    def test_random_documents(self):
+        generator = random.Random(0)
+        pieces = ['@![a]', '@![b]', '@![a, b]', '@![ ]', '!@', ' ', '  ', '\n', '\n\n', 'x', 'y z', '-', '\t']
+        for _ in range(3000):
+            text = ''.join(generator.choice(pieces) for _ in range(generator.randint(0, 30)))
+            for platform_section in ('a', 'b', 'c'):
+                self.assertSameAsSearch(text, platform_section)
+
+    def test_many_unterminated_sections(self):
+        text = '@![a] content ' * 50000
+        preprocessor = PlatformSectionPreprocessor(platform_section='a', markdown_instance=markdown.Markdown())
+        self.assertEqual(text, preprocessor.process_platform_sections(text))
+
+    def test_many_nested_sections(self):
+        text = '@![a] @![ ]' * 20000 + ' content ' + '!@ - ' * 40000
+        preprocessor = PlatformSectionPreprocessor(platform_section='a', markdown_instance=markdown.Markdown())
+        preprocessor.process_platform_sections(text)
+        self.assertSameAsSearch(text[:3000] + text[-3000:], 'a')
+
+
+class RenderPlatformsTest(unittest.TestCase):
+    """
+    Tests for :func:`docdown.platform_section.render_platforms`
+    """
+    PLATFORMS = ['iOS', 'Android', 'JavaSE', 'JavaEE', 'JavaScript']
+
+    TEXT = ('### 1. Creating an App Service Manifest\r\n'
+            'The first step is to create an @![iOS]`SDLAppServiceManifest`!@ @![Android, JavaSE, JavaEE]'
+            '`AppServiceManifest`!@ object.\r\n\r\n'
+            '@![iOS]\n'
+            'some iOS content\n\n'
+            '!@\n'
+            '\n'
+            '@![JavaSE,JavaEE]\n'
+            'some Java content\n\n'
+            '!@\n'
+            '\tindented\n')
+
+    def build_markdown(self, extensions=(), extension_configs=None):
+        md = markdown.Markdown(extensions=list(extensions) + ['docdown.platform_section'],
+                               extension_configs=extension_configs or {}, output_format='html5')
+        convert = md.convert
+        md.converted = []
+
+        def counting_convert(source):
+            md.converted.append(source)
+            return convert(source)
+        md.convert = counting_convert
+        return md
+
+    def render_separately(self, text, platform, extensions=(), extension_configs=None):
+        extension_configs = dict(extension_configs or {})
+        extension_configs['docdown.platform_section'] = {'platform_section': platform}
+        return markdown.markdown(text, extensions=list(extensions) + ['docdown.platform_section'],
+                                 extension_configs=extension_configs, output_format='html5')
+
+    def test_same_as_separate_renders(self):
+        md = self.build_markdown()
+        rendered = render_platforms(md, self.TEXT, self.PLATFORMS)
+        self.assertEqual(set(self.PLATFORMS), set(rendered))
+        for platform in self.PLATFORMS:
+            self.assertEqual(self.render_separately(self.TEXT, platform), rendered[platform])
+
+    def test_platforms_with_same_text_rendered_once(self):
+        md = self.build_markdown()
+        rendered = render_platforms(md, self.TEXT, self.PLATFORMS)
+        # iOS, Android, JavaSE and JavaEE, and JavaScript
+        self.assertEqual(4, len(md.converted))
+        self.assertEqual(rendered['JavaSE'], rendered['JavaEE'])
+
+    def test_same_filtered_text_rendered_once(self):
+        md = self.build_markdown()
+        text = '@![iOS]\nSame text\n!@\n@![Android]\nSame text\n!@'
+        rendered = render_platforms(md, text, ['iOS', 'Android', 'JavaSE'])
+        # iOS and Android, and JavaSE
+        self.assertEqual(2, len(md.converted))
+        self.assertEqual('<p>Same text</p>', rendered['iOS'])
+        self.assertEqual(rendered['iOS'], rendered['Android'])
+        self.assertEqual(self.render_separately(text, 'JavaSE'), rendered['JavaSE'])
+
+    def test_whitespace_normalized_once(self):
+        md = self.build_markdown()
+        text = 'x @![ios]\n!@'
+        rendered = render_platforms(md, text, ['iOS', 'Android'])
+        for platform in ['iOS', 'Android']:
+            self.assertEqual(self.render_separately(text, platform), rendered[platform])
+
+    def test_random_documents_same_as_separate_renders(self):
+        generator = random.Random(0)
+        pieces = ['x', ' ', '\n', '\n\n', '\t', '\r\n', '@![ios]', '@![android]', '@![ios, android]', '!@', '# ',
+                  '* ', '    ']
+        for _ in range(100):
+            text = ''.join(generator.choice(pieces) for _ in range(generator.randint(0, 20)))
+            rendered = render_platforms(self.build_markdown(), text, ['iOS', 'Android', 'JavaSE'])
+            for platform in ['iOS', 'Android', 'JavaSE']:
+                self.assertEqual(self.render_separately(text, platform), rendered[platform], repr(text))
+
+    def test_reset_restores_configured_platform(self):
+        md = self.build_markdown(extension_configs={'docdown.platform_section': {'platform_section': 'Android'}})
+        render_platforms(md, self.TEXT, ['iOS'])
+        md.reset()
+        html = md.convert('Back to back @![ios]iOS!@@![android]Android!@ tags!')
+        self.assertEqual('<p>Back to back Android tags!</p>', html)
+
+    def test_sections_in_included_files(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        os.mkdir(os.path.join(directory, 'assets'))
+        with open(os.path.join(directory, 'assets', 'part.md'), 'w') as part:
+            part.write('@![JavaSE]Java SE only!@\n')
+        extensions = ['docdown.include']
+        extension_configs = {
+            'docdown.include': {
+                'asset_directory': 'assets',
+                'current_directory': directory,
+                'root_directory': directory,
+                'fragment_extensions': ['.md'],
+            },
+        }
+        text = 'Intro\n\n+++ part.md\n'
+
+        md = self.build_markdown(extensions, extension_configs)
+        rendered = render_platforms(md, text, ['JavaEE', 'JavaSE'])
+        self.assertEqual(self.render_separately(text, 'JavaEE', extensions, extension_configs), rendered['JavaEE'])
+        self.assertEqual(self.render_separately(text, 'JavaSE', extensions, extension_configs), rendered['JavaSE'])
+        self.assertIn('Java SE only', rendered['JavaSE'])
+        self.assertNotIn('Java SE only', rendered['JavaEE'])
+
+    def test_platform_classes(self):
+        preprocessor = PlatformSectionPreprocessor(platform_section='', markdown_instance=markdown.Markdown())
+        self.assertEqual([['iOS'], ['Android'], ['JavaSE', 'javaee'], ['JavaScript', 'C']],
+                         preprocessor.platform_classes(self.TEXT, self.PLATFORMS[:3] + ['javaee', 'JavaScript', 'C']))
+        self.assertEqual({'ios', 'android', 'javase', 'javaee'}, preprocessor.variant_platforms(self.TEXT))
+
+    def test_platform_classes_without_sections(self):
+        preprocessor = PlatformSectionPreprocessor(platform_section='', markdown_instance=markdown.Markdown())
+        self.assertEqual([self.PLATFORMS], preprocessor.platform_classes('No sections here', self.PLATFORMS))
+        self.assertEqual(set(), preprocessor.variant_platforms('No sections here'))
+
+    def test_platform_classes_same_text(self):
+        preprocessor = PlatformSectionPreprocessor(platform_section='', markdown_instance=markdown.Markdown())
+        text = ('@![a, b]1 @![c]2!@ 3!@ @![b]\n4\n!@@![a, c]5!@\n@![d]6!@ @![b, c, d]7\n!@\n')
+        platforms = ['a', 'b', 'A', 'c', 'd', 'x', 'y']
+        classes = preprocessor.platform_classes(text, platforms)
+        self.assertEqual([['a', 'A'], ['b'], ['c'], ['d'], ['x', 'y']], classes)
+        for group in classes:
+            texts = set(preprocessor.process_platform_sections(text, platform.lower()) for platform in group)
+            self.assertEqual(1, len(texts))
+
+    def test_needs_extension(self):
+        with self.assertRaises(ValueError):
+            render_platforms(markdown.Markdown(), 'text', ['iOS'])
@@ -9,12 +9,18 @@ Tests for `docdown.sequence` module.
 
 from __future__ import absolute_import, unicode_literals, print_function
 
+import io
+import os
+import random
+import shutil
+import tempfile
 import unittest
 
 # pylint apparently confused because pip name is 'Markdown'
 import markdown  # pylint: disable=import-error
 
-from docdown.sequence import SequenceDiagramBlockPreprocessor
+from docdown.docdown import set_render_context
+from docdown.sequence import SequenceDiagramBlockPreprocessor, render_diagrams
 
 
 class SequenceDiagramExtensionTest(unittest.TestCase):
@@ -262,6 +268,44 @@ class SequenceDiagramExtensionTest(unittest.TestCase):
 
         self.assertEqual(html, expected_output)
 
+    def test_media_url_per_render(self):
+        md = markdown.Markdown(extensions=self.MARKDOWN_EXTENSIONS,
+                               extension_configs={'docdown.sequence': {'media_url': 'http://example.com/',
+                                                                       'prefix': '<div data-src="{image_url}">'}},
+                               output_format='html5')
+        text = ("|||\n"
+                "Activate App\n"
+                "![Activate App](./assets/ActivateApp.png)\n"
+                "|||")
+
+        set_render_context(md, media_url='http://example.com/guides/')
+        self.assertIn('data-src="http://example.com/guides/assets/ActivateApp.png"', md.convert(text))
+
+        md.reset()
+        self.assertIn('data-src="http://example.com/assets/ActivateApp.png"', md.convert(text))
+
+    def test_same_urls_as_media_extension(self):
+        """
+        Relative image urls are joined to the media url with a single slash, as by the media extension
+        """
+        text = ('|||\n'
+                'Activate App\n'
+                '![Activate App](assets/ActivateApp.png)\n'
+                '|||\n\n'
+                '![Activate App](assets/ActivateApp.png)')
+        for media_url in ('.', 'http://example.com', 'http://example.com/'):
+            html = markdown.markdown(
+                text,
+                extensions=['docdown.sequence', 'docdown.media'],
+                extension_configs={'docdown.sequence': {'media_url': media_url, 'prefix': '<a data-src="{image_url}">',
+                                                        'postfix': '</a>'},
+                                   'docdown.media': {'media_url': media_url}},
+                output_format='html5'
+            )
+            url = media_url.rstrip('/') + '/assets/ActivateApp.png'
+            self.assertIn('<a data-src="%s">' % url, html)
+            self.assertIn('<img alt="Activate App" src="%s">' % url, html)
+
 
 class SequenceDiagramBlockPreprocessorTest(unittest.TestCase):
     """
@@ -335,3 +379,173 @@ class SequenceDiagramBlockPreprocessorTest(unittest.TestCase):
                     ''
                     ]
         self.assertEqual(processed, expected)
+
+
+class SequenceDiagramScanTest(unittest.TestCase):
+    """
+    :class:`docdown.sequence.SequenceDiagramBlockPreprocessor` gives the same output as repeatedly searching the whole
+    document with its regular expression
+    """
+    LINES = ['|||', '||||', '  |||  ', '|||x', '||| |||', '|||![a](b)', '', ' ', 'text', '|1|alice|248|||',
+             '![title](url)', '!(url)', '![](./url)', 'see ![a](b)', '![a](b c)', '![a](b) more](c)', '!![a](b)',
+             '![a]', '![a](b) ![c](d)', '!(a) ![b](c)', '![a](b)!(c)', '|||![a](b)', '||| ![a](b)']
+
+    def make_preprocessor(self):
+        return SequenceDiagramBlockPreprocessor(media_url='/media/', prefix='{title}|{image_url}', postfix='end',
+                                                markdown_instance=markdown.Markdown())
+
+    def search_from_start(self, preprocessor, lines):
+        text = "\n".join(lines)
+        renderer = preprocessor.get_template_adapter()
+        while 1:
+            m = preprocessor.RE.search(text)
+            if not m:
+                break
+            image_url = preprocessor.media_image_url(m.group('url'))
+            start_tag, end_tag = preprocessor.stash_tags(renderer, m.group('title'), image_url)
+            text = '%s\n%s\n\n%s\n%s\n%s' % (text[:m.start()], start_tag, m.group('content'), end_tag, text[m.end():])
+        return text.split("\n")
+
+    def assertSameAsSearch(self, lines):
+        searched = self.make_preprocessor()
+        expected = self.search_from_start(searched, lines)
+        scanned = self.make_preprocessor()
+        processed = scanned.run(lines)
+        self.assertEqual(expected, processed, lines)
+        self.assertEqual(searched.markdown.htmlStash.rawHtmlBlocks, scanned.markdown.htmlStash.rawHtmlBlocks, lines)
+
+    def test_nested(self):
+        self.assertSameAsSearch(['|||', '|||', 'a', '![a](b)', '|||', 'b', '![c](d)', '|||'])
+
+    def test_blank_lines_before_fence(self):
+        self.assertSameAsSearch(['text', '', ' ', '  |||', 'a', '![a](b)', '|||', '', '|||', 'b', '!(c)', '|||'])
+
+    def test_image_in_line(self):
+        self.assertSameAsSearch(['|||', 'see ![a](b) and ![c](d)', '|||| rest'])
+        self.assertSameAsSearch(['|||', '![a](b) more](c)', '|||'])
+
+    def test_unterminated(self):
+        self.assertSameAsSearch(['|||', 'text', '![a](b)', 'text', '|||'])
+
+    def test_many_unterminated_fences(self):
+        lines = ['|||', 'content', '![a](b)', 'text'] * 20000
+        self.assertEqual(lines, self.make_preprocessor().run(lines))
+
+    def test_many_nested_diagrams(self):
+        lines = ['|||'] * 5000 + ['content'] + ['![a](b)', '|||'] * 5000
+        self.assertSameAsSearch(lines[:200] + lines[-400:])
+        processed = self.make_preprocessor().run(lines)
+        self.assertEqual(5000 * 5 + 2, len(processed))
+
+    def test_long_image_lines(self):
+        lines = ['|||', '!' * 50000 + '![a](b', '![' * 20000 + '](' * 20000 + ')', '|||']
+        processed = self.make_preprocessor().run(lines)
+        self.assertEqual(['', self.make_preprocessor().markdown.htmlStash.get_placeholder(0), ''], processed[:3])
+
+    def test_random_documents(self):
+        generator = random.Random(0)
+        for _ in range(3000):
+            self.assertSameAsSearch([generator.choice(self.LINES) for _ in range(generator.randint(0, 16))])
+
+
+class DiagramSourceTest(unittest.TestCase):
+    """
+    Diagrams rendered from the source in their `|||` block
+    """
+
+    TEXT = ('|||\n'
+            'Activate App\n'
+            '```sequence\n'
+            'App->Core: RegisterAppInterface\n'
+            '```\n'
+            '![Activate App]()\n'
+            '|||')
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.calls = []
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def renderer(self, source):
+        self.calls.append(source)
+        return '<svg>%s</svg>' % source
+
+    def make_markdown(self, **config):
+        config = dict({
+            'media_url': '/media/',
+            'prefix': '<div data-src="{image_url}">',
+            'postfix': '</div>',
+            'diagram_renderers': {'sequence': self.renderer},
+            'diagram_directory': self.directory,
+        }, **config)
+        return markdown.Markdown(extensions=['docdown.sequence'], extension_configs={'docdown.sequence': config})
+
+    def test_rendered_from_source(self):
+        md = self.make_markdown()
+        html = md.convert(self.TEXT)
+        file_name = os.listdir(self.directory)[0]
+        self.assertEqual('<div data-src="/media/%s">\n\n<p>Activate App</p>\n</div>' % file_name, html)
+        self.assertEqual(['App->Core: RegisterAppInterface'], self.calls)
+
+        md.reset()
+        self.assertEqual(html, md.convert(self.TEXT))
+        self.assertEqual(1, len(self.calls))
+
+    def test_diagram_url(self):
+        html = self.make_markdown(diagram_url='https://example.com/diagrams/').convert(self.TEXT)
+        self.assertIn('data-src="https://example.com/diagrams/diagram-', html)
+
+    def test_image_url_kept(self):
+        text = self.TEXT.replace('![Activate App]()', '![Activate App](./assets/app.png)')
+        html = self.make_markdown().convert(text)
+        self.assertIn('data-src="/media/assets/app.png"', html)
+        self.assertIn('RegisterAppInterface', html)
+        self.assertEqual([], self.calls)
+
+    def test_render_diagrams(self):
+        paths = []
+        for index in range(10):
+            path = os.path.join(self.directory, 'page%d.md' % index)
+            with io.open(path, 'w', encoding='utf-8') as f:
+                f.write(self.TEXT.replace('RegisterAppInterface', 'Request %d' % (index % 4)))
+            paths.append(path)
+        md = self.make_markdown(diagram_directory=os.path.join(self.directory, 'diagrams'))
+
+        self.assertEqual(4, len(render_diagrams(md, paths, workers=4)))
+        self.assertEqual(4, len(self.calls))
+        for path in paths:
+            md.reset()
+            with io.open(path, encoding='utf-8') as f:
+                md.convert(f.read())
+        self.assertEqual(4, len(self.calls))
+
+    def test_render_diagrams_needs_renderers(self):
+        with self.assertRaises(ValueError):
+            render_diagrams(markdown.Markdown(extensions=['docdown.sequence']), [])
+
+    def test_inline_svg(self):
+        os.mkdir(os.path.join(self.directory, 'assets'))
+        with open(os.path.join(self.directory, 'assets', 'app.svg'), 'w') as f:
+            f.write('<svg viewBox="0 0 4 4"><rect/></svg>')
+        with open(os.path.join(self.directory, 'assets', 'large.svg'), 'w') as f:
+            f.write('<svg>%s</svg>' % ('<rect/>' * 1000))
+        diagram = '|||\n%s\n![%s](%s)\n|||\n\n'
+        text = (diagram % ('First', 'App', './assets/app.svg') + diagram % ('Large', 'Large', 'assets/large.svg') +
+                diagram % ('Again', 'App', '/assets/app.svg'))
+        md = self.make_markdown(prefix='<div data-src="{image_url}">{svg}', inline_svg_threshold=1024,
+                                media_directory=self.directory)
+
+        html = md.convert(text)
+        self.assertEqual(1, html.count('<rect/>'))
+        self.assertEqual(1, html.count('<use href="#diagram-'))
+        self.assertIn('<div data-src="/media/assets/large.svg"></div>', html.replace('\n\n<p>Large</p>\n', ''))
+
+        md.reset()
+        self.assertEqual(html, md.convert(text))
+
+    def test_inline_rendered_svg(self):
+        md = self.make_markdown(prefix='<div>{svg}', inline_svg_threshold=1024)
+        self.assertIn('<div><svg id="diagram-', md.convert(self.TEXT))
+        self.assertIn('>App->Core: RegisterAppInterface</svg>', md.convert(self.TEXT))
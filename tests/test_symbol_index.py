@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_symbol_index
+----------------------------------
+
+Tests for `docdown.symbol_index` module.
+"""
+
+from __future__ import absolute_import, unicode_literals, print_function
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from docdown import symbol_index
+from docdown.symbol_index import BraceSymbolIndexer, PythonSymbolIndexer, get_symbols
+
+
+PYTHON_SOURCE = '''import os
+
+
+class Greeter(object):
+
+    @staticmethod
+    def hello(name):
+        return 'Hello %s' % (
+            name)
+
+    async def wait(self):
+        pass
+
+
+def main():
+    print(Greeter.hello('world'))
+'''
+
+JAVA_SOURCE = '''package example;
+
+public class Greeter {
+
+    public static String hello(String name) {
+        if (name == null) {
+            return "Hello";
+        }
+        return "Hello " + name;
+    }
+
+    static class Inner implements Runnable {
+        public void run() {
+        }
+    }
+}
+'''
+
+
+class PythonSymbolIndexerTest(unittest.TestCase):
+
+    def test_index(self):
+        symbols = PythonSymbolIndexer().index(PYTHON_SOURCE)
+        self.assertEqual({
+            'Greeter': (4, 12),
+            'Greeter.hello': (6, 9),
+            'Greeter.wait': (11, 12),
+            'main': (15, 16),
+        }, symbols)
+
+    def test_syntax_error(self):
+        self.assertEqual({}, PythonSymbolIndexer().index('def broken(:\n'))
+
+
+class BraceSymbolIndexerTest(unittest.TestCase):
+
+    def test_index(self):
+        symbols = BraceSymbolIndexer().index(JAVA_SOURCE)
+        self.assertEqual({
+            'Greeter': (3, 16),
+            'Greeter.hello': (5, 10),
+            'Greeter.Inner': (12, 15),
+            'Greeter.Inner.run': (13, 14),
+        }, symbols)
+
+
+class GetSymbolsTest(unittest.TestCase):
+
+    class CountingIndexer(PythonSymbolIndexer):
+        name = 'counting'
+        calls = 0
+
+        def index(self, source):
+            self.calls += 1
+            return super(GetSymbolsTest.CountingIndexer, self).index(source)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'greeter.py')
+        with io.open(self.path, 'w', encoding='utf-8') as f:
+            f.write(PYTHON_SOURCE)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        symbol_index._symbol_indexes.clear()
+
+    def test_cached_in_memory(self):
+        indexer = self.CountingIndexer()
+        get_symbols(self.path, indexer)
+        self.assertEqual((6, 9), get_symbols(self.path, indexer)['Greeter.hello'])
+        self.assertEqual(1, indexer.calls)
+
+    def test_persisted_to_cache_directory(self):
+        cache_directory = os.path.join(self.directory, 'cache')
+        indexer = self.CountingIndexer()
+        get_symbols(self.path, indexer, cache_directory)
+        self.assertEqual(1, len(os.listdir(cache_directory)))
+
+        symbol_index._symbol_indexes.clear()
+        self.assertEqual((6, 9), get_symbols(self.path, indexer, cache_directory)['Greeter.hello'])
+        self.assertEqual(1, indexer.calls)